@@ -0,0 +1,80 @@
+// Clientside callbacks for the UI-only interactions (no server round trip)
+const DAY_MS = 86400000;
+const MAX_YEAR_MARKS = 12;
+
+// Slider tooltips: days since the epoch as dates
+window.dccFunctions = window.dccFunctions || {};
+window.dccFunctions.epochDayToDate = function (value) {
+    return new Date(value * DAY_MS).toISOString().slice(0, 10);
+};
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    whoop: {
+        toggleUpload: function (nClicks, isOpen) {
+            if (!nClicks) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            return [!isOpen, isOpen ? "▶" : "▼"];
+        },
+
+        // Years from the dataset index: all selected when a dataset is loaded,
+        // "Select All" toggles between all and none
+        manageYears: function (index, nClicks, options, value) {
+            const noUpdate = window.dash_clientside.no_update;
+            const triggered = window.dash_clientside.callback_context.triggered_id;
+            if (!triggered || triggered === "dataset-index") {
+                if (!index) {
+                    return [[], null];
+                }
+                const years = index.years;
+                return [years.map(year => ({label: String(year), value: year})), years];
+            }
+            return [noUpdate, toggleAll(nClicks, options, value)];
+        },
+
+        manageMonths: function (index, nClicks, options, value) {
+            const triggered = window.dash_clientside.callback_context.triggered_id;
+            if (!triggered || triggered === "dataset-index") {
+                return index ? options.map(option => option.value) : null;
+            }
+            return toggleAll(nClicks, options, value);
+        },
+
+        // Date range slider over the days of the dataset (days since the epoch),
+        // reset to the whole dataset when a dataset is loaded
+        manageDateRange: function (index) {
+            if (!index) {
+                return [0, 1, {}, null];
+            }
+            const first = index.first_day, last = index.last_day;
+            const firstYear = new Date(first * DAY_MS).getUTCFullYear();
+            const lastYear = new Date(last * DAY_MS).getUTCFullYear();
+            const every = Math.max(1, Math.ceil((lastYear - firstYear + 1) / MAX_YEAR_MARKS));
+            const marks = {};
+            for (let year = firstYear; year <= lastYear; year += every) {
+                const day = Math.max(first, Date.UTC(year, 0, 1) / DAY_MS);
+                marks[day] = String(year);
+            }
+            return [first, last, marks, [first, last]];
+        },
+
+        // Controls of the field selected for a new query condition: phases,
+        // a journal answer or a range of values
+        showQueryControls: function (field, phasesStyle, answerStyle, rangeStyle) {
+            const kind = field ? field.split("|")[0] : null;
+            const show = (style, visible) => Object.assign({}, style, {display: visible ? "flex" : "none"});
+            return [show(phasesStyle, kind === "phase"), show(answerStyle, kind === "journal"),
+                    show(rangeStyle, kind === "range" || kind === "cycle_length")];
+        }
+    }
+});
+
+function toggleAll(nClicks, options, value) {
+    if (!nClicks || !options) {
+        return window.dash_clientside.no_update;
+    }
+    if (value && value.length === options.length) {
+        return [];
+    }
+    return options.map(option => option.value);
+}
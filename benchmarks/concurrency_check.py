@@ -0,0 +1,122 @@
+import argparse
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+# Local Imports
+from src.components import ids, calendar_view
+from src.components.cycle_table import table_page
+from src.components.layout import (render_overview_tab, render_sleep_tab, render_recovery_tab,
+                                   render_trends_tab, render_stats_tab, create_cycle_overlay_plot,
+                                   overlay_metric_patch)
+from src.data.cache import fingerprint
+from src.data.forecast import overview_forecast
+from src.data.loader import build_dataset, filter_data, get_stats
+from src.data.rollups import DAILY, CYCLES, MONTHS, filter_rollup
+from src.data.synthetic import generate_export
+
+# Renders every tab from many threads against one shared dataset, like a
+# threaded server answering several callbacks for the same cached dataset.
+# Run from the repository root:
+#   python -m benchmarks.concurrency_check --threads 16 --rounds 5
+# The exit status is 1 when a render raises, differs from its single-threaded
+# result or when any of the shared frames was modified.
+DEFAULT_THREADS = 16
+DEFAULT_ROUNDS = 5
+DEFAULT_YEARS = 3
+TOKEN = 'concurrency-check'
+TEXT_DATES = 'daily with text dates'
+ERROR = 'raised '
+
+def shared_frames(dataset: dict) -> dict:
+    """The dataset frames and a daily frame with its dates as text, as in frames loaded
+    from JSON, which filter_data and the overlay have to convert"""
+    daily = dataset[DAILY]
+    return {**dataset, TEXT_DATES: daily.assign(**{ids.CYCLE_START_DATE: daily[ids.CYCLE_START_DATE].astype(str)})}
+
+def render_tasks(frames: dict) -> dict:
+    """Every render of the app, each one reading the shared frames only"""
+    daily, cycles, months, text_dates = frames[DAILY], frames[CYCLES], frames[MONTHS], frames[TEXT_DATES]
+    years = sorted(daily[ids.CYCLE_START_DATE].dt.year.unique().tolist())
+    selections = [(None, None), (years[:1], None), (years, [1, 2, 3])]
+    forecast = overview_forecast(daily)
+
+    tasks = {}
+    for selected_years, selected_months in selections:
+        key = f'{selected_years}/{selected_months}'
+        df = filter_data(daily, selected_years, selected_months)
+        month_rollup = filter_rollup(months, selected_years, selected_months)
+        tasks.update({
+            f'filter_data {key}': lambda y=selected_years, m=selected_months: filter_data(daily, y, m),
+            f'filter_data text dates {key}': lambda y=selected_years, m=selected_months: filter_data(text_dates, y, m),
+            f'overview {key}': lambda df=df, r=month_rollup: render_overview_tab(df, r, forecast),
+            f'sleep {key}': lambda df=df: render_sleep_tab(df),
+            f'recovery {key}': lambda df=df: render_recovery_tab(df),
+            f'trends {key}': lambda df=df: render_trends_tab(df),
+            f'stats {key}': lambda df=df: render_stats_tab(df),
+            f'get_stats {key}': lambda df=df: get_stats(df),
+            f'overlay {key}': lambda df=df: create_cycle_overlay_plot(df, ids.HRV, cycle_rollup=cycles),
+            f'overlay text dates {key}': lambda y=selected_years, m=selected_months: create_cycle_overlay_plot(
+                text_dates[text_dates.index.isin(filter_data(daily, y, m).index)], ids.HRV),
+            f'overlay patch {key}': lambda df=df: overlay_metric_patch(df, ids.RESTING_HR, cycles),
+            f'calendar {key}': lambda df=df: calendar_view.create_calendar_heatmap(df, ids.RECOVERY_SCORE),
+            f'table page {key}': lambda y=selected_years, m=selected_months: table_page(
+                TOKEN, cycles, ids.HRV, [], y, m, 0, 10),
+        })
+    return tasks
+
+def serialise(result) -> str:
+    if isinstance(result, pd.DataFrame):
+        return result.to_json(orient='split', date_format='iso')
+    if isinstance(result, (list, tuple)):
+        return '[' + ','.join(serialise(item) for item in result) + ']'
+    return to_json_plotly(result)
+
+def run(task) -> str:
+    """The serialised result of a task, or its exception so one failing render is
+    reported with the others instead of stopping the check"""
+    try:
+        return serialise(task())
+    except Exception as e:
+        return f"{ERROR}{type(e).__name__}: {e}"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render all tabs concurrently against one shared dataset")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS)
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument('--years', type=float, default=DEFAULT_YEARS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    export = generate_export(years=args.years, seed=args.seed)
+    dataset = build_dataset(export['physiological'], export['journal'], export['sleep'], export['workouts'])
+    frames = shared_frames(dataset)
+    before = {name: fingerprint(frame) for name, frame in frames.items()}
+
+    tasks = render_tasks(frames)
+    expected = {name: run(task) for name, task in tasks.items()}
+
+    # Every task several times, interleaved in a random order
+    schedule = list(tasks) * args.rounds
+    random.Random(args.seed).shuffle(schedule)
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda name: (name, run(tasks[name])), schedule))
+
+    failures = sorted({f"{name} {result}" for name, result in [*expected.items(), *results]
+                       if result.startswith(ERROR)})
+    failures += sorted({name for name, result in results
+                        if result != expected[name] and not result.startswith(ERROR)})
+    for name, frame in frames.items():
+        if fingerprint(frame) != before[name]:
+            failures.append(f"shared frame '{name}' was modified")
+
+    print(f"{len(schedule)} renders of {len(tasks)} kinds on {args.threads} threads")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
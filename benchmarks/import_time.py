@@ -0,0 +1,86 @@
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+# Measures the cold start of the app in fresh interpreters and checks it
+# against a budget. Run from the repository root:
+#   python -m benchmarks.import_time
+# The exit status is 1 when a budget is exceeded or when a module that should
+# only be loaded on first use is imported at start-up.
+IMPORT_BUDGET_MS = 1800
+FIRST_RESPONSE_BUDGET_MS = 2500
+LAZY_MODULES = ['scipy', 'plotly.express']
+N_RUNS = 3
+TOP_MODULES = 10
+
+ROOT = Path(__file__).resolve().parent.parent
+
+FIRST_RESPONSE_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import main
+client = main.create_app().server.test_client()
+assert client.get('/').status_code == 200
+assert client.get('/_dash-layout').status_code == 200
+elapsed = time.perf_counter() - start
+print(elapsed * 1000)
+print(','.join(module for module in {lazy} if module in sys.modules))
+'''
+
+def import_profile() -> tuple[float, list[tuple[str, float]]]:
+    """Cumulative import time of main and of its slowest top-level imports, in ms"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Top-level imports are indented by two spaces after the separator
+        if len(name) - len(name.lstrip()) <= 3:
+            modules.append((name.strip(), int(cumulative) / 1000))
+    total = dict(modules)['main']
+    top = sorted((m for m in modules if m[0] != 'main'), key=lambda m: m[1], reverse=True)
+    return total, top[:TOP_MODULES]
+
+def first_response() -> tuple[float, list[str]]:
+    """Time from interpreter start to the first page and layout, and the lazy modules loaded by then"""
+    script = FIRST_RESPONSE_SCRIPT.format(lazy=LAZY_MODULES)
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    elapsed, loaded = result.stdout.splitlines()[-2:]
+    return float(elapsed), [module for module in loaded.split(',') if module]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the cold start of the app against a budget")
+    parser.add_argument('--runs', type=int, default=N_RUNS)
+    parser.add_argument('--import-budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--first-response-budget-ms', type=float, default=FIRST_RESPONSE_BUDGET_MS)
+    args = parser.parse_args()
+
+    # Best of several runs to leave out the file system cache warming up
+    profiles = [import_profile() for _ in range(args.runs)]
+    import_ms, top = min(profiles, key=lambda profile: profile[0])
+    responses = [first_response() for _ in range(args.runs)]
+    response_ms, loaded = min(responses, key=lambda response: response[0])
+
+    print("Slowest top-level imports:")
+    for name, ms in top:
+        print(f"  {name:<40}{ms:>8.1f} ms")
+    print(f"import main      {import_ms:>8.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print(f"first response   {response_ms:>8.1f} ms (budget {args.first_response_budget_ms:.0f} ms)")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append("import time over budget")
+    if response_ms > args.first_response_budget_ms:
+        failures.append("first response over budget")
+    if loaded:
+        failures.append(f"loaded at start-up: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import base64
+import sys
+
+import numpy as np
+import pandas as pd
+from dash import Patch
+
+# Local Imports
+from src.components import ids
+from src.components.layout import create_cycle_overlay_plot, overlay_metric_patch
+from src.data.loader import build_dataset, filter_data
+from src.data.query import query_data
+from src.data.rollups import DAILY, CYCLES
+from src.data.synthetic import generate_export
+
+# Checks the cycle overlay of the Trends tab on filtered frames: the year
+# filters and windows of the date range slider that start mid-dataset, whose
+# rows keep the index labels of the whole daily frame. Run from the repository root:
+#   python -m benchmarks.overlay_check --years 3
+# The exit status is 1 when a cycle trace is missing, does not start on cycle
+# day 1, shows the rows of another cycle, or when the metric patch differs from
+# a full rebuild of the figure.
+DEFAULT_YEARS = 3
+TOKEN = 'overlay-check'
+PATCH_METRIC = ids.RESTING_HR
+
+def _values(array) -> np.ndarray:
+    """Values of a figure array, plain or typed (see figures.typed_array)"""
+    if isinstance(array, dict):
+        return np.frombuffer(base64.b64decode(array['bdata']), dtype=array['dtype']).astype(float)
+    return np.asarray(array, dtype=float)
+
+def check_overlay(df: pd.DataFrame, cycles: pd.DataFrame) -> list[str]:
+    """The failures of the overlay of a filtered daily frame"""
+    failures = []
+    first_days = np.flatnonzero(((df[ids.CYCLE_DAY_NUMBER] == 1) & (df[ids.CYCLE_START] == True)).to_numpy())
+    if len(first_days) == 0:
+        return failures
+
+    figure = create_cycle_overlay_plot(df, ids.HRV, cycle_rollup=cycles)
+    traces = [trace for trace in figure['data'] if str(trace.get('name', '')).startswith('Cycle')]
+    if not traces:
+        failures.append(f"no cycle traces for {len(first_days)} cycle starts")
+    for trace in traces:
+        x, y = _values(trace['x']), _values(trace['y'])
+        start = first_days[int(trace['name'].split()[1]) - 1]
+        if x[0] != 1:
+            failures.append(f"{trace['name']} starts on cycle day {x[0]:g}")
+        elif not np.allclose(y, df[ids.HRV].to_numpy(dtype=float)[start:start + len(y)], equal_nan=True):
+            failures.append(f"{trace['name']} shows the rows of another cycle")
+
+    patch = overlay_metric_patch(df, PATCH_METRIC, cycles)
+    if not isinstance(patch, Patch):
+        # The full figure is sent when there are no cycle traces to patch
+        if traces:
+            failures.append("no patch for a figure with cycle traces")
+        return failures
+    full = create_cycle_overlay_plot(df, PATCH_METRIC, cycle_rollup=cycles)
+    for operation in patch.to_plotly_json()['operations']:
+        location = operation['location']
+        if location[0] == 'data' and not np.allclose(_values(full['data'][location[1]]['y']),
+                                                     _values(operation['params']['value']), equal_nan=True):
+            failures.append(f"patch of trace {location[1]} differs from the full figure")
+    return failures
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the cycle overlay of filtered and windowed daily frames")
+    parser.add_argument('--years', type=float, default=DEFAULT_YEARS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    export = generate_export(years=args.years, seed=args.seed)
+    dataset = build_dataset(export['physiological'], export['journal'], export['sleep'], export['workouts'])
+    daily = dataset[DAILY]
+
+    selections = {'whole dataset': daily}
+    for year in sorted(daily[ids.CYCLE_START_DATE].dt.year.dropna().unique().tolist()):
+        selections[f'year {year}'] = filter_data(daily, [year], None)
+    # Windows of the date range slider, in days since the epoch
+    first_day = (daily[ids.CYCLE_DATE].min() - pd.Timestamp(0)).days
+    for start, stop in [(100, 247), (365, 500), (30, 31 + int(365 * args.years) // 2)]:
+        selections[f'days {start}-{stop}'] = query_data(TOKEN, daily, None, None,
+                                                        {'dates': [first_day + start, first_day + stop]})
+
+    failures = [f"{name}: {failure}" for name, df in selections.items()
+                for failure in check_overlay(df, dataset[CYCLES])]
+
+    print(f"Checked the overlay of {len(selections)} selections")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import base64
+import json
+import platform
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.components.layout import (render_overview_tab, render_sleep_tab, render_recovery_tab,
+                                   render_trends_tab, render_stats_tab, create_cycle_overlay_plot)
+from src.data.cache import clear_stage_cache
+from src.data.forecast import overview_forecast
+from src.data.loader import parse_contents, process_data, build_dataset, filter_data, get_stats
+from src.data.rollups import DAILY, MONTHS, filter_rollup
+from src.data.synthetic import EXPORT_FILES, generate_export
+
+# Times the processing pipeline and the tab renderers on synthetic exports.
+# Run from the repository root:
+#   python -m benchmarks.run_benchmarks --years 1 5 20 --users 8 --output benchmarks/results.json
+# and compare two result files with:
+#   python -m benchmarks.run_benchmarks --compare old.json new.json
+DEFAULT_YEARS = [1, 5, 20]
+DEFAULT_USERS = 8
+DEFAULT_USER_YEARS = 2
+DEFAULT_REPEAT = 3
+DEFAULT_OUTPUT = Path(__file__).parent / 'results.json'
+
+def as_upload(df: pd.DataFrame) -> str:
+    """Encode a DataFrame like dcc.Upload encodes a CSV file"""
+    encoded = base64.b64encode(df.to_csv(index=False).encode()).decode()
+    return f'data:text/csv;base64,{encoded}'
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """Wall time of `repeat` calls; `setup` runs untimed before each call"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'min_s': round(min(times), 6), 'median_s': round(statistics.median(times), 6),
+            'max_s': round(max(times), 6), 'repeat': repeat}
+
+def bench_history(years: float, repeat: int, seed: int = 0) -> list[dict]:
+    """Time every stage on one user with `years` of history"""
+    export = generate_export(years=years, seed=seed)
+    uploads = {kind: as_upload(df) for kind, df in export.items()}
+    physiological, journal = export['physiological'], export['journal']
+
+    dataset = build_dataset(physiological, journal, export['sleep'], export['workouts'])
+    df = dataset[DAILY]
+    selected_years = sorted(pd.to_datetime(df[ids.CYCLE_DATE]).dt.year.unique().tolist())
+    filtered = filter_data(df, selected_years, list(range(1, 13)))
+    month_rollup = filter_rollup(dataset[MONTHS], selected_years, list(range(1, 13)))
+    forecast = overview_forecast(df)
+
+    benchmarks = {
+        'parse_contents': lambda: [parse_contents(contents, EXPORT_FILES[kind])
+                                   for kind, contents in uploads.items()],
+        'process_data': lambda: process_data(physiological, journal),
+        'filter_data': lambda: filter_data(df, selected_years, list(range(1, 13))),
+        'get_stats': lambda: get_stats(filtered),
+        'render_overview_tab': lambda: render_overview_tab(filtered, month_rollup, forecast),
+        'render_sleep_tab': lambda: render_sleep_tab(filtered),
+        'render_recovery_tab': lambda: render_recovery_tab(filtered),
+        'render_trends_tab': lambda: render_trends_tab(filtered),
+        'render_stats_tab': lambda: render_stats_tab(filtered),
+        'create_cycle_overlay_plot': lambda: create_cycle_overlay_plot(filtered, ids.RECOVERY_SCORE),
+    }
+    results = []
+    for name, func in benchmarks.items():
+        # Cold runs only: the stage cache would otherwise answer every repeat
+        timing = measure(func, repeat, setup=clear_stage_cache)
+        results.append({'benchmark': name, 'years': years, 'days': len(df), **timing})
+        print(f"{years:>5} years  {name:<28}{timing['median_s'] * 1000:>10.1f} ms")
+    return results
+
+def bench_users(n_users: int, years: float, repeat: int, workers: int) -> list[dict]:
+    """Upload, process and render the overview for many users, one after the other and concurrently"""
+    exports = [generate_export(years=years, seed=seed) for seed in range(n_users)]
+
+    def session(export: dict) -> None:
+        frames = {kind: parse_contents(as_upload(df), EXPORT_FILES[kind]) for kind, df in export.items()}
+        dataset = build_dataset(frames['physiological'], frames['journal'], frames['sleep'], frames['workouts'])
+        render_overview_tab(dataset[DAILY], dataset[MONTHS], overview_forecast(dataset[DAILY]))
+
+    results = []
+    for mode, n_workers in (('sequential', 1), ('concurrent', workers)):
+        def run():
+            with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                list(pool.map(session, exports))
+        timing = measure(run, repeat, setup=clear_stage_cache)
+        results.append({'benchmark': f'multi_user_{mode}', 'years': years, 'users': n_users,
+                        'workers': n_workers, **timing,
+                        'per_user_s': round(timing['median_s'] / n_users, 6)})
+        print(f"{n_users:>5} users  {mode:<28}{timing['median_s'] * 1000:>10.1f} ms")
+    return results
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'machine': platform.machine(), 'processor': platform.processor()}
+
+def compare(old_path: str, new_path: str) -> None:
+    """Print the median ratio new / old of every benchmark found in both files"""
+    def key(result):
+        return result['benchmark'], result['years'], result.get('users')
+    old = {key(r): r for r in json.loads(Path(old_path).read_text())['results']}
+    new = {key(r): r for r in json.loads(Path(new_path).read_text())['results']}
+    for k in sorted(old.keys() & new.keys(), key=str):
+        ratio = new[k]['median_s'] / old[k]['median_s'] if old[k]['median_s'] else float('nan')
+        print(f"{k[0]:<28}{k[1]:>5} years{old[k]['median_s'] * 1000:>10.1f} ms"
+              f"{new[k]['median_s'] * 1000:>10.1f} ms{ratio:>8.2f}x")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the processing pipeline on synthetic exports")
+    parser.add_argument('--years', type=float, nargs='+', default=DEFAULT_YEARS)
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS,
+                        help="Number of users of the multi-user benchmark (0 to skip it)")
+    parser.add_argument('--user-years', type=float, default=DEFAULT_USER_YEARS)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="Compare two result files instead of running the benchmarks")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    for years in args.years:
+        results.extend(bench_history(years, args.repeat))
+    if args.users:
+        results.extend(bench_users(args.users, args.user_years, args.repeat, args.workers))
+
+    Path(args.output).write_text(json.dumps({'environment': environment(), 'results': results}, indent=2))
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
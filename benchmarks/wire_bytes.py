@@ -0,0 +1,96 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+from pathlib import Path
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+# Local Imports
+from src.components import ids, figures, calendar_view
+from src.components.layout import (render_sleep_tab, render_recovery_tab,
+                                   create_cycle_overlay_plot, overlay_metric_patch)
+from src.data.loader import build_dataset, filter_data
+from src.data.rollups import DAILY, CYCLES
+from src.data.synthetic import generate_export
+from src.data.transport import encode_frame
+
+# Bytes on the wire of what the app sends to the browser for a synthetic
+# export, before (split JSON with ISO dates, figure arrays as JSON lists) and
+# after (Arrow IPC stores, typed arrays and epoch dates). Run from the
+# repository root:
+#   python -m benchmarks.wire_bytes --years 5 --output benchmarks/wire_bytes.json
+# Sizes are of the JSON Dash serialises, raw and gzipped (production responses
+# are compressed). The stored uploads cross the wire twice: down after the
+# upload and up again as inputs of the processing callback.
+DEFAULT_YEARS = 5
+
+@contextlib.contextmanager
+def json_lists():
+    """Build figures the way they were sent before typed arrays"""
+    size = figures.TYPED_ARRAY_MIN_SIZE
+    figures.TYPED_ARRAY_MIN_SIZE = float('inf')
+    try:
+        yield
+    finally:
+        figures.TYPED_ARRAY_MIN_SIZE = size
+
+def wire_size(payload) -> dict:
+    encoded = to_json_plotly(payload).encode()
+    return {'bytes': len(encoded), 'gzip_bytes': len(gzip.compress(encoded))}
+
+def store_sizes(export: dict) -> list[dict]:
+    results = []
+    for kind, df in export.items():
+        # What parse_contents returns for the uploaded CSV
+        uploaded = pd.read_csv(io.StringIO(df.to_csv(index=False)))
+        results.append({'payload': f'store:{kind}',
+                        'before': wire_size(uploaded.to_json(date_format='iso', orient='split')),
+                        'after': wire_size(encode_frame(uploaded))})
+    return results
+
+def figure_sizes(export: dict) -> list[dict]:
+    dataset = build_dataset(export['physiological'], export['journal'], export['sleep'], export['workouts'])
+    df = filter_data(dataset[DAILY], None, None)
+    builders = {
+        'figure:sleep': lambda: render_sleep_tab(df).children[0].figure,
+        'figure:recovery': lambda: render_recovery_tab(df).children[0].figure,
+        'figure:overlay': lambda: create_cycle_overlay_plot(df, ids.HRV, cycle_rollup=dataset[CYCLES]),
+        'patch:overlay': lambda: overlay_metric_patch(df, ids.RESTING_HR, dataset[CYCLES]),
+        'figure:calendar': lambda: calendar_view.create_calendar_heatmap(df, ids.HRV),
+    }
+    results = []
+    for name, build in builders.items():
+        with json_lists():
+            before = wire_size(build())
+        results.append({'payload': name, 'before': before, 'after': wire_size(build())})
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the bytes sent to the browser")
+    parser.add_argument('--years', type=float, default=DEFAULT_YEARS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    export = generate_export(years=args.years, seed=args.seed)
+    results = store_sizes(export) + figure_sizes(export)
+
+    print(f"{args.years:g} years of history ({len(export['physiological'])} days)")
+    print(f"{'payload':<22}{'before':>12}{'after':>12}{'ratio':>8}{'gzip before':>14}{'gzip after':>12}")
+    for result in results + [{'payload': 'total',
+                              'before': {k: sum(r['before'][k] for r in results) for k in ('bytes', 'gzip_bytes')},
+                              'after': {k: sum(r['after'][k] for r in results) for k in ('bytes', 'gzip_bytes')}}]:
+        before, after = result['before'], result['after']
+        print(f"{result['payload']:<22}{before['bytes']:>12,}{after['bytes']:>12,}"
+              f"{after['bytes'] / before['bytes']:>8.2f}{before['gzip_bytes']:>14,}{after['gzip_bytes']:>12,}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({'years': args.years, 'seed': args.seed,
+                                                 'results': results}, indent=2))
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
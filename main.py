@@ -1,250 +1,348 @@
-from dash import Dash, Input, Output, State, html, no_update, callback_context
+import logging
+import os
+
+from dash import (Dash, DiskcacheManager, ClientsideFunction, Input, Output, State, ALL, html, dcc,
+                  no_update, ctx)
+import diskcache
+import pandas as pd
 from dash_bootstrap_components.themes import MATERIA
 import plotly.graph_objects as go
-import pandas as pd
 
 # Local Imports
 from src.components.layout import (create_layout, render_overview_tab,
                                    render_sleep_tab, render_recovery_tab, 
                                    render_trends_tab, create_cycle_overlay_plot, 
-                                   create_phase_legend, render_stats_tab)
-from src.components import ids
-from src.data.loader import parse_contents, load_data, process_data, filter_data
+                                   create_phase_legend, render_stats_tab, render_stats_shell,
+                                   overlay_metric_patch)
+from src.components import ids, calendar_view, comparison_view, figures, query_chips
+from src.components.cycle_table import table_page
+from src.data.loader import (parse_contents, load_data, build_dataset,
+                             PROCESSING_STAGES, STAGE_PARSING, STATS_METRICS, STATS)
+from src.data.phase_models import FIXED_MODEL
+from src.data.forecast import dataset_forecast
+from src.data.rollups import DAILY, CYCLES, MONTHS, filter_rollup, rollup_years
+from src.data.export import write_frame, export_filename
+from src.data.schema import (sniff_upload, UploadError, EXPORT_LABELS, PHYSIOLOGICAL, JOURNAL,
+                             SLEEP, WORKOUTS)
+from src.data.comparison import compare_selections
+from src.data.query import query_data, has_conditions, journal_questions, DATES
+from src.data.transport import encode_frame
+from src.data.watcher import start_watcher, watch_directory, watched_token
+from src.data.cache import (dataset_token, get_dataset, store_dataset, configure_shared_store,
+                            shared_store, DEFAULT_DATASET_DIR)
+from src.api import register_api
+from src.instrumentation import instrument_callback, instrument_background, register_metrics
 
-def main() -> None:
-    # load the data and create the data manager
-    # data = load_transaction_data(DATA_PATH)
+# Production mode: no debug tooling, compressed responses and datasets shared
+# between the worker processes (see wsgi.py)
+PRODUCTION_ENV = 'WHOOP_PRODUCTION'
+
+# Processing and statistics run as background callbacks in separate processes,
+# which hand the datasets over to the web workers through the shared store
+BACKGROUND_CACHE_DIR = 'cache/background'
+UPLOADS = [ids.UPLOAD_PHYSIOLOGICAL, ids.UPLOAD_JOURNAL, ids.UPLOAD_SLEEP, ids.UPLOAD_WORKOUTS]
+UPLOAD_KINDS = [PHYSIOLOGICAL, JOURNAL, SLEEP, WORKOUTS]
+UPLOAD_STORES = [ids.STORED_DATA_PHYSIOLOGICAL, ids.STORED_DATA_JOURNAL, ids.STORED_DATA_SLEEP,
+                 ids.STORED_DATA_WORKOUTS]
+UPLOAD_STATUSES = [ids.UPLOAD_STATUS_PHYSIOLOGICAL, ids.UPLOAD_STATUS_JOURNAL, ids.UPLOAD_STATUS_SLEEP,
+                   ids.UPLOAD_STATUS_WORKOUTS]
+
+def is_production() -> bool:
+    return os.environ.get(PRODUCTION_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+# Dataset index flag of the sessions showing the watched folder's data
+WATCHED = 'watched'
+# The date range slider counts days since the epoch
+EPOCH = pd.Timestamp(0)
+
+def dataset_index(dataset: dict) -> dict:
+    """What the clientside callbacks need to know about a dataset"""
+    dates = dataset[DAILY][ids.CYCLE_DATE].dropna()
+    first_day, last_day = (dates.min() - EPOCH).days, (dates.max() - EPOCH).days
+    return {'years': rollup_years(dataset[MONTHS]), 'questions': journal_questions(dataset[DAILY]),
+            'first_day': first_day, 'last_day': last_day}
+
+def create_app(production: bool = None) -> Dash:
+    """Build the Dash app and register its callbacks; the Flask server is `app.server`"""
+    if production is None:
+        production = is_production()
 
     # Initialize the Dash app
+    background_manager = DiskcacheManager(diskcache.Cache(BACKGROUND_CACHE_DIR))
     app = Dash(__name__, suppress_callback_exceptions=True, 
-               external_stylesheets=[MATERIA])
+               external_stylesheets=[MATERIA], compress=production,
+               background_callback_manager=background_manager)
     app.title = "Whoop Cycle Analysis Dashboard"
 
+    # The background jobs and the workers share the processed datasets on disk
+    configure_shared_store(DEFAULT_DATASET_DIR)
+
+    # A production server reads the datasets of a separate watcher process from the store
+    if watch_directory() is not None and not production:
+        start_watcher(watch_directory())
+
     # Define the app layout
     app.layout = create_layout(app)
 
-    @app.callback(
+    # Latency and payload metrics on /metrics, one log line per callback
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    register_metrics(app.server, shared_store)
+
+    # Read-only JSON API over the processed datasets (src/api.py)
+    register_api(app.server)
+
+    # UI-only interactions run in the browser (assets/clientside.js)
+    app.clientside_callback(
+        ClientsideFunction(namespace='whoop', function_name='toggleUpload'),
         Output(ids.UPLOAD_SECTION_COLLAPSE, "is_open"),
         Output(ids.UPLOAD_ARROW, "children"),
         Input(ids.TOGGLE_UPLOAD_BUTTON, "n_clicks"),
         State(ids.UPLOAD_SECTION_COLLAPSE, "is_open"),
         prevent_initial_call=True
     )
-    def toggle_upload_section(n_clicks, is_open):
-        if n_clicks is None:
-            return no_update, no_update
-        new_state = not is_open
-        arrow = "▼" if new_state else "▶"
-        return new_state, arrow
-
-    # Callback for file uploads
-    @app.callback(
-        [Output(ids.STORED_DATA_PHYSIOLOGICAL, 'children'),
-        Output(ids.UPLOAD_STATUS_PHYSIOLOGICAL, 'children')],
-        [Input(ids.UPLOAD_PHYSIOLOGICAL, 'contents')],
-        [State(ids.UPLOAD_PHYSIOLOGICAL, 'filename')]
-    )
-    def update_physiological_data(contents: str, filename: str):
-        if contents is not None:
-            df = parse_contents(contents, filename)
-            if df is not None:
-                return df.to_json(date_format='iso', orient='split'), f"✓ {filename} uploaded successfully"
-            else:
-                return None, f"✗ Error uploading {filename}"
-        return None, ""
 
-    @app.callback(
-        [Output(ids.STORED_DATA_JOURNAL, 'children'),
-        Output(ids.UPLOAD_STATUS_JOURNAL, 'children')],
-        [Input(ids.UPLOAD_JOURNAL, 'contents')],
-        [State(ids.UPLOAD_JOURNAL, 'filename')]
-    )
-    def update_journal_data(contents: str, filename: str):
-        if contents is not None:
-            df = parse_contents(contents, filename)
-            if df is not None:
-                return df.to_json(date_format='iso', orient='split'), f"✓ {filename} uploaded successfully"
-            else:
-                return None, f"✗ Error uploading {filename}"
-        return None, ""
+    # Callbacks for file uploads, one per box so that a request only posts the file
+    # dropped in that box. Every file is identified from its first rows before it is
+    # parsed: a file dropped in the wrong box is moved to the right one through the
+    # duplicate outputs of the other boxes
+    def register_upload_callback(box: int) -> None:
+        others = [other for other in range(len(UPLOADS)) if other != box]
 
-    @app.callback(
-        [Output(ids.STORED_DATA_SLEEP, 'children'),
-        Output(ids.UPLOAD_STATUS_SLEEP, 'children')],
-        [Input(ids.UPLOAD_SLEEP, 'contents')],
-        [State(ids.UPLOAD_SLEEP, 'filename')]
-    )
-    def update_sleep_data(contents: str, filename: str):
-        if contents is not None:
-            df = parse_contents(contents, filename)
-            if df is not None:
-                return df.to_json(date_format='iso', orient='split'), f"✓ {filename} uploaded successfully"
-            else:
-                return None, f"✗ Error uploading {filename}"
-        return None, ""
+        @app.callback(
+            [Output(UPLOAD_STORES[box], 'data'), Output(UPLOAD_STATUSES[box], 'children')] +
+            [Output(UPLOAD_STORES[other], 'data', allow_duplicate=True) for other in others] +
+            [Output(UPLOAD_STATUSES[other], 'children', allow_duplicate=True) for other in others],
+            Input(UPLOADS[box], 'contents'),
+            State(UPLOADS[box], 'filename'),
+            prevent_initial_call=True
+        )
+        @instrument_callback
+        def update_upload(contents, filename):
+            stores, statuses = [no_update] * len(UPLOADS), [no_update] * len(UPLOADS)
+            ordered = lambda: ([stores[box], statuses[box]] + [stores[other] for other in others] +
+                               [statuses[other] for other in others])
+            if contents is None:
+                stores[box], statuses[box] = None, ""
+                return ordered()
+            try:
+                kind = sniff_upload(contents)
+            except UploadError as error:
+                stores[box], statuses[box] = None, f"✗ {filename}: {error}"
+                return ordered()
 
-    @app.callback(
-        [Output(ids.STORED_DATA_WORKOUTS, 'children'),
-        Output(ids.UPLOAD_STATUS_WORKOUTS, 'children')],
-        [Input(ids.UPLOAD_WORKOUTS, 'contents')],
-        [State(ids.UPLOAD_WORKOUTS, 'filename')]
-    )
-    def update_workouts_data(contents: str, filename: str):
-        if contents is not None:
             df = parse_contents(contents, filename)
-            if df is not None:
-                return df.to_json(date_format='iso', orient='split'), f"✓ {filename} uploaded successfully"
+            if df is None:
+                stores[box], statuses[box] = None, f"✗ Error uploading {filename}"
+                return ordered()
+
+            target = UPLOAD_KINDS.index(kind)
+            stores[target] = encode_frame(df)
+            if target == box:
+                statuses[box] = f"✓ {filename} uploaded successfully"
             else:
-                return None, f"✗ Error uploading {filename}"
-        return None, ""
+                statuses[box] = f"↪ {filename} is a {EXPORT_LABELS[kind]} export, moved there"
+                statuses[target] = f"✓ {filename} uploaded successfully (from {EXPORT_LABELS[UPLOAD_KINDS[box]]})"
+            return ordered()
+
+    for box in range(len(UPLOADS)):
+        register_upload_callback(box)
 
     # Callback to process data and show main content
     @app.callback(
         [Output(ids.PROCESSED_DATA, 'children'),
+        Output(ids.DATASET_INDEX, 'data'),
         Output(ids.MAIN_CONTENT, 'style')],
-        [Input(ids.STORED_DATA_PHYSIOLOGICAL, 'children'),
-        Input(ids.STORED_DATA_JOURNAL, 'children'),
-        Input(ids.STORED_DATA_SLEEP, 'children'),
-        Input(ids.STORED_DATA_WORKOUTS, 'children')]
+        [Input(ids.STORED_DATA_PHYSIOLOGICAL, 'data'),
+        Input(ids.STORED_DATA_JOURNAL, 'data'),
+        Input(ids.STORED_DATA_SLEEP, 'data'),
+        Input(ids.STORED_DATA_WORKOUTS, 'data'),
+        Input(ids.PHASE_MODEL_DROPDOWN, 'value')],
+        [State(ids.PROCESSED_DATA, 'children')],
+        background=True,
+        progress=[Output(ids.PROCESSING_PROGRESS, 'value'),
+                  Output(ids.PROCESSING_PROGRESS, 'label')],
+        running=[(Output(ids.PROCESSING_PROGRESS_CONTAINER, 'style'), 
+                  {"width": "48%", "margin": "10px auto"}, {'display': 'none'})],
+        # A new upload makes the running job obsolete
+        cancel=[Input(upload, 'contents') for upload in UPLOADS],
     )
-    def process_and_show_data(phys_data: pd.DataFrame, journal_data: pd.DataFrame, 
-                                sleep_data: pd.DataFrame, workout_data: pd.DataFrame):
+    @instrument_background(shared_store)
+    def process_and_show_data(set_progress, phys_data: dict, journal_data: dict, 
+                                sleep_data: dict, workout_data: dict,
+                                phase_model: str, previous_token: str):
         if phys_data is not None and journal_data is not None:
+            phase_model = phase_model or FIXED_MODEL
+            # The processed dataset stays on the server, the browser only keeps its token
+            token = dataset_token(phys_data, journal_data, sleep_data, workout_data, phase_model)
+            dataset = get_dataset(token)
+            if dataset is not None:
+                return token, dataset_index(dataset), {'display': 'block'}
+
+            def report(stage: str):
+                set_progress((100 * PROCESSING_STAGES.index(stage) // len(PROCESSING_STAGES), stage))
+
             # Load data
-            phys_df = pd.read_json(phys_data, orient='split')
-            journal_df = pd.read_json(journal_data, orient='split')
-            sleep_df = pd.read_json(sleep_data, orient='split') if sleep_data else None
-            workout_df = pd.read_json(workout_data, orient='split') if workout_data else None
+            report(STAGE_PARSING)
+            phys_df = load_data(phys_data)
+            journal_df = load_data(journal_data)
+            sleep_df = load_data(sleep_data) if sleep_data else None
+            workout_df = load_data(workout_data) if workout_data else None
             
-            # Process data
-            processed_df = process_data(phys_df, journal_df, sleep_df, workout_df)
+            # Process data (only the rollups of changed cycles are rebuilt)
+            dataset = build_dataset(phys_df, journal_df, sleep_df, workout_df, 
+                                    phase_model=phase_model, 
+                                    previous=get_dataset(previous_token),
+                                    progress=report)
             
-            if processed_df is not None:
-                return processed_df.to_json(date_format='iso', orient='split'), {'display': 'block'}
+            if dataset is not None:
+                return store_dataset(token, dataset), dataset_index(dataset), {'display': 'block'}
         
-        return None, {'display': 'none'}
+        # Without uploads the session may show the watched folder's data
+        if watch_directory() is not None:
+            return no_update, no_update, no_update
+        return None, None, {'display': 'none'}
 
-    # Combined callback for year dropdown
+    # Callback switching the sessions without uploads to the latest data of the watched folder
     @app.callback(
+        [Output(ids.PROCESSED_DATA, 'children', allow_duplicate=True),
+        Output(ids.DATASET_INDEX, 'data', allow_duplicate=True),
+        Output(ids.MAIN_CONTENT, 'style', allow_duplicate=True)],
+        [Input(ids.WATCH_INTERVAL, 'n_intervals'),
+        Input(ids.PHASE_MODEL_DROPDOWN, 'value')],
+        [State(ids.PROCESSED_DATA, 'children'),
+        State(ids.DATASET_INDEX, 'data')],
+        prevent_initial_call='initial_duplicate'
+    )
+    @instrument_callback
+    def refresh_watched_data(n_intervals, phase_model, current_token, index):
+        directory = watch_directory()
+        # Sessions with uploads of their own keep them
+        if directory is None or (index is not None and not index.get(WATCHED)):
+            return no_update, no_update, no_update
+        
+        token = watched_token(directory, phase_model or FIXED_MODEL)
+        dataset = get_dataset(token) if token != current_token else None
+        if dataset is None:
+            return no_update, no_update, no_update
+        return token, {**dataset_index(dataset), WATCHED: True}, {'display': 'block'}
+
+    # Year options come from the dataset index, months are fixed in the layout
+    app.clientside_callback(
+        ClientsideFunction(namespace='whoop', function_name='manageYears'),
         Output(ids.YEAR_DROPDOWN, 'options'),
         Output(ids.YEAR_DROPDOWN, 'value'),
-        [Input(ids.PROCESSED_DATA, 'children'),
+        [Input(ids.DATASET_INDEX, 'data'),
         Input(ids.SELECT_ALL_YEARS_BUTTON, 'n_clicks')],
         [State(ids.YEAR_DROPDOWN, 'options'),
         State(ids.YEAR_DROPDOWN, 'value')]
     )
-    def manage_year_dropdown(processed_data, n_clicks, current_options, current_value):
-        ctx = callback_context
-        
-        if not ctx.triggered:
-            return [], None
-        
-        trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-        
-        # If data was just processed, populate the dropdown
-        if trigger_id == ids.PROCESSED_DATA:
-            if processed_data is None:
-                return [], None
-            
-            df = load_data(processed_data=processed_data)
-            
-            # Extract years
-            df[ids.CYCLE_START_DATE] = pd.to_datetime(df[ids.CYCLE_START_DATE])
-            years = sorted(df[ids.CYCLE_START_DATE].dt.year.unique())
-            year_options = [{'label': str(year), 'value': year} for year in years]
-            
-            # Select all by default
-            return year_options, years
-        
-        # If "Select All" button was clicked
-        elif trigger_id == ids.SELECT_ALL_YEARS_BUTTON:
-            if n_clicks is None or n_clicks == 0:
-                return no_update, no_update
-            
-            # Toggle: if all selected, deselect all; otherwise select all
-            if current_options and current_value and len(current_value) == len(current_options):
-                return no_update, []
-            
-            if current_options:
-                return no_update, [option['value'] for option in current_options]
-        
-        return no_update, no_update
 
-    # Combined callback for month dropdown
-    @app.callback(
-        Output(ids.MONTH_DROPDOWN, 'options'),
+    app.clientside_callback(
+        ClientsideFunction(namespace='whoop', function_name='manageMonths'),
         Output(ids.MONTH_DROPDOWN, 'value'),
-        [Input(ids.PROCESSED_DATA, 'children'),
+        [Input(ids.DATASET_INDEX, 'data'),
         Input(ids.SELECT_ALL_MONTHS_BUTTON, 'n_clicks')],
         [State(ids.MONTH_DROPDOWN, 'options'),
         State(ids.MONTH_DROPDOWN, 'value')]
     )
-    def manage_month_dropdown(processed_data, n_clicks, current_options, current_value):
-        ctx = callback_context
-        
-        if not ctx.triggered:
-            return [], None
-        
-        trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-        
-        # If data was just processed, populate the dropdown
-        if trigger_id == ids.PROCESSED_DATA:
-            if processed_data is None:
-                return [], None
-            
-            # Month options (always the same)
-            months = [
-                {'label': 'January', 'value': 1},
-                {'label': 'February', 'value': 2},
-                {'label': 'March', 'value': 3},
-                {'label': 'April', 'value': 4},
-                {'label': 'May', 'value': 5},
-                {'label': 'June', 'value': 6},
-                {'label': 'July', 'value': 7},
-                {'label': 'August', 'value': 8},
-                {'label': 'September', 'value': 9},
-                {'label': 'October', 'value': 10},
-                {'label': 'November', 'value': 11},
-                {'label': 'December', 'value': 12}
-            ]
-            
-            # Select all by default
-            return months, list(range(1, 13))
-        
-        # If "Select All" button was clicked
-        elif trigger_id == ids.SELECT_ALL_MONTHS_BUTTON:
-            if n_clicks is None or n_clicks == 0:
-                return no_update, no_update
-            
-            # Toggle: if all selected, deselect all; otherwise select all
-            if current_options and current_value and len(current_value) == len(current_options):
-                return no_update, []
-            
-            if current_options:
-                return no_update, [option['value'] for option in current_options]
-        
-        return no_update, no_update
     
+    # Range of the date slider from the dataset index
+    app.clientside_callback(
+        ClientsideFunction(namespace='whoop', function_name='manageDateRange'),
+        Output(ids.DATE_RANGE_SLIDER, 'min'),
+        Output(ids.DATE_RANGE_SLIDER, 'max'),
+        Output(ids.DATE_RANGE_SLIDER, 'marks'),
+        Output(ids.DATE_RANGE_SLIDER, 'value'),
+        [Input(ids.DATASET_INDEX, 'data')]
+    )
+
+    # Controls of the selected query field
+    app.clientside_callback(
+        ClientsideFunction(namespace='whoop', function_name='showQueryControls'),
+        Output(ids.QUERY_PHASES, 'style'),
+        Output(ids.QUERY_ANSWER, 'style'),
+        Output(ids.QUERY_RANGE, 'style'),
+        [Input(ids.QUERY_FIELD, 'value')],
+        [State(ids.QUERY_PHASES, 'style'),
+        State(ids.QUERY_ANSWER, 'style'),
+        State(ids.QUERY_RANGE, 'style')]
+    )
+
+    # Query fields with the journal questions of the dataset
+    @app.callback(
+        Output(ids.QUERY_FIELD, 'options'),
+        [Input(ids.DATASET_INDEX, 'data')]
+    )
+    @instrument_callback
+    def update_query_fields(index):
+        return query_chips.field_options(index.get('questions', []) if index else [])
+
+    # Callback adding and removing the query conditions and setting the date window
+    @app.callback(
+        [Output(ids.QUERY, 'data'),
+         Output(ids.QUERY_CHIPS, 'children')],
+        [Input(ids.QUERY_ADD_BUTTON, 'n_clicks'),
+        Input(ids.QUERY_COMBINE, 'value'),
+        Input({'type': ids.QUERY_CHIP, 'index': ALL}, 'n_clicks'),
+        Input(ids.DATE_RANGE_SLIDER, 'value')],
+        [State(ids.DATE_RANGE_SLIDER, 'min'),
+        State(ids.DATE_RANGE_SLIDER, 'max'),
+        State(ids.QUERY_FIELD, 'value'),
+        State(ids.QUERY_PHASES, 'value'),
+        State(ids.QUERY_ANSWER, 'value'),
+        State(ids.QUERY_LOW, 'value'),
+        State(ids.QUERY_HIGH, 'value'),
+        State(ids.QUERY, 'data')],
+        prevent_initial_call=True
+    )
+    @instrument_callback
+    def update_query(add_clicks, combine, chip_clicks, date_range, first_day, last_day,
+                     field, phases, answer, low, high, query):
+        predicates = list((query or {}).get('predicates', []))
+        triggered = ctx.triggered_id
+        if triggered == ids.QUERY_ADD_BUTTON:
+            predicate = query_chips.build_predicate(field, phases, answer, low, high)
+            if predicate is None or predicate in predicates:
+                return no_update, no_update
+            predicates.append(predicate)
+        elif isinstance(triggered, dict):
+            # Chips are re-rendered with n_clicks=0, only a click removes one
+            if not ctx.triggered[0]['value']:
+                return no_update, no_update
+            predicates.pop(triggered['index'])
+        # The whole range selects every day: no window, the month rollup still applies
+        window = date_range if date_range and list(date_range) != [first_day, last_day] else None
+        query = {'combine': combine, 'predicates': predicates, DATES: window}
+        if triggered == ids.DATE_RANGE_SLIDER:
+            return query, no_update
+        return query, query_chips.render_chips(query)
+
     # Callback for tab content
     @app.callback(
         Output(ids.TAB_CONTENT, 'children'),
         [Input(ids.TABS, 'value'),
         Input(ids.PROCESSED_DATA, 'children'),
         Input(ids.YEAR_DROPDOWN, 'value'),
-        Input(ids.MONTH_DROPDOWN, 'value')]
+        Input(ids.MONTH_DROPDOWN, 'value'),
+        Input(ids.QUERY, 'data')]
     )
+    @instrument_callback
     def render_tab_content(active_tab, processed_data, 
-                           selected_years, selected_months):
-        if processed_data is None:
+                           selected_years, selected_months, query):
+        dataset = get_dataset(processed_data)
+        if dataset is None:
             return html.Div("Please upload physiological and journal data to continue.")
         
-        df = load_data(processed_data=processed_data)
-
         # Apply filters
-        df = filter_data(df, selected_years, selected_months)
+        df = query_data(processed_data, dataset[DAILY], selected_years, selected_months, query)
         
         if active_tab == 'overview':
-            return render_overview_tab(df)
+            # The month rollup only holds whole months: conditions on the days need the rows
+            month_rollup = None if has_conditions(query) else filter_rollup(dataset[MONTHS], selected_years, 
+                                                                            selected_months)
+            return render_overview_tab(df, month_rollup, dataset_forecast(processed_data, dataset[DAILY]))
+        elif active_tab == 'calendar':
+            return calendar_view.render()
         elif active_tab == 'sleep':
             return render_sleep_tab(df)
         elif active_tab == 'recovery':
@@ -252,7 +350,53 @@ def main() -> None:
         elif active_tab == 'trends':
             return render_trends_tab(df)
         elif active_tab == 'stats':
-            return render_stats_tab(df)
+            return render_stats_shell()
+        elif active_tab == 'compare':
+            return comparison_view.render(dataset)
+
+    # Callback running the statistical tests in the background
+    @app.callback(
+        Output(ids.STATS_CONTENT, 'children'),
+        [Input(ids.PROCESSED_DATA, 'children'),
+        Input(ids.YEAR_DROPDOWN, 'value'),
+        Input(ids.MONTH_DROPDOWN, 'value'),
+        Input(ids.QUERY, 'data')],
+        background=True,
+        progress=[Output(ids.STATS_PROGRESS, 'value'),
+                  Output(ids.STATS_PROGRESS, 'label')],
+        running=[(Output(ids.STATS_PROGRESS_CONTAINER, 'style'), 
+                  {'margin': '20px'}, {'display': 'none'})],
+        cancel=[Input(ids.TABS, 'value')] + [Input(upload, 'contents') for upload in UPLOADS],
+    )
+    @instrument_background(shared_store)
+    def update_stats_content(set_progress, processed_data, selected_years, selected_months, query):
+        dataset = get_dataset(processed_data)
+        if dataset is None:
+            return html.Div("Please upload physiological and journal data to continue.")
+        
+        def report(metric: str):
+            set_progress((100 * STATS_METRICS.index(metric) // len(STATS_METRICS), metric))
+
+        df = query_data(processed_data, dataset[DAILY], selected_years, selected_months, query)
+        if STATS in dataset and len(df) == len(dataset[DAILY]):
+            # Whole dataset selected and processed by the batch processor
+            return render_stats_tab(df, stats=dataset[STATS])
+        return render_stats_tab(df, progress=report)
+
+    # Callback comparing two periods, from the rollups and the cached statistics of each period
+    @app.callback(
+        Output(ids.COMPARE_CONTENT, 'children'),
+        [Input(ids.COMPARE_A, 'value'),
+        Input(ids.COMPARE_B, 'value'),
+        Input(ids.PROCESSED_DATA, 'children')]
+    )
+    @instrument_callback
+    def update_comparison(selection_a, selection_b, processed_data):
+        dataset = get_dataset(processed_data)
+        if dataset is None or not selection_a or not selection_b:
+            return html.Div()
+        table = compare_selections(processed_data, dataset, selection_a, selection_b)
+        return comparison_view.render_comparison(table, selection_a, selection_b)
 
     # Callback for updating calendar visualizations
     @app.callback(
@@ -261,26 +405,112 @@ def main() -> None:
         [Input(ids.TREND_METRIC_DROPDOWN, 'value'),
         Input(ids.PROCESSED_DATA, 'children'),
         Input(ids.YEAR_DROPDOWN, 'value'),
-        Input(ids.MONTH_DROPDOWN, 'value')]
+        Input(ids.MONTH_DROPDOWN, 'value'),
+        Input(ids.QUERY, 'data'),
+        Input(ids.CYCLE_TABLE, 'active_cell')]
     )
+    @instrument_callback
     def update_calendar_plots(selected_metric, processed_data, 
-                              selected_years, selected_months):
-        if processed_data is None or selected_metric is None:
+                              selected_years, selected_months, query, active_cell):
+        dataset = get_dataset(processed_data)
+        if dataset is None or selected_metric is None:
             return go.Figure(), go.Figure()
         
-        df = load_data(processed_data=processed_data)
         # Apply filters
-        df = filter_data(df, selected_years, selected_months)
+        df = query_data(processed_data, dataset[DAILY], selected_years, selected_months, query)
+        
+        # Only the metric changed: the traces stay, swap their y values
+        if ctx.triggered_id == ids.TREND_METRIC_DROPDOWN and len(ctx.triggered) == 1:
+            return overlay_metric_patch(df, selected_metric, dataset[CYCLES]), no_update
         
         # Create cycle overlay plot
-        overlay_fig = create_cycle_overlay_plot(df, selected_metric, 
-                                                f"Cycle Overlay - {selected_metric}")
+        overlay_fig = create_cycle_overlay_plot(df, selected_metric,
+                                                cycle_rollup=dataset[CYCLES],
+                                                highlight_cycle=active_cell['row_id'] if active_cell else None)
         legend_fig = create_phase_legend()
         
         return [overlay_fig, legend_fig]
 
+    # Callback for the calendar heatmap
+    @app.callback(
+        Output(ids.CALENDAR_PLOT, 'figure'),
+        [Input(ids.CALENDAR_METRIC_DROPDOWN, 'value'),
+        Input(ids.PROCESSED_DATA, 'children'),
+        Input(ids.YEAR_DROPDOWN, 'value'),
+        Input(ids.MONTH_DROPDOWN, 'value'),
+        Input(ids.QUERY, 'data')]
+    )
+    @instrument_callback
+    def update_calendar_heatmap(selected_metric, processed_data, 
+                                selected_years, selected_months, query):
+        dataset = get_dataset(processed_data)
+        if dataset is None or selected_metric is None:
+            return go.Figure()
+        
+        df = query_data(processed_data, dataset[DAILY], selected_years, selected_months, query)
+        # The date grid only depends on the selection, so it is reused across metrics
+        grid = calendar_view.cached_calendar_grid(processed_data, df, selected_years, selected_months, query)
+        return calendar_view.create_calendar_heatmap(df, selected_metric, grid)
+
+    # Callback serving one page of the cycle history table
+    @app.callback(
+        [Output(ids.CYCLE_TABLE, 'data'),
+         Output(ids.CYCLE_TABLE, 'page_count')],
+        [Input(ids.CYCLE_TABLE, 'page_current'),
+        Input(ids.CYCLE_TABLE, 'page_size'),
+        Input(ids.CYCLE_TABLE, 'sort_by'),
+        Input(ids.TREND_METRIC_DROPDOWN, 'value'),
+        Input(ids.PROCESSED_DATA, 'children'),
+        Input(ids.YEAR_DROPDOWN, 'value'),
+        Input(ids.MONTH_DROPDOWN, 'value'),
+        Input(ids.QUERY, 'data')]
+    )
+    @instrument_callback
+    def update_cycle_table(page_current, page_size, sort_by, selected_metric, 
+                           processed_data, selected_years, selected_months, query):
+        dataset = get_dataset(processed_data)
+        if dataset is None or selected_metric is None:
+            return [], 1
+        
+        # With conditions on the days, the cycles with at least one selected day
+        cycle_ids = None
+        if has_conditions(query):
+            df = query_data(processed_data, dataset[DAILY], selected_years, selected_months, query)
+            cycle_ids = df[ids.CYCLE_ID].unique()
+        return table_page(processed_data, dataset[CYCLES], selected_metric, sort_by, 
+                          selected_years, selected_months, page_current, page_size, cycle_ids=cycle_ids)
+
+    # Callback writing the filtered daily data for download, straight from the cached dataset
+    @app.callback(
+        Output(ids.DOWNLOAD, 'data'),
+        [Input(ids.DOWNLOAD_BUTTON, 'n_clicks')],
+        [State(ids.DOWNLOAD_FORMAT, 'value'),
+        State(ids.PROCESSED_DATA, 'children'),
+        State(ids.YEAR_DROPDOWN, 'value'),
+        State(ids.MONTH_DROPDOWN, 'value'),
+        State(ids.QUERY, 'data')],
+        prevent_initial_call=True
+    )
+    @instrument_callback
+    def download_data(n_clicks, export_format, processed_data, selected_years, selected_months, query):
+        dataset = get_dataset(processed_data)
+        if dataset is None:
+            return no_update
+        
+        df = query_data(processed_data, dataset[DAILY], selected_years, selected_months, query)
+        return dcc.send_bytes(lambda output: write_frame(df, output, export_format),
+                              export_filename(processed_data, export_format))
+
+    return app
+
+def main() -> None:
+    debug = not is_production()
+    if debug:
+        # Check the figures built without plotly validation (see src/components/figures.py)
+        os.environ.setdefault(figures.VALIDATE_ENV, '1')
+    app = create_app()
     # Run app
-    app.run(debug=True)
+    app.run(debug=debug)
 
 if __name__ == "__main__":
     main()
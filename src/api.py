@@ -0,0 +1,168 @@
+import json
+import math
+import flask
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.data.cache import LRUCache, fingerprint, get_dataset
+from src.data.loader import filter_data, get_stats, STATS
+from src.data.rollups import (DAILY, CYCLES, MONTHS, PHASES, ROLLUP_METRICS, filter_rollup,
+                              phase_days_column, phase_means, rollup_column)
+
+# Read-only JSON API over the processed datasets of the server, for scripts and
+# other dashboards polling the same data:
+#   /api/v1/datasets/<token>/daily    daily metrics (paginated)
+#   /api/v1/datasets/<token>/cycles   per cycle rollup (paginated)
+#   /api/v1/datasets/<token>/phases   per phase aggregates
+#   /api/v1/datasets/<token>/stats    results of the statistical analysis tab
+# `years` and `months` filter like the dashboard filters (comma separated or
+# repeated), `page` (from 1) and `page_size` paginate.
+API_PREFIX = '/api/v1/datasets'
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# A token names an immutable dataset, so a response only depends on the token,
+# the endpoint and its parameters and its ETag can be computed from them alone:
+# a poll with a matching If-None-Match is answered 304 without loading the data.
+# Bump the version when the content of the responses changes.
+API_VERSION = 1
+MAX_RESPONSES = 256
+
+DAILY_COLUMNS = [ids.CYCLE_DATE, ids.CYCLE_ID, ids.CYCLE_DAY_NUMBER, ids.PHASE,
+                 ids.PROVISIONAL_PHASE] + ROLLUP_METRICS
+
+_responses = LRUCache('api', MAX_RESPONSES)
+
+class BadRequest(ValueError):
+    """Invalid query parameter, answered with a 400"""
+
+def _integers(name: str, low: int = None, high: int = None) -> list[int]:
+    values = set()
+    for value in flask.request.args.getlist(name):
+        for item in filter(None, (part.strip() for part in value.split(','))):
+            try:
+                number = int(item)
+            except ValueError:
+                raise BadRequest(f"'{name}' must be integers, got '{item}'")
+            if low is not None and number < low:
+                raise BadRequest(f"'{name}' must be at least {low}, got {number}")
+            if high is not None and number > high:
+                raise BadRequest(f"'{name}' must be at most {high}, got {number}")
+            values.add(number)
+    return sorted(values)
+
+def _integer(name: str, default: int, low: int, high: int = None) -> int:
+    values = _integers(name, low, high)
+    if len(values) > 1:
+        raise BadRequest(f"'{name}' takes a single value")
+    return values[0] if values else default
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    # to_json writes NaN as null and dates as ISO strings
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+def _number(value) -> float:
+    return None if value is None or pd.isna(value) else float(value)
+
+def _page(df: pd.DataFrame, params: dict) -> dict:
+    page, page_size = params['page'], params['page_size']
+    rows = df.iloc[(page - 1) * page_size:page * page_size]
+    return {'page': page, 'page_size': page_size, 'total': len(df),
+            'pages': max(math.ceil(len(df) / page_size), 1), 'data': _records(rows)}
+
+def daily_response(dataset: dict, params: dict) -> dict:
+    df = filter_data(dataset[DAILY], params['years'], params['months'])
+    return _page(df[[column for column in DAILY_COLUMNS if column in df.columns]], params)
+
+def cycles_response(dataset: dict, params: dict) -> dict:
+    # Cycles are selected by the date they start on, like the cycle table does
+    cycles = dataset[CYCLES]
+    start = pd.to_datetime(cycles[ids.CYCLE_DATE])
+    mask = np.ones(len(cycles), dtype=bool)
+    if params['years']:
+        mask &= start.dt.year.isin(params['years'])
+    if params['months']:
+        mask &= start.dt.month.isin(params['months'])
+    return _page(cycles[mask].reset_index(), params)
+
+def phases_response(dataset: dict, params: dict) -> dict:
+    rollup = filter_rollup(dataset[MONTHS], params['years'], params['months'])
+    phases = {}
+    for phase in PHASES:
+        metrics = {}
+        for metric in ROLLUP_METRICS:
+            count_col = rollup_column(metric, phase, 'count')
+            if count_col not in rollup.columns:
+                continue
+            metrics[metric] = {
+                'mean': _number(phase_means(rollup, metric)[phase]),
+                'min': _number(rollup[rollup_column(metric, phase, 'min')].min()),
+                'max': _number(rollup[rollup_column(metric, phase, 'max')].max()),
+                'count': int(rollup[count_col].sum()),
+            }
+        phases[phase] = {'days': int(rollup[phase_days_column(phase)].sum()), 'metrics': metrics}
+    return {'data': phases}
+
+def stats_response(dataset: dict, params: dict) -> dict:
+    df = filter_data(dataset[DAILY], params['years'], params['months'])
+    # The whole dataset's stats may have been computed ahead of time (src.data.batch)
+    if STATS in dataset and len(df) == len(dataset[DAILY]):
+        stats = dataset[STATS]
+    else:
+        stats = get_stats(df)
+    descriptive, overall, pairwise = stats
+    return {'data': {'descriptive': _records(descriptive), 'overall': _records(overall),
+                     'pairwise': _records(pairwise)}}
+
+ENDPOINTS = {
+    'daily': (daily_response, True),
+    'cycles': (cycles_response, True),
+    'phases': (phases_response, False),
+    'stats': (stats_response, False),
+}
+
+def _cached_body(etag: str, compute) -> bytes:
+    # compute returns None for an unknown dataset, which is not cached
+    return _responses.get_or_compute(etag, compute)
+
+def _error(status: int, message: str) -> flask.Response:
+    return flask.Response(json.dumps({'error': message}), status=status, mimetype='application/json')
+
+def register_api(server: flask.Flask) -> None:
+    """Serve the read-only dataset API under API_PREFIX"""
+
+    @server.route(f'{API_PREFIX}/<token>/<endpoint>')
+    def dataset_api(token: str, endpoint: str):
+        if endpoint not in ENDPOINTS:
+            return _error(404, f"Unknown endpoint '{endpoint}', one of {sorted(ENDPOINTS)}")
+        build, paginated = ENDPOINTS[endpoint]
+        try:
+            params = {'years': _integers('years'), 'months': _integers('months', 1, 12)}
+            if paginated:
+                params.update(page=_integer('page', 1, 1),
+                              page_size=_integer('page_size', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE))
+        except BadRequest as error:
+            return _error(400, str(error))
+
+        etag = fingerprint(API_VERSION, token, endpoint, params)
+        if flask.request.if_none_match.contains(etag):
+            response = flask.Response(status=304)
+        else:
+            def compute():
+                dataset = get_dataset(token)
+                if dataset is None:
+                    return None
+                content = {'dataset': token, 'filters': {'years': params['years'], 'months': params['months']}}
+                content.update(build(dataset, params))
+                return json.dumps(content).encode()
+
+            body = _cached_body(etag, compute)
+            if body is None:
+                return _error(404, f"Unknown dataset '{token}'")
+            response = flask.Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Clients may keep responses but must revalidate them
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,141 @@
+from dash import html, dcc
+import plotly.graph_objects as go
+import pandas as pd
+import numpy as np
+
+from src.components import ids, figures
+from src.data.cache import LRUCache, fingerprint
+from src.instrumentation import timed_stage
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+N_WEEKS = 54
+
+# Grids per dataset and selection, apart from the pipeline stages so that
+# browsing the calendar never evicts the processed frames
+MAX_GRIDS = 16
+
+_grids = LRUCache('calendar-grid', MAX_GRIDS)
+
+def render() -> html.Div:
+    """Render the calendar view tab"""
+    return html.Div([
+        html.H4(),
+        html.H3("Calendar View"),
+        html.Div([
+            html.Label("Select Metric for Visualization:"),
+            dcc.Dropdown(
+                id=ids.CALENDAR_METRIC_DROPDOWN,
+                options=[{'label': metric, 'value': metric} for metric in
+                         [ids.RECOVERY_SCORE, ids.RESTING_HR, ids.HRV, ids.SKIN_TEMP,
+                          ids.SLEEP_PERFORMANCE, ids.DAY_STRAIN, ids.SLEEP_EFFICIENCY]],
+                value=ids.RECOVERY_SCORE,
+                clearable=False,
+                style={'margin-bottom': '20px'}
+            )
+        ]),
+        html.P("One square per day, one row per weekday. The outline shows the cycle phase."),
+        dcc.Graph(id=ids.CALENDAR_PLOT),
+    ])
+
+@timed_stage('calendar_grid')
+def calendar_grid(df: pd.DataFrame) -> dict:
+    """
+    Position of every day in a year x weekday x week grid.
+
+    Only depends on the dates and phases, so it is cached per dataset and
+    filter selection and reused when the metric changes.
+    """
+    dates = pd.to_datetime(df[ids.CYCLE_DATE]).dt.normalize().to_numpy()
+    years = dates.astype('datetime64[Y]')
+    jan_first = years.astype('datetime64[D]')
+    day_of_year = (dates.astype('datetime64[D]') - jan_first).astype(int)
+    # numpy weekdays: 1970-01-01 was a Thursday (Monday = 0)
+    jan_first_weekday = (jan_first.astype(int) + 3) % 7
+
+    unique_years, year_idx = np.unique(years, return_inverse=True)
+    weekday = (day_of_year + jan_first_weekday) % 7
+    week = (day_of_year + jan_first_weekday) // 7
+
+    shape = (len(unique_years), 7, N_WEEKS)
+    date_text = np.full(shape, '', dtype=object)
+    date_text[year_idx, weekday, week] = np.datetime_as_string(dates, unit='D')
+    phases = np.full(shape, '', dtype=object)
+    phases[year_idx, weekday, week] = df[ids.PHASE].to_numpy()
+
+    return {
+        'years': unique_years.astype(int) + 1970,
+        'index': (year_idx, weekday, week),
+        'shape': shape,
+        'date_text': date_text,
+        'phases': phases,
+    }
+
+def cached_calendar_grid(token: str, df: pd.DataFrame, selected_years, selected_months,
+                         query: dict = None) -> dict:
+    return _grids.get_or_compute(fingerprint(token, selected_years, selected_months, query),
+                                 lambda: calendar_grid(df))
+
+@timed_stage('create_calendar_heatmap')
+def create_calendar_heatmap(df: pd.DataFrame, metric: str, grid: dict = None) -> dict:
+    """GitHub style calendar heatmap of a metric: one heatmap per year with phase outlines"""
+    if df.empty or metric not in df.columns:
+        return go.Figure()
+    grid = grid or calendar_grid(df)
+
+    # Scatter the metric into the grid in one go
+    values = np.full(grid['shape'], np.nan)
+    values[grid['index']] = pd.to_numeric(df[metric], errors='coerce').to_numpy(dtype=float)
+    # No recorded value in the selection (or ever, for this device): nothing to scale the colors on
+    if np.isnan(values).all():
+        return go.Figure()
+
+    years = grid['years']
+    fig = figures.subplots(rows=len(years), cols=1, subplot_titles=tuple(str(year) for year in years),
+                           vertical_spacing=min(0.3 / len(years), 0.08))
+    zmin, zmax = np.nanmin(values), np.nanmax(values)
+    weeks = np.arange(N_WEEKS)
+
+    for i, year in enumerate(years):
+        figures.add_trace(fig, dict(
+            type='heatmap',
+            z=values[i], x=weeks, y=WEEKDAYS,
+            zmin=zmin, zmax=zmax,
+            colorscale='Greens',
+            xgap=2, ygap=2,
+            showscale=(i == 0),
+            colorbar=dict(title=dict(text=metric, side='right'), len=min(1, 1.5 / len(years)),
+                          y=1, yanchor='top'),
+            text=grid['date_text'][i],
+            customdata=grid['phases'][i],
+            hovertemplate='%{text}<br>%{customdata}<br>' + metric + ': %{z}<extra></extra>',
+        ), row=i + 1, col=1)
+
+        # Phase outlines: one marker trace per phase with all its days
+        for phase, color in figures.PHASE_COLORS.items():
+            weekday_idx, week_idx = np.nonzero(grid['phases'][i] == phase)
+            figures.add_trace(fig, dict(
+                type='scatter',
+                x=week_idx, y=np.array(WEEKDAYS)[weekday_idx],
+                mode='markers',
+                marker=dict(symbol='square-open', size=11, color=color, line=dict(width=2)),
+                name=phase, legendgroup=phase, showlegend=(i == 0),
+                hoverinfo='skip',
+            ), row=i + 1, col=1)
+
+        # Month labels at the week of the first day of each month
+        month_starts = pd.date_range(f'{year}-01-01', periods=12, freq='MS')
+        jan_first_weekday = month_starts[0].dayofweek
+        figures.update_axes(fig, 'x', row=i + 1, col=1,
+                            tickvals=((month_starts.dayofyear - 1 + jan_first_weekday) // 7).to_numpy(),
+                            ticktext=MONTHS, showgrid=False, zeroline=False,
+                            range=[-0.5, N_WEEKS - 0.5])
+        figures.update_axes(fig, 'y', row=i + 1, col=1, autorange='reversed', showgrid=False, zeroline=False)
+
+    fig['layout'].update(
+        height=200 * len(years) + 80,
+        plot_bgcolor='rgba(0,0,0,0)',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='center', x=0.5),
+        margin=dict(l=60, r=40, t=80, b=40),
+    )
+    return figures.finalize(fig)
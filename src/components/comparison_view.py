@@ -0,0 +1,76 @@
+from dash import html, dcc, dash_table
+import pandas as pd
+
+from src.components import ids
+from src.data.comparison import selection_options, default_selections, selection_label
+
+def render(dataset: dict) -> html.Div:
+    """Render the comparison tab, the table is filled by its own callback"""
+    options = selection_options(dataset)
+    selection_a, selection_b = default_selections(dataset)
+    dropdown_style = {'flex': '1', 'margin-right': '10px'}
+    return html.Div([
+        html.H4(),
+        html.H3("Compare Periods"),
+        html.Div([
+            html.Label("Compare", style={'margin-right': '10px'}),
+            dcc.Dropdown(id=ids.COMPARE_A, options=options, value=selection_a, clearable=False,
+                         style=dropdown_style),
+            html.Label("with", style={'margin-right': '10px'}),
+            dcc.Dropdown(id=ids.COMPARE_B, options=options, value=selection_b, clearable=False,
+                         style=dropdown_style),
+        ], style={'display': 'flex', 'flexDirection': 'row', 'alignItems': 'center', 'margin-bottom': '20px'}),
+        html.P("Mean of every metric per phase over the whole dataset's days in each period. "
+               "The years and months filters do not apply here."),
+        dcc.Loading(html.Div(id=ids.COMPARE_CONTENT)),
+    ])
+
+def render_comparison(table: pd.DataFrame, selection_a: str, selection_b: str) -> html.Div:
+    """The table of compare_selections, with the periods as column names"""
+    label_a, label_b = selection_label(selection_a), selection_label(selection_b)
+    if table.empty:
+        return html.Div(f"No metric has data in both {label_a} and {label_b}.")
+
+    names = {'A': label_a, 'B': label_b, 'Days A': f"Days {label_a}",
+             'Days B': f"Days {label_b}", 'p-value': "p-value (Bonferroni)"}
+    numeric = {'A', 'B', 'Change', 'Change %', 'p-value'}
+    columns = [{'name': names.get(column, column), 'id': column,
+                **({'type': 'numeric', 'format': {'specifier': '.3g' if column == 'p-value' else '.1f'}}
+                   if column in numeric else {})}
+               for column in table.columns]
+
+    return html.Div([
+        dash_table.DataTable(
+            data=table.to_dict('records'),
+            columns=columns,
+            style_cell={'textAlign': 'left', 'fontSize': '12px'},
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                },
+                {
+                    'if': {
+                        'filter_query': '{Significant} = Yes',
+                        'column_id': 'Significant'
+                    },
+                    'backgroundColor': '#90EE90',
+                    'color': 'black',
+                }
+            ],
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold',
+                'fontSize': '13px'
+            },
+            style_cell_conditional=[
+                {'if': {'column_id': 'Metric'}, 'width': '20%'},
+                {'if': {'column_id': 'Phase'}, 'width': '10%'},
+            ]
+        ),
+        html.Ul([
+            html.Li(f"Change: {label_b} minus {label_a}, in the unit of the metric and in % of {label_a}"),
+            html.Li("Significance: Welch's t-test of the days of each phase, Bonferroni corrected over "
+                    "the four phases of a metric (p < 0.05)"),
+        ], style={'margin-top': '20px'}),
+    ])
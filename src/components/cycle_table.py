@@ -0,0 +1,97 @@
+import math
+
+from dash import html, dash_table
+import pandas as pd
+
+from src.components import ids
+from src.data.cache import LRUCache, fingerprint
+from src.instrumentation import timed_stage
+from src.data.rollups import PHASES, phase_days_column, rollup_column
+
+PAGE_SIZE = 10
+
+# Sorted tables per dataset, metric and sort order, apart from the pipeline
+# stages so that paging through the table never evicts the processed frames
+MAX_SORTED_TABLES = 32
+
+_sorted_tables = LRUCache('cycle-table', MAX_SORTED_TABLES)
+
+CYCLE_COLUMN = 'Cycle'
+START_COLUMN = 'Start'
+LENGTH_COLUMN = 'Length [days]'
+DAYS_COLUMNS = {phase: f'{phase} days' for phase in PHASES}
+MEAN_COLUMNS = {phase: f'{phase} mean' for phase in PHASES}
+
+def render() -> html.Div:
+    """Cycle history table, paged and sorted on the server"""
+    columns = [CYCLE_COLUMN, START_COLUMN, LENGTH_COLUMN, *DAYS_COLUMNS.values(), *MEAN_COLUMNS.values()]
+    return html.Div([
+        html.H4("Cycle History"),
+        html.P("One row per cycle with its phase lengths and the mean of the selected metric in each phase. "
+               "Click a row to highlight the cycle in the overlay plot."),
+        dash_table.DataTable(
+            id=ids.CYCLE_TABLE,
+            columns=[{"name": col, "id": col} for col in columns],
+            page_current=0,
+            page_size=PAGE_SIZE,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='single',
+            sort_by=[],
+            style_cell={'textAlign': 'center'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold', 'textAlign': 'center',
+            },
+        ),
+    ], style={'margin-top': '20px', 'margin-bottom': '20px'})
+
+def cycle_table(cycles: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """One display row per cycle built from the cycle rollup"""
+    table = pd.DataFrame(index=cycles.index)
+    table[CYCLE_COLUMN] = cycles.index
+    table[START_COLUMN] = pd.to_datetime(cycles[ids.CYCLE_DATE]).dt.strftime('%Y-%m-%d')
+    table[LENGTH_COLUMN] = cycles[ids.CYCLE_LENGTH]
+    for phase in PHASES:
+        table[DAYS_COLUMNS[phase]] = cycles[phase_days_column(phase)]
+    for phase in PHASES:
+        mean_col = rollup_column(metric, phase, 'mean')
+        table[MEAN_COLUMNS[phase]] = cycles[mean_col].round(2) if mean_col in cycles.columns else None
+    return table
+
+def sorted_cycle_table(token: str, cycles: pd.DataFrame, metric: str, sort_by: list) -> pd.DataFrame:
+    """The cycle table sorted as requested, cached per dataset, metric and sort order"""
+    sort_col, ascending = CYCLE_COLUMN, True
+    if sort_by:
+        sort_col, ascending = sort_by[0]['column_id'], sort_by[0]['direction'] == 'asc'
+
+    def compute():
+        return cycle_table(cycles, metric).sort_values(sort_col, ascending=ascending,
+                                                       kind='stable', na_position='last')
+    return _sorted_tables.get_or_compute(fingerprint(token, metric, sort_col, ascending), compute)
+
+@timed_stage('table_page')
+def table_page(token: str, cycles: pd.DataFrame, metric: str, sort_by: list,
+               selected_years, selected_months, page_current: int,
+               page_size: int, cycle_ids=None) -> tuple[list[dict], int]:
+    """Rows of the requested page only, and the number of pages.
+    `cycle_ids` further restricts the rows to the given cycles"""
+    table = sorted_cycle_table(token, cycles, metric, sort_by)
+
+    # Filter the cycles by their start date like filter_data filters the days
+    start = pd.to_datetime(cycles[ids.CYCLE_DATE]).reindex(table.index)
+    mask = pd.Series(True, index=table.index)
+    if selected_years:
+        mask &= start.dt.year.isin(selected_years)
+    if selected_months:
+        mask &= start.dt.month.isin(selected_months)
+    if cycle_ids is not None:
+        mask &= table.index.isin(cycle_ids)
+    table = table[mask]
+
+    page_size = page_size or PAGE_SIZE
+    page_current = page_current or 0
+    page = table.iloc[page_current * page_size:(page_current + 1) * page_size]
+    # The row id lets a clicked cell be traced back to its cycle
+    records = page.assign(id=page.index).to_dict('records')
+    return records, max(math.ceil(len(table) / page_size), 1)
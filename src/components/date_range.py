@@ -0,0 +1,28 @@
+from dash import Dash, html, dcc
+from src.components import ids
+
+def render(app: Dash) -> html.Div:
+    """Window of dates, in days since the epoch. The range and marks are set from the
+    dataset index in the browser (assets/clientside.js)"""
+    return html.Div(
+        children=[
+            html.Label("Date range:", style={"width": "120px", "margin-left": "10px", "margin-right": "10px",
+                                             "align-self": "center", "flex": "0 0 auto"}),
+            html.Div(
+                dcc.RangeSlider(
+                    id=ids.DATE_RANGE_SLIDER,
+                    min=0, max=1, step=1,
+                    allowCross=False,
+                    tooltip={'placement': 'bottom', 'transform': 'epochDayToDate'},
+                ),
+                style={"flex": "1"}
+            ),
+        ],
+        style={
+                "display": "flex",
+                "flexDirection": "row",
+                "alignItems": "center",
+                "width": "96%",
+                "margin": "0 2% 10px 2%",
+            },
+    )
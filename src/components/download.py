@@ -0,0 +1,34 @@
+from dash import Dash, html, dcc
+from src.components import ids
+from src.data.export import EXPORT_FORMATS, CSV
+
+def render(app: Dash) -> html.Div:
+    """Download of the filtered daily data, written by the download callback"""
+    return html.Div(
+        children=[
+            html.Label("Download the filtered data as:", style={"margin-right": "10px", "flex": "0 0 auto"}),
+            dcc.RadioItems(
+                id=ids.DOWNLOAD_FORMAT,
+                options=[{'label': label, 'value': value} for value, label in EXPORT_FORMATS.items()],
+                value=CSV,
+                inline=True,
+                inputStyle={"margin-right": "5px", "margin-left": "10px"},
+                style={"margin-right": "10px"}
+            ),
+            html.Button(
+                className="dropdown-button",
+                children=["Download"],
+                id=ids.DOWNLOAD_BUTTON,
+                n_clicks=0,
+                style={"width": "120px", "flex": "0 0 auto"}
+            ),
+            dcc.Download(id=ids.DOWNLOAD),
+        ],
+        style={
+                "display": "flex",
+                "flexDirection": "row",
+                "alignItems": "center",
+                "justifyContent": "flex-end",
+                "margin": "0 2% 10px 2%",
+            },
+    )
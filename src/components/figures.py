@@ -0,0 +1,100 @@
+import base64
+import copy
+import functools
+import os
+import zlib
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from src.components import ids
+
+# Lightweight figure building for the hot render paths: figures are plain dicts
+# whose layout is copied from a cached make_subplots template and whose traces
+# are plain dicts, so no property validation happens per trace. Set
+# WHOOP_VALIDATE_FIGURES=1 (the development server does) to validate every
+# figure with plotly before it is returned.
+VALIDATE_ENV = 'WHOOP_VALIDATE_FIGURES'
+
+# Numeric arrays of at least this many values are sent as base64 typed arrays
+# ({'dtype', 'bdata'}) in the smallest exact type when that beats the JSON list.
+# Responses are gzipped in production, so the sizes are compared compressed:
+# short decimals often compress better as JSON than as bytes. Dates stay ISO
+# strings, consecutive days compress far better than their epoch milliseconds.
+TYPED_ARRAY_MIN_SIZE = 16
+COMPRESSION_LEVEL = 6 # flask-compress default
+TYPED_ARRAY_DTYPES = {'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+                      'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'}
+
+PHASE_COLORS = {ids.MENSTRUAL: '#EA5C5C', ids.FOLLICULAR: '#C7EE53',
+                ids.OVULATORY: '#EEE453', ids.LUTEAL: '#74DAF1'}
+
+def validation_enabled() -> bool:
+    return os.environ.get(VALIDATE_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+@functools.lru_cache(maxsize=32)
+def _subplots_template(rows: int, cols: int, options: tuple) -> dict:
+    from plotly.subplots import make_subplots
+    return make_subplots(rows=rows, cols=cols, **dict(options)).to_plotly_json()['layout']
+
+def subplots(rows: int = 1, cols: int = 1, **options) -> dict:
+    """Empty figure with the layout make_subplots would build for these arguments.
+    Options must be hashable (tuples rather than lists)"""
+    layout = copy.deepcopy(_subplots_template(rows, cols, tuple(sorted(options.items()))))
+    return {'data': [], 'layout': layout, '_grid': (rows, cols)}
+
+def axis_suffix(fig: dict, row: int, col: int) -> str:
+    """'' for the first subplot, '2', '3'... for the next ones (row-major like make_subplots)"""
+    index = (row - 1) * fig['_grid'][1] + col
+    return '' if index == 1 else str(index)
+
+def _narrowest(values: np.ndarray) -> np.ndarray:
+    """The values in the smallest plotly.js array type that holds them exactly"""
+    if values.dtype.kind == 'f' and np.isfinite(values).all() and (values == np.round(values)).all():
+        values = values.astype(np.int64)
+    if values.dtype.kind in 'iu':
+        low, high = (values.min(), values.max()) if values.size else (0, 0)
+        for dtype in (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                return values.astype(dtype)
+    # plotly.js has no 64-bit integer arrays
+    return values.astype(np.float64) if values.dtype.name not in TYPED_ARRAY_DTYPES else values
+
+def _compressed_size(payload) -> int:
+    return len(zlib.compress(to_json_plotly(payload).encode(), COMPRESSION_LEVEL))
+
+def typed_array(values):
+    """Plotly typed array of a large numeric numpy array, when it is shorter than the
+    JSON list once compressed. Anything else is returned unchanged"""
+    if not isinstance(values, np.ndarray) or values.size < TYPED_ARRAY_MIN_SIZE or values.dtype.kind not in 'iuf':
+        return values
+    narrow = np.ascontiguousarray(_narrowest(values))
+    spec = {'dtype': TYPED_ARRAY_DTYPES[narrow.dtype.name],
+            'bdata': base64.b64encode(narrow.tobytes()).decode()}
+    if narrow.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in narrow.shape)
+    if _compressed_size(spec) >= _compressed_size(values):
+        return values
+    return spec
+
+def _typed_arrays(properties: dict) -> dict:
+    return {key: _typed_arrays(value) if isinstance(value, dict) else typed_array(value)
+            for key, value in properties.items()}
+
+def add_trace(fig: dict, trace: dict, row: int = 1, col: int = 1) -> None:
+    """Append a trace dict (with its 'type') to the subplot at row, col"""
+    suffix = axis_suffix(fig, row, col)
+    fig['data'].append({**trace, 'xaxis': f'x{suffix}', 'yaxis': f'y{suffix}'})
+
+def update_axes(fig: dict, axis: str, row: int = 1, col: int = 1, **properties) -> None:
+    """Update the 'x' or 'y' axis of the subplot at row, col"""
+    fig['layout'].setdefault(f'{axis}axis{axis_suffix(fig, row, col)}', {}).update(properties)
+
+def finalize(fig: dict) -> dict:
+    """The figure dict to hand to dcc.Graph with its large arrays encoded as typed arrays,
+    validated by plotly in validation mode"""
+    fig = {'data': [_typed_arrays(trace) for trace in fig['data']], 'layout': fig['layout']}
+    if validation_enabled():
+        go.Figure(fig)
+    return fig
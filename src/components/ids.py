@@ -14,6 +14,10 @@ UPLOAD_STATUS_JOURNAL = 'upload-status-journal'
 UPLOAD_STATUS_SLEEP = 'upload-status-sleep'
 UPLOAD_STATUS_WORKOUTS = 'upload-status-workouts'
 
+PHASE_MODEL_DROPDOWN = 'phase-model-dropdown'
+PROCESSING_PROGRESS = 'processing-progress'
+PROCESSING_PROGRESS_CONTAINER = 'processing-progress-container'
+
 # Tabs
 TABS = 'tabs'
 TAB_CONTENT = 'tab-content'
@@ -25,11 +29,49 @@ STORED_DATA_JOURNAL = 'stored-data-journal'
 STORED_DATA_SLEEP = 'stored-data-sleep'
 STORED_DATA_WORKOUTS = 'stored-data-workouts'
 PROCESSED_DATA = 'processed-data'
+DATASET_INDEX = 'dataset-index'
+WATCH_INTERVAL = 'watch-interval'
+
+# Date window
+DATE_RANGE_SLIDER = 'date-range-slider'
+
+# Query conditions (filter chips)
+QUERY = 'query'
+QUERY_FIELD = 'query-field'
+QUERY_PHASES = 'query-phases'
+QUERY_ANSWER = 'query-answer'
+QUERY_RANGE = 'query-range'
+QUERY_LOW = 'query-low'
+QUERY_HIGH = 'query-high'
+QUERY_ADD_BUTTON = 'query-add-button'
+QUERY_COMBINE = 'query-combine'
+QUERY_CHIPS = 'query-chips'
+QUERY_CHIP = 'query-chip'
+
+# Download of the processed data
+DOWNLOAD_FORMAT = 'download-format'
+DOWNLOAD_BUTTON = 'download-button'
+DOWNLOAD = 'download'
 
 # Trend Tab
 CYCLE_OVERLAY_PLOT = 'cycle-overlay-plot'
 CYCLE_OVERLAY_LEGEND = 'cycle-overlay-legend'
 TREND_METRIC_DROPDOWN = 'trend-metric-dropdown'
+CYCLE_TABLE = 'cycle-table'
+
+# Statistics Tab
+STATS_CONTENT = 'stats-content'
+STATS_PROGRESS = 'stats-progress'
+STATS_PROGRESS_CONTAINER = 'stats-progress-container'
+
+# Calendar Tab
+CALENDAR_PLOT = 'calendar-plot'
+CALENDAR_METRIC_DROPDOWN = 'calendar-metric-dropdown'
+
+# Comparison Tab
+COMPARE_A = 'compare-a'
+COMPARE_B = 'compare-b'
+COMPARE_CONTENT = 'compare-content'
 
 
 ### 
@@ -61,6 +103,14 @@ SLEEP_DEBT = 'Sleep debt (min)'
 SLEEP_EFFICIENCY = 'Sleep efficiency %'
 SLEEP_CONSISTENCY = 'Sleep consistency %'
 
+# Journal, sleep and workout exports
+QUESTION_TEXT = 'Question text'
+ANSWERED_YES = 'Answered yes'
+NAP = 'Nap'
+WORKOUT_START_TIME = 'Workout start time'
+ACTIVITY_NAME = 'Activity name'
+ACTIVITY_STRAIN = 'Activity Strain'
+
 CYCLE_START_DATE = 'cycle_start_date' # > Parsed CYCLE_START_TIME
 CYCLE_END_DATE = 'cycle_end_date' # > Parsed CYCLE_END_TIME
 CYCLE_DATE = 'cycle_date' # > CYCLE_START_DATE + 12 hours
@@ -127,6 +177,7 @@ CYCLE_START = 'cycle_start'
 CYCLE_DAY_NUMBER = 'cycle_day_number'
 CYCLE_LENGTH = 'cycle_length'
 PHASE = 'phase'
+PROVISIONAL_PHASE = 'provisional_phase' # > PHASE, with the forecast phases for the open cycle
 CYCLE_ID = 'cycle_id'
 
 MENSTRUAL = 'Menstrual'
@@ -1,14 +1,20 @@
-from dash import Dash, html, dcc, dash_table
+import functools
+
+from dash import Dash, Patch, html, dcc, dash_table
 import dash_bootstrap_components as dbc 
 from src.components import ids
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from plotly.colors import qualitative
 import pandas as pd
 import numpy as np
 
 from src.data import loader as ld 
-from src.components import year_dropdown, month_dropdown
+from src.data.phase_models import FIXED_MODEL, PHASE_MODEL_LABELS
+from src.data.watcher import POLL_INTERVAL_S, watch_directory
+from src.instrumentation import timed_stage
+from src.data.rollups import PHASES, phase_means, summarise_months, phase_days_column
+from src.components import (year_dropdown, month_dropdown, date_range, query_chips, download, cycle_table,
+                            figures)
 
 def create_layout(app: Dash) -> html.Div:
     # Define the app layout
@@ -92,6 +98,28 @@ def create_layout(app: Dash) -> html.Div:
                                             html.Div(id=ids.UPLOAD_STATUS_WORKOUTS, style={'textAlign': 'center', 'fontSize': 12})
                                         ], className="upload-box"),
                                     ], className="upload-grid"),
+
+                                    # Phase model selector
+                                    html.Div([
+                                        html.Label("Phase model:", style={"width": "120px", "margin-right": "10px",
+                                                                           "align-self": "center", "flex": "0 0 auto"}),
+                                        dcc.Dropdown(
+                                            id=ids.PHASE_MODEL_DROPDOWN,
+                                            options=[{'label': label, 'value': model} 
+                                                     for model, label in PHASE_MODEL_LABELS.items()],
+                                            value=FIXED_MODEL,
+                                            clearable=False,
+                                            style={"flex": "1"}
+                                        ),
+                                    ], style={"display": "flex", "flexDirection": "row", "alignItems": "center",
+                                              "width": "48%", "margin": "10px auto"}),
+
+                                    # Progress of the background processing
+                                    html.Div([
+                                        dbc.Progress(id=ids.PROCESSING_PROGRESS, value=0, striped=True, 
+                                                     animated=True, style={"height": "20px"}),
+                                    ], id=ids.PROCESSING_PROGRESS_CONTAINER, 
+                                       style={"display": "none", "width": "48%", "margin": "10px auto"}),
                                 ], className="upload-section"), 
                         ]),
                     html.Hr(),
@@ -112,62 +140,80 @@ def create_layout(app: Dash) -> html.Div:
                             "margin-right": "2%",
                             "margin-left": "2%"}
                     ),
+                    # Window of dates within the selected years and months
+                    date_range.render(app),
+                    # Conditions on phases, journal answers and metric ranges
+                    query_chips.render(app),
                     # Main dashboard content
                     html.Div([
+                        # Download of the filtered data
+                        download.render(app),
                         # Tabs
                         dcc.Tabs(id=ids.TABS, value="overview", 
                                  children=[
                                     dcc.Tab(label="Overview", value="overview"),
-                                    # dcc.Tab(label="Calendar View", value="calendar"),
+                                    dcc.Tab(label="Calendar View", value="calendar"),
                                     dcc.Tab(label="Sleep Analysis", value="sleep"),
                                     dcc.Tab(label="Recovery & Strain", value="recovery"),
                                     dcc.Tab(label="Trends", value="trends"),
-                                    dcc.Tab(label="Statistical Analysis", value="stats")
+                                    dcc.Tab(label="Statistical Analysis", value="stats"),
+                                    dcc.Tab(label="Compare Periods", value="compare")
                         ]),
                         # Tab content
                         html.Div(id=ids.TAB_CONTENT)
                     ], id=ids.MAIN_CONTENT, style={'display': 'none'}),
 
-                    # Hidden divs to store data
-                    html.Div(id=ids.STORED_DATA_PHYSIOLOGICAL, style={'display': 'none'}),
-                    html.Div(id=ids.STORED_DATA_JOURNAL, style={'display': 'none'}),
-                    html.Div(id=ids.STORED_DATA_SLEEP, style={'display': 'none'}),
-                    html.Div(id=ids.STORED_DATA_WORKOUTS, style={'display': 'none'}),
+                    # Uploaded files (Arrow IPC, see src.data.transport) and the dataset token
+                    dcc.Store(id=ids.STORED_DATA_PHYSIOLOGICAL),
+                    dcc.Store(id=ids.STORED_DATA_JOURNAL),
+                    dcc.Store(id=ids.STORED_DATA_SLEEP),
+                    dcc.Store(id=ids.STORED_DATA_WORKOUTS),
                     html.Div(id=ids.PROCESSED_DATA, style={'display': 'none'}),
+                    # Small summary of the processed dataset read by the clientside callbacks
+                    dcc.Store(id=ids.DATASET_INDEX),
+                    # Polls the watched export folder, when there is one (see src.data.watcher)
+                    dcc.Interval(id=ids.WATCH_INTERVAL, interval=POLL_INTERVAL_S * 1000,
+                                 disabled=watch_directory() is None),
                 ],
     )
 
-def render_overview_tab(df: pd.DataFrame) -> dbc.Container:
-
-    """Render the overview tab"""
-    # Summary statistics
-    total_days = len(df[ids.CYCLE_DATE].unique())
-    no_cycles = df[ids.CYCLE_DAY_NUMBER].value_counts()[1]
-    menstrual_days = len(df[df[ids.PHASE] == ids.MENSTRUAL])
-    avg_cycle_len = df[df[ids.CYCLE_DAY_NUMBER]== 1][ids.CYCLE_LENGTH].mean()
+@timed_stage('render_overview_tab')
+def render_overview_tab(df: pd.DataFrame, month_rollup: pd.DataFrame = None,
+                        forecast: dict = None) -> dbc.Container:
 
+    """Render the overview tab, reading the totals from the month rollup when it is given.
+    The forecast cards show the forecast of the whole dataset (see forecast.dataset_forecast)"""
     # Key metrics comparison
     metrics = [ids.RECOVERY_SCORE,ids.RESTING_HR, ids.HRV, 
                ids.SLEEP_PERFORMANCE, ids.SLEEP_EFFICIENCY, ids.DAY_STRAIN]
+
+    if month_rollup is not None:
+        # Summary statistics
+        summary = summarise_months(month_rollup)
+        total_days = summary['total_days']
+        no_cycles = summary['no_cycles']
+        menstrual_days = summary['menstrual_days']
+        avg_cycle_len = summary['avg_cycle_len']
+        phase_avgs = {metric: phase_means(month_rollup, metric) for metric in metrics if metric in df.columns}
+    else:
+        # Summary statistics
+        total_days = len(df[ids.CYCLE_DATE].unique())
+        no_cycles = int((df[ids.CYCLE_DAY_NUMBER] == 1).sum())
+        menstrual_days = len(df[df[ids.PHASE] == ids.MENSTRUAL])
+        avg_cycle_len = df[df[ids.CYCLE_DAY_NUMBER]== 1][ids.CYCLE_LENGTH].mean()
+        phase_avgs = {metric: {phase: df[df[ids.PHASE] == phase][metric].mean() 
+                               for phase in [ids.FOLLICULAR, ids.OVULATORY, ids.LUTEAL, ids.MENSTRUAL]}
+                      for metric in metrics if metric in df.columns}
     
     # Option 1 DBC
     rows = []
-    for metric in metrics:
-        if metric in df.columns:
-            follicular_avg = df[df[ids.PHASE] == ids.FOLLICULAR][metric].mean()
-            ovulatory_avg = df[df[ids.PHASE] == ids.OVULATORY][metric].mean()
-            luteal_avg = df[df[ids.PHASE] == ids.LUTEAL][metric].mean()
-            menstrual_avg = df[df[ids.PHASE] == ids.MENSTRUAL][metric].mean()
-            row = {
-                    'Metric': metric,
-                    ids.FOLLICULAR: round(follicular_avg, 2) if not pd.isna(follicular_avg) else 'N/A',
-                    ids.OVULATORY: round(ovulatory_avg, 2) if not pd.isna(ovulatory_avg) else 'N/A',
-                    ids.LUTEAL: round(luteal_avg, 2) if not pd.isna(luteal_avg) else 'N/A',
-                    ids.MENSTRUAL: round(menstrual_avg, 2) if not pd.isna(menstrual_avg) else 'N/A',
-                }
-            rows.append(row)
+    for metric, avgs in phase_avgs.items():
+        row = {'Metric': metric}
+        for phase in [ids.FOLLICULAR, ids.OVULATORY, ids.LUTEAL, ids.MENSTRUAL]:
+            row[phase] = round(avgs[phase], 2) if not pd.isna(avgs[phase]) else 'N/A'
+        rows.append(row)
     
-        ov_data = pd.DataFrame(rows)
+    ov_data = pd.DataFrame(rows)
             
     return dbc.Container([
             # Summary cards
@@ -191,6 +237,9 @@ def render_overview_tab(df: pd.DataFrame) -> dbc.Container:
                 ], className="summary-card")
             ], className="summary-grid"),
 
+            # Forecast cards
+            render_forecast_cards(forecast),
+
             # Comparison table
             html.H2(" Metrics Comparison"),
             create_styled_table(ov_data, "custom-table-container")
@@ -268,6 +317,32 @@ def render_overview_tab(df: pd.DataFrame) -> dbc.Container:
             
             ])
 
+def render_forecast_cards(forecast: dict) -> html.Div:
+    """Render the next period and ovulatory window forecast with their 80% intervals"""
+    if forecast is None:
+        return html.Div()
+    
+    fmt = lambda date: date.strftime('%d %b %Y')
+
+    return html.Div([
+            html.Div([
+                html.H3(f"Day {forecast['current_cycle_day']}"),
+                html.P(f"Current Cycle ({forecast['current_phase']}, provisional)")
+            ], className="summary-card"),
+            html.Div([
+                html.H3(fmt(forecast['next_period'])),
+                html.P(f"Next Period ({fmt(forecast['next_period_low'])} - {fmt(forecast['next_period_high'])})")
+            ], className="summary-card"),
+            html.Div([
+                html.H3(f"{fmt(forecast['ovulatory_start'])} - {fmt(forecast['ovulatory_end'])}"),
+                html.P(f"Next Ovulatory Window ({fmt(forecast['ovulatory_low'])} - {fmt(forecast['ovulatory_high'])})")
+            ], className="summary-card"),
+            html.Div([
+                html.H3(f"{forecast['cycle_length']:.1f} ± {forecast['cycle_length_std']:.1f}"),
+                html.P("Predicted Cycle Length [days]")
+            ], className="summary-card")
+        ], className="summary-grid")
+
 def create_styled_table(data: pd.DataFrame, className: str) -> html.Div:
     """Create a styled DBC table with phase-specific coloring"""
     
@@ -282,83 +357,82 @@ def create_styled_table(data: pd.DataFrame, className: str) -> html.Div:
     )
     return html.Div([table], className=className)
 
+@timed_stage('render_sleep_tab')
 def render_sleep_tab(df: pd.DataFrame) -> dbc.Container:
     """Render the sleep analysis tab"""
     sleep_metrics = [ids.SLEEP_PERFORMANCE, ids.SLEEP_EFFICIENCY, ids.REM_DURATION, 
                     ids.DEEP_SLEEP_DURATION, ids.LIGHT_SLEEP_DURATION]
     
-    fig = make_subplots(
+    fig = figures.subplots(
         rows=2, cols=2,
         subplot_titles=(ids.SLEEP_PERFORMANCE, ids.SLEEP_EFFICIENCY, 
                         ids.REM_DURATION, ids.DEEP_SLEEP_DURATION),
-        specs=[[{'secondary_y': False}, {'secondary_y': False}],
-               [{'secondary_y': False}, {'secondary_y': False}]]
     )
     
-    phase_colors = ['#EA5C5C', '#C7EE53', '#EEE453', '#74DAF1']
-    phase_names = ['Menstrual', 'Follicular', 'Ovulatory', 'Luteal']
+    # Group the rows by phase once for all the metrics
+    phase_rows = {phase: df[ids.PHASE] == phase for phase in figures.PHASE_COLORS}
     
     for i, metric in enumerate(sleep_metrics[:4]):
         if metric in df.columns:
             row = (i // 2) + 1
             col = (i % 2) + 1
             
-            for j, phase in enumerate(phase_names):
-                data = df[df[ids.PHASE] == phase][metric].dropna()
+            for phase, color in figures.PHASE_COLORS.items():
+                data = df.loc[phase_rows[phase], metric].dropna()
                 
-                fig.add_trace(
-                    go.Box(y=data, name=f'{phase}', 
-                          marker_color=phase_colors[j], showlegend=(i==0)),
-                    row=row, col=col
-                )
+                figures.add_trace(fig, dict(type='box', y=data.to_numpy(), name=f'{phase}', 
+                                            marker=dict(color=color), showlegend=(i==0)),
+                                  row=row, col=col)
     
-    fig.update_layout(height=600, title_text="Sleep Metrics by Cycle Phase")
+    fig['layout'].update(height=600, title=dict(text="Sleep Metrics by Cycle Phase"))
     
     return html.Div([
-        dcc.Graph(figure=fig)
+        dcc.Graph(figure=figures.finalize(fig))
     ])
 
+@timed_stage('render_recovery_tab')
 def render_recovery_tab(df: pd.DataFrame) -> dbc.Container:
     """Render the recovery & strain analysis tab
         TURN THIS INTO A SIMILAR STRAIN AND RECOVERY GRAPH FROM WHOOP
     """
     # Recovery and strain over time
-    fig = make_subplots(
+    fig = figures.subplots(
         rows=2, cols=1,
         subplot_titles=('Recovery Score Over Time', 'Day Strain Over Time'),
         shared_xaxes=True
     )
     
     # Recovery score
-    colors = df[ids.PHASE].map({'Menstrual':'#EA5C5C', 'Follicular':'#C7EE53', 
-                                'Ovulatory':'#EEE453', 'Luteal': '#74DAF1'})
-    fig.add_trace(
-        go.Scatter(x=df[ids.CYCLE_START_DATE], y=df[ids.RECOVERY_SCORE],
-                  mode='markers+lines', name=ids.RECOVERY_SCORE,
-                  marker=dict(color=colors, size=8),
-                  line=dict(color='gray', width=1)),
+    colors = df[ids.PHASE].map(figures.PHASE_COLORS).to_numpy()
+    dates = df[ids.CYCLE_START_DATE].to_numpy()
+    figures.add_trace(fig, dict(
+        type='scatter', x=dates, y=df[ids.RECOVERY_SCORE].to_numpy(),
+        mode='markers+lines', name=ids.RECOVERY_SCORE,
+        marker=dict(color=colors, size=8),
+        line=dict(color='gray', width=1)),
         row=1, col=1
     )
     
     # Day strain
     if 'Day Strain' in df.columns:
-        fig.add_trace(
-            go.Scatter(x=df[ids.CYCLE_START_DATE], y=df[ids.DAY_STRAIN],
-                      mode='markers+lines', name=ids.DAY_STRAIN,
-                      marker=dict(color=colors, size=8),
-                      line=dict(color='gray', width=1)),
+        figures.add_trace(fig, dict(
+            type='scatter', x=dates, y=df[ids.DAY_STRAIN].to_numpy(),
+            mode='markers+lines', name=ids.DAY_STRAIN,
+            marker=dict(color=colors, size=8),
+            line=dict(color='gray', width=1)),
             row=2, col=1
         )
     
-    fig.update_layout(height=600, title_text="Recovery and Strain Analysis")
-    fig.update_xaxes(title_text="Date", row=2, col=1)
-    fig.update_yaxes(title_text=ids.RECOVERY_SCORE, row=1, col=1)
-    fig.update_yaxes(title_text=ids.DAY_STRAIN, row=2, col=1)
+    fig['layout'].update(height=600, title=dict(text="Recovery and Strain Analysis"))
+    figures.update_axes(fig, 'x', row=2, col=1, title=dict(text="Date"))
+    figures.update_axes(fig, 'y', row=1, col=1, title=dict(text=ids.RECOVERY_SCORE))
+    figures.update_axes(fig, 'y', row=2, col=1, title=dict(text=ids.DAY_STRAIN))
     
     return html.Div([
-        dcc.Graph(figure=fig)
+        dcc.Graph(figure=figures.finalize(fig))
     ])
 
+@timed_stage('render_trends_tab')
 def render_trends_tab(df: pd.DataFrame) -> dbc.Container:
     """Render the trends view tab with cycle overlays"""
     return html.Div([
@@ -379,6 +453,7 @@ def render_trends_tab(df: pd.DataFrame) -> dbc.Container:
                             {'label': ids.SLEEP_EFFICIENCY, 'value': ids.SLEEP_EFFICIENCY}
                         ],
                         value=ids.RECOVERY_SCORE,
+                        clearable=False,
                         style={'margin-bottom': '20px'}
                     )
                 ]),
@@ -401,82 +476,124 @@ def render_trends_tab(df: pd.DataFrame) -> dbc.Container:
                 ], style={'margin-top': '0px', 
                           'margin-bottom': '0px',
                           'padding-top': '0px'}),
+
+                # Cycle history table
+                cycle_table.render(),
             ])
 
-def create_cycle_overlay_plot(df: pd.DataFrame, metric: str, title: str) -> go.Figure:
-    """Create an overlay plot showing multiple cycles aligned by cycle day"""
+def _overlay_cycles(df: pd.DataFrame) -> tuple[pd.DataFrame, list[tuple[int, slice]]]:
+    """First day of every menstrual cycle and the rows (as positions) of the cycles 
+    drawn in the overlay, in trace order. None of it depends on the plotted metric"""
+    is_first_day = (df[ids.CYCLE_DAY_NUMBER] == 1) & (df[ids.CYCLE_START] == True)
+    first_day_menstrual_cycle = df[is_first_day]
+    # Positions, not index labels: a filtered frame keeps the labels of the whole one
+    get_rows = np.flatnonzero(is_first_day.to_numpy())
+
+    cycles = []
+    for i, no in enumerate(get_rows):
+        # Data points up to the next cycle start, or to the end for the last cycle
+        next_start_row = get_rows[i+1] if i + 1 < len(get_rows) else len(df)
+        n_rows = next_start_row - no
+
+        if n_rows > 0 and n_rows < 35:
+            cycles.append((i, slice(int(no), int(next_start_row))))
+    return first_day_menstrual_cycle, cycles
+
+def _average_cycle(df: pd.DataFrame, cycles: list[tuple[int, slice]], metric: str, 
+                   cycle_rollup: pd.DataFrame = None, 
+                   plotted_cycle_ids: list = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Average of the metric per cycle day over the average cycle length, 
+    and the average length of each phase"""
+    cycle_positions = [np.arange(len(df))[rows] for _, rows in cycles]
+    positions = np.concatenate(cycle_positions)
+    combined_data = pd.DataFrame({
+        ids.CYCLE_DAY_NUMBER: df[ids.CYCLE_DAY_NUMBER].to_numpy()[positions],
+        metric: df[metric].to_numpy()[positions],
+        ids.CYCLE_ID: np.repeat([i for i, _ in cycles], [len(pos) for pos in cycle_positions]),
+        ids.PHASE: df[ids.PHASE].to_numpy()[positions],
+    })
+    avg_data = combined_data.groupby(ids.CYCLE_DAY_NUMBER)[metric].mean().reset_index()
+    if cycle_rollup is not None and plotted_cycle_ids:
+        # Phase lengths of the plotted cycles from the cycle rollup
+        phase_days = cycle_rollup.loc[cycle_rollup.index.isin(plotted_cycle_ids), 
+                                      [phase_days_column(phase) for phase in PHASES]]
+        avg_phase_length = pd.DataFrame({'count': phase_days.replace(0, np.nan).mean().to_numpy()}, 
+                                        index=pd.Index(PHASES, name=ids.PHASE))
+    else:
+        cc = combined_data[[ids.CYCLE_ID, ids.PHASE]].value_counts().to_frame()
+        cc = cc.sort_values(by=[ids.CYCLE_ID, ids.PHASE])
+        avg_phase_length = cc.groupby(ids.PHASE)['count'].mean().reset_index()
+        avg_phase_length = avg_phase_length.set_index(ids.PHASE)
+    # Every phase, 0 days for a phase none of the cycles reached (e.g. a short export)
+    avg_phase_length = avg_phase_length.reindex(pd.Index(PHASES, name=ids.PHASE), fill_value=0).fillna(0)
+    avg_phase_length['count_round'] = avg_phase_length['count'].round(0)
+    cycle_length_sum = avg_phase_length['count_round'].sum()
+    return avg_data[:int(cycle_length_sum)], avg_phase_length
+
+@timed_stage('create_cycle_overlay_plot')
+def create_cycle_overlay_plot(df: pd.DataFrame, metric: str, 
+                              cycle_rollup: pd.DataFrame = None, 
+                              highlight_cycle: int = None) -> dict:
+    """Create an overlay plot showing multiple cycles aligned by cycle day
+    The average phase lengths are read from the cycle rollup when it is given
+    and the cycle with id highlight_cycle is drawn wider, the others dimmed"""
     
     if ids.CYCLE_START_DATE not in df.columns or metric not in df.columns:
         return go.Figure()
     
     # Filter menstrual cycles only
-    first_day_menstrual_cycle = df[(df[ids.CYCLE_DAY_NUMBER] == 1) & (df[ids.CYCLE_START] == True)].copy()
-    first_day_menstrual_cycle[ids.CYCLE_START_DATE] = first_day_menstrual_cycle[ids.CYCLE_START_DATE].apply(ld.parse_date)
-    df[ids.CYCLE_START_DATE] = df[ids.CYCLE_START_DATE].apply(ld.parse_date)
+    if not pd.api.types.is_datetime64_any_dtype(df[ids.CYCLE_START_DATE]):
+        # A new frame: the input may be shared with other callbacks
+        df = df.assign(**{ids.CYCLE_START_DATE: df[ids.CYCLE_START_DATE].apply(ld.parse_date)})
+    first_day_menstrual_cycle, cycles = _overlay_cycles(df)
 
     if len(first_day_menstrual_cycle) == 0:
         return go.Figure()
     
     # Group by cycle 
-    first_day_menstrual_cycle[ids.CYCLE_ID] = range(len(first_day_menstrual_cycle))
-    get_rows = first_day_menstrual_cycle.index
+    dataset_cycle_ids = first_day_menstrual_cycle[ids.CYCLE_ID].tolist() if ids.CYCLE_ID in df.columns else []
+    plotted_cycle_ids = []
 
     # Create a figure
-    fig = make_subplots(rows=3, cols=1, 
-                        # subplot_titles=['Cycle Overlay Plot','Cycle Average Plot', 'Phase'],
-                        shared_xaxes = True, shared_yaxes=False, 
-                        x_title = 'Cycle Day', y_title=metric,
-                        row_heights=[0.475, 0.475, 0.05],
-                        ) 
+    fig = figures.subplots(rows=3, cols=1, 
+                           # subplot_titles=['Cycle Overlay Plot','Cycle Average Plot', 'Phase'],
+                           shared_xaxes = True, shared_yaxes=False, 
+                           x_title = 'Cycle Day', y_title=metric,
+                           row_heights=(0.475, 0.475, 0.05),
+                           ) 
     
     # For each cycle, try to find the following days
-    colors = px.colors.qualitative.Set3
-    
-    # Add average line
-    all_cycle_data = []
+    colors = qualitative.Set3
 
-    for i, (no, cycle_start) in enumerate(first_day_menstrual_cycle.iterrows()):
+    for i, rows in cycles:
+        cycle_data = df.iloc[rows]
         cycle_color = colors[i % len(colors)]
-        start_date = cycle_start[ids.CYCLE_START_DATE]
+        start_date = first_day_menstrual_cycle[ids.CYCLE_START_DATE].iloc[i]
         
-        try: 
-            # Find the end date for this cycle
-            next_start_row = get_rows[i+1]
-            # Find data points for this cycle
-            cycle_data = df.iloc[no:next_start_row].copy()
-        except: 
-            # Find data points for this cycle
-            cycle_data = df.iloc[no::].copy()
-
-        if len(cycle_data) > 0 and len(cycle_data) < 35:
-            # Add trace for this cycle
-            fig.add_trace(go.Scatter(
-                x=cycle_data[ids.CYCLE_DAY_NUMBER],
-                y=cycle_data[metric],
-                mode='lines+markers',
-                name=f'Cycle {i+1} ({start_date.strftime("%Y-%m-%d")})',
-                line=dict(color=cycle_color),
-                marker=dict(color=cycle_color, size=6),
-                opacity=0.7
-            ), row=1, col=1)
-            cycle_data[ids.CYCLE_ID] = i
-            all_cycle_data.append(cycle_data[[ids.CYCLE_DAY_NUMBER, metric, ids.CYCLE_ID, ids.PHASE]])
+        # Highlight the selected cycle and fade the others
+        opacity, width = 0.7, 2
+        if highlight_cycle is not None and dataset_cycle_ids:
+            highlighted = dataset_cycle_ids[i] == highlight_cycle
+            opacity, width = (1, 5) if highlighted else (0.2, 2)
+
+        # Add trace for this cycle
+        figures.add_trace(fig, dict(
+            type='scatter',
+            x=cycle_data[ids.CYCLE_DAY_NUMBER].to_numpy(),
+            y=cycle_data[metric].to_numpy(),
+            mode='lines+markers',
+            name=f'Cycle {i+1} ({start_date.strftime("%Y-%m-%d")})',
+            line=dict(color=cycle_color, width=width),
+            marker=dict(color=cycle_color, size=6),
+            opacity=opacity
+        ), row=1, col=1)
+        if dataset_cycle_ids:
+            plotted_cycle_ids.append(dataset_cycle_ids[i])
     
     # Add average line
-    if all_cycle_data:
-        combined_data = pd.concat(all_cycle_data, ignore_index=True)
-        avg_data = combined_data.groupby(ids.CYCLE_DAY_NUMBER)[metric].mean().reset_index()
-        cc = combined_data[[ids.CYCLE_ID, ids.PHASE]].value_counts().to_frame()
-        cc = cc.sort_values(by=[ids.CYCLE_ID, ids.PHASE])
-        avg_phase_length = cc.groupby(ids.PHASE)['count'].mean().reset_index()
-        avg_phase_length['count_round'] = avg_phase_length['count'].round(0)
-        avg_phase_length = avg_phase_length.set_index(ids.PHASE)
-        try: 
-            avg_phase_length = avg_phase_length.drop(index=['Unknown'])
-        except: 
-            pass
+    if cycles:
+        avg_data, avg_phase_length = _average_cycle(df, cycles, metric, cycle_rollup, plotted_cycle_ids)
         cycle_length_sum = avg_phase_length['count_round'].sum()
-        avg_data = avg_data[:int(cycle_length_sum)]
 
         #Create a heatmap with the corresponding colors 
         follicular_start = avg_phase_length.loc['Menstrual','count_round'] + 1
@@ -504,9 +621,10 @@ def create_cycle_overlay_plot(df: pd.DataFrame, metric: str, title: str) -> go.F
         #     name='Average',
         #     line=dict(color='black', width=3, dash='dash')),
         #     row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=avg_data[ids.CYCLE_DAY_NUMBER],
-            y=avg_data[metric],
+        figures.add_trace(fig, dict(
+            type='scatter',
+            x=avg_data[ids.CYCLE_DAY_NUMBER].to_numpy(),
+            y=avg_data[metric].to_numpy(),
             mode='lines',
             name='Average',
             line=dict(color='black', width=3, dash='dash')),
@@ -518,10 +636,12 @@ def create_cycle_overlay_plot(df: pd.DataFrame, metric: str, title: str) -> go.F
             phase_name = df_phase.loc[day, 'phase_name']
             hover_text.append(f'Day: {day}<br>Phase: {phase_name}')
 
-        fig.add_trace(go.Heatmap(
+        figures.add_trace(fig, dict(
+            type='heatmap',
             z=df_phase['phase'].values.reshape(1, -1),  # Reshape to single row
-            x=df_phase.index.astype(int),  # Cycle days as x-axis
-            colorscale=[[0, "#EA5C5C"], [0.33, "#C7EE53"], [0.66, "#EEE453"], [1, "#74DAF1"]],  # Custom colors
+            x=df_phase.index.astype(int).to_numpy(),  # Cycle days as x-axis
+            colorscale=[[0, figures.PHASE_COLORS[ids.MENSTRUAL]], [0.33, figures.PHASE_COLORS[ids.FOLLICULAR]], 
+                        [0.66, figures.PHASE_COLORS[ids.OVULATORY]], [1, figures.PHASE_COLORS[ids.LUTEAL]]],  # Custom colors
             showscale=False,
             colorbar=dict(
                 tickvals=[1, 2, 3, 4],
@@ -532,7 +652,7 @@ def create_cycle_overlay_plot(df: pd.DataFrame, metric: str, title: str) -> go.F
             row=3, col=1)
             
     # Update layout
-    fig.update_layout(
+    fig['layout'].update(
         height=600,
         # width=800,
         showlegend=True,
@@ -540,12 +660,41 @@ def create_cycle_overlay_plot(df: pd.DataFrame, metric: str, title: str) -> go.F
     )
 
     # Remove all background elements from the heatmap
-    fig.update_xaxes(showgrid=False, zeroline=False, row=3, col=1)
-    fig.update_yaxes(showgrid=False, showticklabels=False, zeroline=False, row=3, col=1)
+    figures.update_axes(fig, 'x', row=3, col=1, showgrid=False, zeroline=False)
+    figures.update_axes(fig, 'y', row=3, col=1, showgrid=False, showticklabels=False, zeroline=False)
     
-    return fig
-
+    return figures.finalize(fig)
+
+@timed_stage('overlay_metric_patch')
+def overlay_metric_patch(df: pd.DataFrame, metric: str, 
+                         cycle_rollup: pd.DataFrame = None) -> Patch:
+    """Partial update of a figure made by create_cycle_overlay_plot from the same data:
+    only the y values of the cycle and average traces and the axis title change.
+    Returns the full figure when there is nothing to patch"""
+    if ids.CYCLE_START_DATE not in df.columns or metric not in df.columns:
+        return go.Figure()
+    first_day_menstrual_cycle, cycles = _overlay_cycles(df)
+    if not cycles:
+        return create_cycle_overlay_plot(df, metric, cycle_rollup=cycle_rollup)
+
+    plotted_cycle_ids = []
+    if ids.CYCLE_ID in df.columns:
+        dataset_cycle_ids = first_day_menstrual_cycle[ids.CYCLE_ID].tolist()
+        plotted_cycle_ids = [dataset_cycle_ids[i] for i, _ in cycles]
+    avg_data, _ = _average_cycle(df, cycles, metric, cycle_rollup, plotted_cycle_ids)
+
+    patch = Patch()
+    for trace, (_, rows) in enumerate(cycles):
+        patch['data'][trace]['y'] = figures.typed_array(df[metric].iloc[rows].to_numpy())
+    patch['data'][len(cycles)]['y'] = figures.typed_array(avg_data[metric].to_numpy())
+    # make_subplots adds the x title annotation first and the y title second
+    patch['layout']['annotations'][1]['text'] = metric
+    return patch
+
+@timed_stage('create_phase_legend')
+@functools.lru_cache(maxsize=1)
 def create_phase_legend() -> go.Figure:
+    """Legend of the phase colors; it never changes, so it is built once"""
     phase_colors = ['#EA5C5C', '#C7EE53', '#EEE453', '#74DAF1']
     phase_names = ['Menstrual', 'Follicular', 'Ovulatory', 'Luteal']
     
@@ -588,10 +737,21 @@ def create_phase_legend() -> go.Figure:
     
     return legend_fig
 
-def render_stats_tab(df: pd.DataFrame) -> html.Div:
-    """Render the statistical analysis tab"""
+def render_stats_shell() -> html.Div:
+    """Statistics tab placeholder, filled by a background callback once the tests have run"""
+    return html.Div([
+        html.Div([
+            html.P("Running the statistical tests..."),
+            dbc.Progress(id=ids.STATS_PROGRESS, value=0, striped=True, animated=True),
+        ], id=ids.STATS_PROGRESS_CONTAINER, style={'margin': '20px'}),
+        html.Div(id=ids.STATS_CONTENT),
+    ])
+
+@timed_stage('render_stats_tab')
+def render_stats_tab(df: pd.DataFrame, progress=None, stats: tuple = None) -> html.Div:
+    """Render the statistical analysis tab, from the result of get_stats when it is given"""
     # Statistical tests and detailed analysis
-    descriptive_table_data, overall_test_data, pairwise_table_data = ld.get_stats(df)
+    descriptive_table_data, overall_test_data, pairwise_table_data = stats or ld.get_stats(df, progress=progress)
 
     return dbc.Container([
         html.H3("Statistical Analysis - Menstrual Cycle Phases"),
@@ -8,6 +8,11 @@
 from dash import Dash, html, dcc
 from src.components import ids
 
+# The month options never change, so they are part of the layout
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+MONTH_OPTIONS = [{'label': name, 'value': i + 1} for i, name in enumerate(MONTH_NAMES)]
+
 def render(app: Dash) -> html.Div:
     return html.Div(
         children=[
@@ -15,6 +20,7 @@ def render(app: Dash) -> html.Div:
                                               "align-self": "center", "flex": "0 0 auto" }),
             dcc.Dropdown(
                 id=ids.MONTH_DROPDOWN,
+                options=MONTH_OPTIONS,
                 multi=True,
                 placeholder="Select month(s)...", 
                 style={"flex": "1", "margin-right": "10px"}, 
@@ -0,0 +1,95 @@
+from dash import Dash, html, dcc
+from src.components import ids
+from src.data.query import PHASE, JOURNAL_ANSWER, METRIC_RANGE, CYCLE_LENGTH_BAND, AND, OR
+from src.data.rollups import PHASES, ROLLUP_METRICS
+
+# Filter chips driving the query engine (src/data/query.py). The field dropdown
+# values are '<predicate kind>|<column>' and the query is kept in a store
+FIELD_SEPARATOR = '|'
+COMBINE_OPTIONS = [{'label': 'All conditions', 'value': AND}, {'label': 'Any condition', 'value': OR}]
+
+def field_options(questions: list[str]) -> list[dict]:
+    """The fields a condition can be set on, with the journal questions of the dataset"""
+    return ([{'label': 'Phase', 'value': PHASE},
+             {'label': 'Cycle length', 'value': CYCLE_LENGTH_BAND}] +
+            [{'label': metric, 'value': f'{METRIC_RANGE}{FIELD_SEPARATOR}{metric}'} for metric in ROLLUP_METRICS] +
+            [{'label': f'Journal: {question}', 'value': f'{JOURNAL_ANSWER}{FIELD_SEPARATOR}{question}'}
+             for question in questions])
+
+def build_predicate(field: str, phases: list, answer: bool, low: float, high: float) -> dict:
+    """The predicate of the condition being edited, or None when it is incomplete"""
+    if not field:
+        return None
+    kind, _, column = field.partition(FIELD_SEPARATOR)
+    if kind == PHASE:
+        return {'kind': PHASE, 'values': sorted(phases)} if phases else None
+    if kind == JOURNAL_ANSWER:
+        return {'kind': JOURNAL_ANSWER, 'question': column, 'answer': bool(answer)}
+    if low is None and high is None:
+        return None
+    if kind == CYCLE_LENGTH_BAND:
+        return {'kind': CYCLE_LENGTH_BAND, 'low': low, 'high': high}
+    return {'kind': METRIC_RANGE, 'column': column, 'low': low, 'high': high}
+
+def _range_label(name: str, low, high) -> str:
+    if low is None:
+        return f"{name} ≤ {high:g}"
+    if high is None:
+        return f"{name} ≥ {low:g}"
+    return f"{name} {low:g}–{high:g}"
+
+def chip_label(predicate: dict) -> str:
+    kind = predicate['kind']
+    if kind == PHASE:
+        return f"Phase: {', '.join(predicate['values'])}"
+    if kind == JOURNAL_ANSWER:
+        return f"{predicate['question'].strip()} {'yes' if predicate['answer'] else 'no'}"
+    if kind == CYCLE_LENGTH_BAND:
+        return _range_label('Cycle length', predicate['low'], predicate['high']) + ' days'
+    return _range_label(predicate['column'], predicate['low'], predicate['high'])
+
+def render_chips(query: dict) -> list:
+    """One chip per condition, removed when clicked"""
+    predicates = (query or {}).get('predicates', [])
+    return [html.Button([chip_label(predicate), " ✕"], id={'type': ids.QUERY_CHIP, 'index': i},
+                        className="query-chip", n_clicks=0)
+            for i, predicate in enumerate(predicates)]
+
+def render(app: Dash) -> html.Div:
+    control_style = {"flex": "1", "margin-right": "10px"}
+    return html.Div(
+        children=[
+            html.Div([
+                html.Label("Slice by:", style={"width": "120px", "margin-left": "10px", "margin-right": "10px",
+                                               "align-self": "center", "flex": "0 0 auto"}),
+                dcc.Dropdown(id=ids.QUERY_FIELD, options=field_options([]), placeholder="Select a field...",
+                             style=control_style),
+                # Only the controls of the selected field are shown (assets/clientside.js)
+                dcc.Dropdown(id=ids.QUERY_PHASES, options=PHASES, multi=True, placeholder="Phase(s)...",
+                             style={**control_style, "display": "none"}),
+                dcc.RadioItems(id=ids.QUERY_ANSWER, options=[{'label': 'Yes', 'value': True},
+                                                             {'label': 'No', 'value': False}],
+                               value=True, inline=True, inputStyle={"margin-right": "5px", "margin-left": "10px"},
+                               style={**control_style, "display": "none"}),
+                html.Div([
+                    dcc.Input(id=ids.QUERY_LOW, type='number', placeholder="min", debounce=True,
+                              style={"width": "90px", "margin-right": "5px"}),
+                    dcc.Input(id=ids.QUERY_HIGH, type='number', placeholder="max", debounce=True,
+                              style={"width": "90px"}),
+                ], id=ids.QUERY_RANGE, style={**control_style, "display": "none"}),
+                html.Button(
+                    className="dropdown-button",
+                    children=["Add"],
+                    id=ids.QUERY_ADD_BUTTON,
+                    n_clicks=0,
+                    style={"width": "120px", "flex": "0 0 auto"}
+                ),
+                dcc.RadioItems(id=ids.QUERY_COMBINE, options=COMBINE_OPTIONS, value=AND, inline=True,
+                               inputStyle={"margin-right": "5px", "margin-left": "10px"},
+                               style={"flex": "0 0 auto", "margin-left": "10px"}),
+            ], style={"display": "flex", "flexDirection": "row", "alignItems": "center"}),
+            html.Div(id=ids.QUERY_CHIPS, style={"margin": "5px 0 0 140px"}),
+            dcc.Store(id=ids.QUERY),
+        ],
+        style={"width": "96%", "margin": "0 2% 20px 2%"},
+    )
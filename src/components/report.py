@@ -0,0 +1,281 @@
+import argparse
+import functools
+import gc
+import html as html_text
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from dash import html, dcc
+from dash_bootstrap_components.themes import MATERIA
+import psutil
+from plotly.io.json import to_json_plotly
+
+# Local Imports
+from src.components import ids
+from src.components.layout import (render_overview_tab, render_sleep_tab, render_recovery_tab,
+                                   create_cycle_overlay_plot, create_phase_legend, render_stats_tab)
+from src.data.batch import process_user, user_directories
+from src.data.cache import (DEFAULT_DATASET_DIR, clear_dataset_cache, clear_stage_cache, configure_shared_store,
+                            shared_store)
+from src.data.loader import STATS
+from src.data.forecast import overview_forecast
+from src.data.rollups import DAILY, CYCLES, MONTHS
+
+# Headless rendering of a processed dataset into a static HTML report, without
+# a Dash server: the tab renderers build the same component trees as in the
+# app, which are written out as HTML with their figures as JSON (typed arrays,
+# see figures.py) drawn by one plotly.js bundle for the whole report.
+#   python -m src.components.report exports/ reports/ --workers 8
+# processes the users missing from the dataset store (see src/data/batch.py)
+# and writes reports/<user>.html. With --plotlyjs directory the bundle is
+# written once next to the reports instead of inlined in every one of them.
+ASSETS_DIR = Path(__file__).resolve().parent.parent.parent / 'assets'
+PLOTLYJS_FILE = 'plotly.min.js'
+OVERLAY_METRIC = ids.RECOVERY_SCORE
+
+# Workers are replaced after this many reports and drop their caches whenever
+# their resident memory goes over the budget
+MEMORY_BUDGET_MB = 1024
+TASKS_PER_WORKER = 50
+
+# Properties written as HTML attributes, the others only matter to Dash
+ATTRIBUTES = {'id': 'id', 'className': 'class', 'title': 'title', 'href': 'href',
+              'colSpan': 'colspan', 'rowSpan': 'rowspan', 'src': 'src', 'alt': 'alt'}
+VOID_TAGS = {'br', 'hr', 'img', 'col', 'input'}
+# Numbers of these style properties have no unit, the others are in px (as in React)
+UNITLESS_STYLES = {'flex', 'flexGrow', 'flexShrink', 'fontWeight', 'lineHeight', 'opacity', 'order', 'zIndex'}
+
+REPORT_STYLE = '''
+body { margin: 0 auto; max-width: 1400px; padding: 20px; }
+section { margin-bottom: 40px; }
+'''
+
+# Draws every figure of the report once plotly.js is loaded
+DRAW_FIGURES = '''
+document.querySelectorAll('div.report-graph').forEach(function (div) {
+    var figure = JSON.parse(document.getElementById(div.id + '-figure').textContent);
+    Plotly.newPlot(div, figure.data, figure.layout, {responsive: true});
+});
+'''
+
+@functools.lru_cache(maxsize=1)
+def plotlyjs() -> str:
+    from plotly.offline import get_plotlyjs
+    return get_plotlyjs()
+
+@functools.lru_cache(maxsize=1)
+def app_style() -> str:
+    return (ASSETS_DIR / 'style.css').read_text()
+
+def _style(style: dict) -> str:
+    def css(name, value):
+        name = re.sub(r'(?<!^)([A-Z])', r'-\1', name).lower()
+        if isinstance(value, (int, float)) and name not in UNITLESS_STYLES and value != 0:
+            value = f'{value}px'
+        return f'{name}: {value}'
+    return '; '.join(css(name, value) for name, value in style.items())
+
+def _script_json(text: str) -> str:
+    # JSON in a script element must not close it
+    return text.replace('</', '<\\/')
+
+class ReportWriter:
+    """Writes Dash components as HTML to a file, figures included"""
+
+    def __init__(self, file):
+        self.file = file
+        self.n_graphs = 0
+
+    def write(self, component) -> None:
+        if component is None or isinstance(component, bool):
+            return
+        if isinstance(component, (list, tuple)):
+            for child in component:
+                self.write(child)
+            return
+        if not hasattr(component, 'to_plotly_json'):
+            # Text and numbers (table cells hold numpy scalars)
+            self.file.write(html_text.escape(str(component)))
+            return
+
+        component = component.to_plotly_json()
+        kind, props = component['type'], component['props']
+        if kind == 'Graph':
+            self.write_figure(props.get('figure'), props.get('style'))
+            return
+        tag, classes = 'div', []
+        if component['namespace'] == 'dash_html_components':
+            tag = kind.lower()
+        elif kind == 'Container':
+            classes.append('container-fluid' if props.get('fluid') else 'container')
+        elif kind == 'Table':
+            tag = 'table'
+            classes += ['table'] + [f'table-{option}' for option in ('striped', 'bordered', 'hover')
+                                    if props.get(option)]
+        self.write_element(tag, props, classes, responsive=kind == 'Table' and props.get('responsive'))
+
+    def write_element(self, tag: str, props: dict, classes: list, responsive: bool = False) -> None:
+        attributes = {}
+        for prop, attribute in ATTRIBUTES.items():
+            if props.get(prop) is not None:
+                attributes[attribute] = str(props[prop])
+        if classes:
+            attributes['class'] = ' '.join(classes + [attributes.get('class', '')]).strip()
+        if props.get('style'):
+            attributes['style'] = _style(props['style'])
+        if responsive:
+            self.file.write('<div class="table-responsive">')
+        self.file.write(f'<{tag}' + ''.join(f' {name}="{html_text.escape(value)}"'
+                                            for name, value in attributes.items()) + '>')
+        if tag not in VOID_TAGS:
+            self.write(props.get('children'))
+            self.file.write(f'</{tag}>')
+        if responsive:
+            self.file.write('</div>')
+
+    def write_figure(self, figure, style: dict = None) -> None:
+        if figure is None:
+            return
+        self.n_graphs += 1
+        graph_id = f'graph-{self.n_graphs}'
+        style = f' style="{html_text.escape(_style(style))}"' if style else ''
+        self.file.write(f'<div class="report-graph" id="{graph_id}"{style}></div>'
+                        f'<script type="application/json" id="{graph_id}-figure">'
+                        f'{_script_json(to_json_plotly(figure))}</script>')
+
+def report_sections(dataset: dict) -> list[tuple[str, object]]:
+    """The tabs of the dashboard as (title, component), rendered for the whole dataset"""
+    df = dataset[DAILY]
+    return [
+        ("Overview", lambda: render_overview_tab(df, dataset[MONTHS], overview_forecast(df))),
+        ("Sleep Analysis", lambda: render_sleep_tab(df)),
+        ("Recovery & Strain", lambda: render_recovery_tab(df)),
+        ("Cycle Overlay", lambda: html.Div([
+            html.H3(f"Cycle Overlay Plot - {OVERLAY_METRIC}"),
+            html.P("Multiple cycles overlaid to show patterns. Each line represents a different cycle "
+                   "starting from the first day of menstruation."),
+            dcc.Graph(figure=create_cycle_overlay_plot(df, OVERLAY_METRIC, cycle_rollup=dataset[CYCLES])),
+            dcc.Graph(figure=create_phase_legend()),
+        ])),
+        ("Statistical Analysis", lambda: render_stats_tab(df, stats=dataset.get(STATS))),
+    ]
+
+def write_report(dataset: dict, path: str, title: str = "Whoop Cycle Analysis",
+                 plotlyjs_src: str = None) -> Path:
+    """Write the report of a processed dataset to `path`. plotly.js is inlined unless
+    plotlyjs_src (a URL or a path relative to the report) is given"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        writer = ReportWriter(file)
+        file.write(f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+                   f'<title>{html_text.escape(title)}</title>'
+                   f'<link rel="stylesheet" href="{MATERIA}">'
+                   f'<style>{app_style()}{REPORT_STYLE}</style></head><body>'
+                   f'<h1>{html_text.escape(title)}</h1>')
+        # One section at a time: its components are released before the next one is built
+        for heading, render in report_sections(dataset):
+            file.write(f'<section><h2>{html_text.escape(heading)}</h2>')
+            writer.write(render())
+            file.write('</section>')
+        if plotlyjs_src is None:
+            file.write(f'<script>{plotlyjs()}</script>')
+        else:
+            file.write(f'<script src="{html_text.escape(plotlyjs_src)}"></script>')
+        file.write(f'<script>{DRAW_FIGURES}</script></body></html>')
+    return path
+
+def _trim_memory(budget_mb: float) -> float:
+    """Drop the caches of the worker when it is over its memory budget; returns its RSS in MB.
+    process_user keeps a local copy of every dataset it stores, up to MAX_DATASETS of them"""
+    rss = psutil.Process().memory_info().rss / 2**20
+    if rss > budget_mb:
+        clear_stage_cache()
+        clear_dataset_cache()
+        gc.collect()
+        rss = psutil.Process().memory_info().rss / 2**20
+    return rss
+
+def report_user(directory: Path, output: Path, phase_model: str, plotlyjs_src: str,
+                budget_mb: float) -> dict:
+    """Process the export of a user if it is not in the store yet and write its report"""
+    start = time.perf_counter()
+    timing = process_user(directory, phase_model)
+    if timing['status'] == 'failed':
+        return timing
+    # Read from the store directly: the in-process dataset cache would keep every user in memory
+    dataset = shared_store().get(timing['token'])
+
+    step = time.perf_counter()
+    path = write_report(dataset, output / f'{directory.name}.html', title=f"Whoop Cycle Analysis - {directory.name}",
+                        plotlyjs_src=plotlyjs_src)
+    del dataset
+    timing.update(report_s=time.perf_counter() - step, report_bytes=path.stat().st_size,
+                  rss_mb=round(_trim_memory(budget_mb), 1), total_s=time.perf_counter() - start)
+    return timing
+
+def main() -> None:
+    from src.data.phase_models import FIXED_MODEL, PHASE_MODELS
+
+    parser = argparse.ArgumentParser(description="Write a static HTML report for every user of a directory of exports")
+    parser.add_argument('exports', help="Directory with one export directory per user")
+    parser.add_argument('output', help="Directory where the reports are written")
+    parser.add_argument('--store', default=DEFAULT_DATASET_DIR,
+                        help="Dataset store of the dashboard ($WHOOP_DATASET_DIR takes precedence)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--phase-model', choices=list(PHASE_MODELS), default=FIXED_MODEL)
+    parser.add_argument('--plotlyjs', choices=['inline', 'directory'], default='inline',
+                        help="Inline plotly.js in every report or write it once next to them")
+    parser.add_argument('--memory-budget-mb', type=float, default=MEMORY_BUDGET_MB)
+    parser.add_argument('--tasks-per-worker', type=int, default=TASKS_PER_WORKER)
+    parser.add_argument('--report', help="Write the per-user timings to this JSON file")
+    args = parser.parse_args()
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    plotlyjs_src = None
+    if args.plotlyjs == 'directory':
+        (output / PLOTLYJS_FILE).write_text(plotlyjs(), encoding='utf-8')
+        plotlyjs_src = PLOTLYJS_FILE
+
+    users = user_directories(Path(args.exports))
+    print(f"{len(users)} users in {args.exports}, {args.workers} workers")
+    start = time.perf_counter()
+    results = []
+    # A new pool for every chunk of users replaces the workers (max_tasks_per_child
+    # can hang the pool on Python 3.11)
+    chunk = args.workers * args.tasks_per_worker
+    for first in range(0, len(users), chunk):
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=configure_shared_store,
+                                 initargs=(args.store,)) as pool:
+            futures = {pool.submit(report_user, user, output, args.phase_model, plotlyjs_src,
+                                   args.memory_budget_mb): user for user in users[first:first + chunk]}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as error:
+                    result = {'user': futures[future].name, 'status': 'failed', 'error': repr(error)}
+                results.append(result)
+                if 'report_s' in result:
+                    print(f"{result['user']:<24}{result['total_s']:8.2f} s{result['report_bytes'] / 2**20:8.1f} MB"
+                          f"{result['rss_mb']:10.0f} MB RSS")
+                else:
+                    print(f"{result['user']:<24}failed  {result.get('error', '')}")
+    elapsed = time.perf_counter() - start
+
+    written = sum('report_s' in result for result in results)
+    over_budget = sum(result.get('rss_mb', 0) > args.memory_budget_mb for result in results)
+    print(f"{written} reports written to {output} in {elapsed:.1f} s, "
+          f"{len(results) - written} failed, {over_budget} over the memory budget")
+    if args.report:
+        Path(args.report).write_text(json.dumps({'elapsed_s': elapsed, 'workers': args.workers,
+                                                 'memory_budget_mb': args.memory_budget_mb,
+                                                 'users': sorted(results, key=lambda r: r['user'])}, indent=2))
+        print(f"Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import base64
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Local Imports
+from src.data.cache import (DEFAULT_DATASET_DIR, configure_shared_store, dataset_token,
+                            shared_store, store_dataset)
+from src.data.loader import parse_contents, build_dataset, get_stats, STATS
+from src.data.phase_models import FIXED_MODEL, PHASE_MODELS
+from src.data.rollups import DAILY
+from src.data.schema import sniff_upload, UploadError, EXPORT_LABELS
+from src.data.synthetic import EXPORT_FILES
+from src.data.transport import encode_frame, decode_frame
+
+# Processes the exports of many users ahead of time, in parallel across cores,
+# into the dataset store of the dashboard. Every user has a directory with the
+# CSV files of their export (as written by src.data.synthetic --users):
+#   python -m src.data.batch exports/ --workers 8 --report batch.json
+# Users already in the store are skipped, so an interrupted run resumes where
+# it stopped. Uploading the same files in the dashboard then finds the dataset
+# in the store instead of processing it again.
+REQUIRED_FILES = ['physiological', 'journal']
+
+def as_upload(path: Path) -> str:
+    """Encode a file like dcc.Upload encodes it"""
+    return f'data:text/csv;base64,{base64.b64encode(path.read_bytes()).decode()}'
+
+def user_directories(exports: Path) -> list[Path]:
+    """The directories of `exports` with at least the required export files"""
+    return sorted(path for path in exports.iterdir()
+                  if path.is_dir() and all((path / EXPORT_FILES[kind]).is_file() for kind in REQUIRED_FILES))
+
+def process_user(directory: Path, phase_model: str = FIXED_MODEL, force: bool = False) -> dict:
+    """Parse, process and analyse the export of one user and store the dataset.
+    Returns the timing of every step in seconds"""
+    start = time.perf_counter()
+    timing = {'user': directory.name, 'pid': os.getpid()}
+
+    # The uploads are stored the way the dashboard stores them, so that the token matches
+    stored = {}
+    for kind, filename in EXPORT_FILES.items():
+        path = directory / filename
+        if not path.is_file():
+            stored[kind] = None
+            continue
+        upload = as_upload(path)
+        try:
+            found = sniff_upload(upload)
+        except UploadError as error:
+            found = error
+        if found != kind:
+            problem = found if isinstance(found, UploadError) else f"a {EXPORT_LABELS[found]} export"
+            timing.update(status='failed', error=f"{filename}: {problem}", total_s=time.perf_counter() - start)
+            return timing
+        df = parse_contents(upload, filename)
+        stored[kind] = encode_frame(df) if df is not None else None
+    token = dataset_token(stored['physiological'], stored['journal'], stored['sleep'],
+                          stored['workouts'], phase_model)
+    timing.update(token=token, parse_s=time.perf_counter() - start)
+
+    if not force and token in shared_store():
+        timing.update(status='cached', total_s=time.perf_counter() - start)
+        return timing
+
+    step = time.perf_counter()
+    frames = {kind: decode_frame(payload) if payload is not None else None for kind, payload in stored.items()}
+    dataset = build_dataset(frames['physiological'], frames['journal'], frames['sleep'], frames['workouts'],
+                            phase_model=phase_model)
+    if dataset is None:
+        timing.update(status='failed', total_s=time.perf_counter() - start)
+        return timing
+    timing['process_s'] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    dataset[STATS] = get_stats(dataset[DAILY])
+    timing['stats_s'] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    store_dataset(token, dataset)
+    timing.update(store_s=time.perf_counter() - step, days=len(dataset[DAILY]),
+                  status='processed', total_s=time.perf_counter() - start)
+    return timing
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Process the exports of many users into the dataset store")
+    parser.add_argument('exports', help="Directory with one export directory per user")
+    parser.add_argument('--store', default=DEFAULT_DATASET_DIR,
+                        help="Dataset store of the dashboard ($WHOOP_DATASET_DIR takes precedence)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--phase-model', choices=list(PHASE_MODELS), default=FIXED_MODEL)
+    parser.add_argument('--force', action='store_true', help="Process users already in the store again")
+    parser.add_argument('--report', help="Write the per-user timings to this JSON file")
+    args = parser.parse_args()
+
+    users = user_directories(Path(args.exports))
+    print(f"{len(users)} users in {args.exports}, {args.workers} workers")
+
+    start = time.perf_counter()
+    results = []
+    # Every worker opens its own connection to the store
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=configure_shared_store,
+                             initargs=(args.store,)) as pool:
+        futures = {pool.submit(process_user, user, args.phase_model, args.force): user for user in users}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = {'user': futures[future].name, 'status': 'failed', 'error': repr(error)}
+            results.append(result)
+            total = f"{result['total_s']:8.2f} s" if 'total_s' in result else ''
+            print(f"{result['user']:<24}{result['status']:<10}{total}  {result.get('error', '')}")
+    elapsed = time.perf_counter() - start
+
+    counts = {status: sum(r['status'] == status for r in results) for status in ('processed', 'cached', 'failed')}
+    print(f"{counts['processed']} processed, {counts['cached']} already in the store, "
+          f"{counts['failed']} failed in {elapsed:.1f} s")
+    if args.report:
+        Path(args.report).write_text(json.dumps({'elapsed_s': elapsed, 'workers': args.workers,
+                                                 'phase_model': args.phase_model,
+                                                 'users': sorted(results, key=lambda r: r['user'])}, indent=2))
+        print(f"Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
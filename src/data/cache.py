@@ -0,0 +1,188 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import diskcache
+import pandas as pd
+
+from src.instrumentation import record_cache_access
+
+# Cached frames are handed to concurrent callbacks as they are and must never be
+# written to. With copy-on-write a frame derived from a cached one (a selection,
+# a new column) does not write through to it, and the numpy views of a frame are
+# read-only. It is always on from pandas 3.0
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+class LRUCache:
+    """In-process cache of the results used last, shared by the threads of the
+    server. Lookups through get_or_compute are counted in the cache metrics
+    under the name of the cache (or the label given)"""
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached value, or None; not counted in the metrics"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute: Callable, label: str = None):
+        """The cached value, computed and kept on a miss (unless compute returns None)"""
+        value = self.get(key)
+        record_cache_access(label or self.name, hit=value is not None)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# In-process cache for the expensive stages of the processing pipeline.
+# Entries are keyed by (stage name, input fingerprint) so that e.g. changing the
+# phase model only recomputes the phase stage and reuses the merged frame.
+MAX_STAGE_ENTRIES = 32
+
+_stage_cache = LRUCache('stages', MAX_STAGE_ENTRIES)
+
+# Server-side store of processed datasets (daily frame and its rollups).
+# The browser only keeps the dataset token.
+MAX_DATASETS = 8
+
+_datasets = LRUCache('datasets', MAX_DATASETS)
+
+# Optional disk-backed store shared by the worker processes of a production
+# server, so that any worker can answer for a dataset processed by another one.
+# Each process opens its own connection to the store on first use.
+SHARED_STORE_ENV = 'WHOOP_DATASET_DIR'
+DEFAULT_DATASET_DIR = 'cache/datasets'
+SHARED_STORE_SIZE_LIMIT = 2 * 2**30 # 2 GiB
+# Shared pipeline stages have their own store next to it, with its own size
+# limit, so that the stages of batch runs never evict the datasets
+STAGE_STORE_SUFFIX = '-stages'
+STAGE_STORE_SIZE_LIMIT = 512 * 2**20 # 512 MiB
+
+_shared_directory = None
+_stores = {}
+_stores_pid = None
+
+def fingerprint(*parts) -> str:
+    """Hash DataFrames (and plain values) into a short, stable cache key"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if part is None:
+            digest.update(b'<none>')
+        elif isinstance(part, pd.DataFrame):
+            digest.update(str(list(part.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+        elif isinstance(part, str):
+            digest.update(part.encode())
+        elif isinstance(part, dict):
+            # Independent of the key order, which JSON round trips do not always keep
+            digest.update(fingerprint(*(item for key in sorted(part) for item in (key, part[key]))).encode())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'|')
+    return digest.hexdigest()
+
+def dataset_token(physiological: dict, journal: dict, sleep: dict, workouts: dict,
+                  phase_model: str) -> str:
+    """Token of the dataset processed from stored uploads (see src.data.transport) with a phase model"""
+    return fingerprint(physiological, journal, sleep, workouts, phase_model)
+
+def cached_stage(stage: str, key: str, compute: Callable[[], pd.DataFrame],
+                 shared: bool = False) -> pd.DataFrame:
+    """Return the cached result of a pipeline stage, computing it on a miss.
+    A shared stage is also kept in the stage store: the background callbacks
+    each run in a new process, which starts with an empty in-process cache"""
+    store = stage_store() if shared else None
+    store_key = f'{stage}:{key}'
+
+    def compute_or_load():
+        result = store.get(store_key) if store is not None else None
+        if result is None:
+            result = compute()
+            if store is not None:
+                store.set(store_key, result)
+        return result
+
+    return _stage_cache.get_or_compute((stage, key), compute_or_load, label=stage)
+
+def clear_stage_cache() -> None:
+    _stage_cache.clear()
+
+def clear_dataset_cache() -> None:
+    """Drop the in-process copies of the datasets, the shared store keeps them"""
+    _datasets.clear()
+
+def configure_shared_store(directory: str = None) -> None:
+    """Share the processed datasets between processes through a store in
+    $WHOOP_DATASET_DIR or else `directory` (nothing is shared when neither is set)"""
+    global _shared_directory
+    _shared_directory = os.environ.get(SHARED_STORE_ENV) or directory
+
+def _open_store(directory: str, size_limit: int) -> diskcache.Cache:
+    """The connection of the current process to a store, opened on first use"""
+    global _stores, _stores_pid
+    # Connections must not be inherited by forked workers
+    if _stores_pid != os.getpid():
+        _stores, _stores_pid = {}, os.getpid()
+    if directory not in _stores:
+        _stores[directory] = diskcache.Cache(directory, size_limit=size_limit,
+                                             eviction_policy='least-recently-used')
+    return _stores[directory]
+
+def shared_store() -> diskcache.Cache:
+    """The shared store of the current process, or None when not configured"""
+    if _shared_directory is None:
+        return None
+    return _open_store(_shared_directory, SHARED_STORE_SIZE_LIMIT)
+
+def stage_store() -> diskcache.Cache:
+    """The store of the shared pipeline stages, or None when the shared store is not configured"""
+    if _shared_directory is None:
+        return None
+    return _open_store(f'{_shared_directory.rstrip(os.sep)}{STAGE_STORE_SUFFIX}', STAGE_STORE_SIZE_LIMIT)
+
+def store_dataset(token: str, dataset: dict) -> str:
+    """Keep a processed dataset under its token, evicting the least recently used"""
+    _datasets.put(token, dataset)
+    store = shared_store()
+    if store is not None:
+        store.set(token, dataset)
+    return token
+
+def get_dataset(token: str) -> dict:
+    """Return the dataset stored under the token, or None if unknown or evicted"""
+    if token is None:
+        return None
+    dataset = _datasets.get(token)
+    store = shared_store()
+    if dataset is None and store is not None:
+        # Processed by another worker: keep a local copy for the next requests
+        dataset = store.get(token)
+        if dataset is not None:
+            _datasets.put(token, dataset)
+    record_cache_access('datasets', hit=dataset is not None)
+    return dataset
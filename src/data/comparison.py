@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.data.cache import LRUCache, fingerprint
+from src.data.loader import analyze_statistics, bonferroni_correction
+from src.data.query import query_data
+from src.data.rollups import (CYCLES, DAILY, MONTHS, PHASES, ROLLUP_METRICS, filter_rollup,
+                              phase_days_column, rollup_column, rollup_years)
+from src.instrumentation import timed_stage
+
+# Period-over-period comparison of two selections of the whole dataset, e.g.
+# 2023 vs 2024 or the last 3 cycles vs the 3 before. A selection is a string:
+#   'year|2024'        a calendar year, read from the month rollup
+#   'cycles|3|3'       3 cycles, skipping the last 3, read from the cycle rollup
+# Only the cycles with phase labelled days count: the open cycle has none yet.
+# The means and day counts per phase come from the rollups. The significance of
+# a change needs the spread of the days: it is a Welch t-test on the descriptive
+# statistics of analyze_statistics, run once per selection and cached, so a
+# selection is only scanned the first time it is compared.
+YEAR = 'year'
+CYCLE_WINDOW = 'cycles'
+SEPARATOR = '|'
+CYCLE_COUNTS = [1, 3, 6, 12]
+
+# Cached means and statistics per selection and comparisons per pair, kept
+# apart from the pipeline stages so that browsing periods never evicts them
+MAX_RESULTS = 64
+
+_results = LRUCache('comparison', MAX_RESULTS)
+
+def _cached(kind: str, key: str, compute):
+    return _results.get_or_compute((kind, key), compute, label=kind)
+
+def year_selection(year: int) -> str:
+    return f"{YEAR}{SEPARATOR}{year}"
+
+def cycles_selection(skip: int, count: int) -> str:
+    return f"{CYCLE_WINDOW}{SEPARATOR}{skip}{SEPARATOR}{count}"
+
+def _labelled_cycles(dataset: dict) -> pd.DataFrame:
+    cycles = dataset[CYCLES]
+    return cycles[cycles[[phase_days_column(phase) for phase in PHASES]].sum(axis=1) > 0]
+
+def selection_label(selection: str) -> str:
+    kind, *values = selection.split(SEPARATOR)
+    if kind == YEAR:
+        return values[0]
+    skip, count = int(values[0]), int(values[1])
+    cycles = f"{count} cycle{'s' if count > 1 else ''}"
+    return f"Last {cycles}" if skip == 0 else f"Previous {cycles}"
+
+def selection_options(dataset: dict) -> list[dict]:
+    """The selections of a dataset: its years, then the last and previous cycles"""
+    n_cycles = len(_labelled_cycles(dataset))
+    selections = [year_selection(year) for year in rollup_years(dataset[MONTHS])]
+    for count in CYCLE_COUNTS:
+        if count <= n_cycles:
+            selections.append(cycles_selection(0, count))
+        if 2 * count <= n_cycles:
+            selections.append(cycles_selection(count, count))
+    return [{'label': selection_label(selection), 'value': selection} for selection in selections]
+
+def default_selections(dataset: dict) -> tuple[str, str]:
+    """The last two years, or the last cycles against the previous ones"""
+    years = rollup_years(dataset[MONTHS])
+    if len(years) >= 2:
+        return year_selection(years[-2]), year_selection(years[-1])
+    count = next((count for count in reversed(CYCLE_COUNTS) if 2 * count <= len(_labelled_cycles(dataset))), 1)
+    return cycles_selection(count, count), cycles_selection(0, count)
+
+def selection_rollup(dataset: dict, selection: str) -> pd.DataFrame:
+    """The rollup rows of a selection"""
+    kind, *values = selection.split(SEPARATOR)
+    if kind == YEAR:
+        return filter_rollup(dataset[MONTHS], [int(values[0])], None)
+    skip, count = int(values[0]), int(values[1])
+    cycles = _labelled_cycles(dataset)
+    return cycles.iloc[max(len(cycles) - skip - count, 0):len(cycles) - skip]
+
+def selection_means(token: str, dataset: dict, selection: str) -> pd.DataFrame:
+    """Mean and number of days of every metric per phase in a selection, indexed by
+    (metric, phase): phase_means over its rollup rows for all metrics at once, cached per selection"""
+    def compute():
+        rollup = selection_rollup(dataset, selection)
+        index = pd.MultiIndex.from_tuples([(metric, phase) for metric in ROLLUP_METRICS for phase in PHASES
+                                           if rollup_column(metric, phase, 'mean') in rollup.columns])
+        means = rollup[[rollup_column(metric, phase, 'mean') for metric, phase in index]].to_numpy()
+        counts = rollup[[rollup_column(metric, phase, 'count') for metric, phase in index]].to_numpy()
+        days = np.nansum(counts, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(days > 0, np.nansum(means * counts, axis=0) / days, np.nan)
+        return pd.DataFrame({'mean': mean, 'days': days.astype(int)}, index=index)
+
+    return _cached('selection-means', fingerprint(token, selection), compute)
+
+def selection_rows(token: str, dataset: dict, selection: str) -> pd.DataFrame:
+    """The daily rows of a selection, the same rows as its rollup"""
+    kind, *values = selection.split(SEPARATOR)
+    if kind == YEAR:
+        return query_data(token, dataset[DAILY], [int(values[0])], None)
+    df = dataset[DAILY]
+    cycle_ids = selection_rollup(dataset, selection).index
+    return df[df[ids.CYCLE_ID].isin(cycle_ids) & df[ids.CYCLE_START_DATE].notna()]
+
+def selection_statistics(token: str, dataset: dict, selection: str) -> dict[str, dict]:
+    """analyze_statistics of every metric over the days of a selection, cached per selection"""
+    def compute():
+        df = selection_rows(token, dataset, selection)
+        results = {}
+        for metric in ROLLUP_METRICS:
+            if metric not in df.columns or df[metric].isna().all():
+                continue
+            groups = {phase: df[df[ids.PHASE] == phase][metric].dropna()
+                      for phase in [ids.FOLLICULAR, ids.OVULATORY, ids.LUTEAL, ids.MENSTRUAL]}
+            results[metric] = analyze_statistics(groups[ids.FOLLICULAR], groups[ids.OVULATORY],
+                                                 groups[ids.LUTEAL], groups[ids.MENSTRUAL], metric_name=metric)
+        return results
+
+    return _cached('selection-stats', fingerprint(token, selection), compute)
+
+def _welch_p_value(a: dict, b: dict) -> float:
+    """Welch's t-test from the descriptive statistics of two samples"""
+    from scipy.stats import ttest_ind_from_stats
+
+    if a['n'] < 2 or b['n'] < 2 or not (a['std'] > 0 or b['std'] > 0):
+        return np.nan
+    return ttest_ind_from_stats(a['mean'], a['std'], a['n'], b['mean'], b['std'], b['n'],
+                                equal_var=False).pvalue
+
+@timed_stage('compare_selections')
+def compare_selections(token: str, dataset: dict, selection_a: str, selection_b: str) -> pd.DataFrame:
+    """
+    Mean of every metric per phase in two selections, the change from the
+    first to the second and its significance (p-values Bonferroni corrected
+    over the phases of a metric).
+    """
+    def compute():
+        means_a = selection_means(token, dataset, selection_a)
+        means_b = selection_means(token, dataset, selection_b)
+        stats_a = selection_statistics(token, dataset, selection_a)
+        stats_b = selection_statistics(token, dataset, selection_b)
+
+        rows = []
+        for metric in ROLLUP_METRICS:
+            if metric not in stats_a or metric not in stats_b:
+                continue
+            tests = {}
+            for phase in PHASES:
+                desc_a = stats_a[metric]['descriptive_statistics'][phase]
+                desc_b = stats_b[metric]['descriptive_statistics'][phase]
+                p_value = _welch_p_value(desc_a, desc_b)
+                if not np.isnan(p_value):
+                    tests[phase] = {'p_value': p_value}
+            tests = bonferroni_correction(tests)
+
+            for phase in PHASES:
+                (mean_a, days_a), (mean_b, days_b) = means_a.loc[(metric, phase)], means_b.loc[(metric, phase)]
+                test = tests.get(phase)
+                rows.append({
+                    'Metric': metric,
+                    'Phase': phase,
+                    'A': mean_a,
+                    'B': mean_b,
+                    'Change': mean_b - mean_a,
+                    'Change %': 100 * (mean_b - mean_a) / abs(mean_a) if mean_a else np.nan,
+                    'Days A': int(days_a),
+                    'Days B': int(days_b),
+                    'p-value': test['p_value_corrected'] if test else np.nan,
+                    'Significant': 'Yes' if test and test['significant_corrected'] else 'No',
+                })
+        return pd.DataFrame(rows)
+
+    return _cached('comparison', fingerprint(token, selection_a, selection_b), compute)
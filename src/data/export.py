@@ -0,0 +1,46 @@
+from typing import BinaryIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Downloads of the processed daily frame (merged and phase labelled). Both
+# formats are written to the output in chunks of rows, so that besides the
+# frame itself only one chunk is held in memory at a time, whatever the size
+# of the export: no CSV string or Arrow table of the whole frame is built.
+CSV = 'csv'
+PARQUET = 'parquet'
+EXPORT_FORMATS = {CSV: 'CSV', PARQUET: 'Parquet'}
+CHUNK_ROWS = 10_000
+PARQUET_COMPRESSION = 'zstd'
+
+def write_csv(df: pd.DataFrame, output: BinaryIO, chunk_rows: int = CHUNK_ROWS) -> None:
+    pos = 0
+    while True:
+        chunk = df.iloc[pos:pos + chunk_rows]
+        # to_csv encodes straight into the binary output
+        chunk.to_csv(output, index=False, header=pos == 0, encoding='utf-8')
+        pos += chunk_rows
+        if pos >= len(df):
+            break
+
+def write_parquet(df: pd.DataFrame, output: BinaryIO, chunk_rows: int = CHUNK_ROWS) -> None:
+    # The schema is inferred from the whole frame so that every row group has the
+    # same one, even when a chunk of a column only has missing values
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(output, schema, compression=PARQUET_COMPRESSION) as writer:
+        for pos in range(0, len(df), chunk_rows):
+            chunk = df.iloc[pos:pos + chunk_rows]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def write_frame(df: pd.DataFrame, output: BinaryIO, export_format: str) -> None:
+    """Write the frame to a binary output in one of EXPORT_FORMATS"""
+    if export_format == CSV:
+        write_csv(df, output)
+    elif export_format == PARQUET:
+        write_parquet(df, output)
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+def export_filename(token: str, export_format: str) -> str:
+    return f"whoop_cycles_{token[:8]}.{export_format}"
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+# Local Imports
+from src.components import ids
+from src.data.cache import LRUCache
+from src.data.phase_models import label_phases
+
+# Weight of a cycle halves every HALF_LIFE cycles back in time
+N_RECENT_CYCLES = 6
+HALF_LIFE = 3
+# Cycle length standard deviation used when there is too little history
+MIN_LENGTH_STD = 1.0
+DEFAULT_LENGTH_STD = 2.0
+# Two-sided 80% prediction interval
+INTERVAL_Z = 1.2816
+
+# Forecasts of the overview per dataset token. They are made from the whole
+# daily frame: the filters only select the days that the other cards summarise
+MAX_FORECASTS = 16
+
+_forecasts = LRUCache('forecast', MAX_FORECASTS)
+
+def cycle_history(df: pd.DataFrame) -> pd.DataFrame:
+    """One row per cycle with its start date and length (NaN for the open cycle)"""
+    starts = df[df[ids.CYCLE_START] == True]
+    history = pd.DataFrame({
+        ids.CYCLE_DATE: pd.to_datetime(starts[ids.CYCLE_DATE]).dt.normalize().to_numpy(),
+        ids.CYCLE_LENGTH: starts[ids.CYCLE_LENGTH].to_numpy(dtype=float),
+    })
+    return history.sort_values(ids.CYCLE_DATE).reset_index(drop=True)
+
+def predict_cycle_length(history: pd.DataFrame, next_start: pd.Timestamp = None,
+                         n_recent: int = N_RECENT_CYCLES, half_life: float = HALF_LIFE,
+                         seasonal: bool = False) -> tuple[float, float]:
+    """
+    Predict the next cycle length from the completed cycles.
+
+    Returns the exponentially weighted mean of the most recent `n_recent`
+    lengths and its weighted standard deviation. With `seasonal`, the mean is
+    shifted by the (shrunk) average deviation of past cycles that started in
+    the same calendar month as `next_start`.
+    """
+    complete = history.dropna(subset=[ids.CYCLE_LENGTH])
+    lengths = complete[ids.CYCLE_LENGTH].to_numpy()
+    if len(lengths) == 0:
+        return np.nan, np.nan
+
+    recent = lengths[-n_recent:]
+    weights = 0.5 ** (np.arange(len(recent))[::-1] / half_life)
+    mean = np.average(recent, weights=weights)
+
+    if len(recent) > 1:
+        v1, v2 = weights.sum(), (weights ** 2).sum()
+        variance = np.sum(weights * (recent - mean) ** 2) / (v1 - v2 / v1)
+        std = max(np.sqrt(variance), MIN_LENGTH_STD)
+    else:
+        std = DEFAULT_LENGTH_STD
+
+    if seasonal and next_start is not None:
+        residuals = lengths - lengths.mean()
+        same_month = complete[ids.CYCLE_DATE].dt.month.to_numpy() == next_start.month
+        n = same_month.sum()
+        if n >= 2:
+            # Shrink towards no adjustment when few cycles support it
+            mean += residuals[same_month].mean() * n / (n + 2)
+
+    return float(mean), float(std)
+
+def forecast_cycle(df: pd.DataFrame, seasonal: bool = False, luteal_days: int = 14,
+                   ovulatory_days: int = 3, z: float = INTERVAL_Z) -> dict:
+    """
+    Forecast the end of the open (last) cycle: next menstrual phase and
+    ovulatory window, each with a prediction interval.
+    Returns None when there is no open cycle or no completed cycle to learn from.
+    """
+    if df.empty or ids.CYCLE_START not in df.columns:
+        return None
+
+    history = cycle_history(df)
+    if history.empty or not np.isnan(history[ids.CYCLE_LENGTH].iloc[-1]):
+        return None
+
+    open_start = history[ids.CYCLE_DATE].iloc[-1]
+    length, std = predict_cycle_length(history)
+    if np.isnan(length):
+        return None
+    if seasonal:
+        length, std = predict_cycle_length(history, open_start + timedelta(days=round(length)),
+                                           seasonal=True)
+
+    margin = z * std
+    ovulation_day = length - luteal_days
+    day = lambda cycle_day: open_start + timedelta(days=round(cycle_day) - 1)
+    current_day = int(df[ids.CYCLE_DAY_NUMBER].iloc[-1])
+
+    return {
+        'open_cycle_start': open_start,
+        'current_cycle_day': current_day,
+        'cycle_length': length,
+        'cycle_length_std': std,
+        'next_period': day(length + 1),
+        'next_period_low': day(length + 1 - margin),
+        'next_period_high': day(length + 1 + margin),
+        'ovulatory_start': day(ovulation_day - ovulatory_days + 1),
+        'ovulatory_end': day(ovulation_day),
+        'ovulatory_low': day(ovulation_day - ovulatory_days + 1 - margin),
+        'ovulatory_high': day(ovulation_day + margin),
+    }
+
+def overview_forecast(daily: pd.DataFrame) -> dict:
+    """forecast_cycle of a whole daily frame with the provisional phase of its last day"""
+    forecast = forecast_cycle(daily)
+    if forecast is None:
+        return None
+    current_phase = daily[ids.PROVISIONAL_PHASE].iloc[-1] if ids.PROVISIONAL_PHASE in daily.columns else ids.UNKNOWN
+    return {**forecast, 'current_phase': current_phase}
+
+def dataset_forecast(token: str, daily: pd.DataFrame) -> dict:
+    """overview_forecast of the daily frame of a dataset, cached per dataset token"""
+    return _forecasts.get_or_compute(token, lambda: overview_forecast(daily))
+
+def fill_provisional_phases(df: pd.DataFrame, forecast: dict, menstrual_days: int = 4,
+                            ovulatory_days: int = 3, luteal_days: int = 14) -> pd.DataFrame:
+    """
+    Add the provisional phase column: the phase for days of complete cycles
+    and the phase expected from the forecast cycle length for the open cycle
+    """
+    df_copy = df.copy()
+    df_copy[ids.PROVISIONAL_PHASE] = df_copy[ids.PHASE]
+    if forecast is None:
+        return df_copy
+
+    open_cycle = (df_copy[ids.CYCLE_DAY_NUMBER] > 0) & df_copy[ids.CYCLE_LENGTH].isna()
+    open_rows = df_copy[open_cycle].copy()
+    open_rows[ids.CYCLE_LENGTH] = round(forecast['cycle_length'])
+    ovulation_day = open_rows[ids.CYCLE_LENGTH] - luteal_days
+    df_copy.loc[open_cycle, ids.PROVISIONAL_PHASE] = label_phases(open_rows, ovulation_day,
+                                                                  menstrual_days, ovulatory_days)
+    return df_copy
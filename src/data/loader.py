@@ -3,14 +3,41 @@ from datetime import datetime, timedelta
 import numpy as np
 import base64
 import io
-from scipy import stats
-from scipy.stats import kruskal, f_oneway, mannwhitneyu, ttest_ind
 import itertools
 import warnings
-warnings.filterwarnings('ignore')
+from typing import Callable
+# scipy.stats is imported by the statistical tests on first use: it is the
+# slowest import of the app and is not needed until the statistics are shown
 
 # Local Imports 
 from src.components import ids
+from src.data.cache import cached_stage, fingerprint
+from src.instrumentation import timed_stage
+from src.data.phase_models import FIXED_MODEL, apply_phase_model
+from src.data.forecast import forecast_cycle, fill_provisional_phases
+from src.data.rollups import DAILY, build_rollups
+from src.data.transport import decode_frame
+
+# Stages reported to the progress callback of build_dataset, in order
+STAGE_PARSING = "Parsing uploads"
+STAGE_MERGING = "Merging and segmenting cycles"
+STAGE_PHASES = "Labelling phases"
+STAGE_FORECAST = "Forecasting the next cycle"
+STAGE_ROLLUPS = "Building rollups"
+PROCESSING_STAGES = [STAGE_PARSING, STAGE_MERGING, STAGE_PHASES, STAGE_FORECAST, STAGE_ROLLUPS]
+
+STATS_METRICS = [ids.RECOVERY_SCORE, ids.RESTING_HR, ids.HRV,
+                 ids.DAY_STRAIN, ids.SLEEP_EFFICIENCY]
+
+# Key of the statistics of the whole dataset, when they were computed ahead of
+# time by the batch processor (src/data/batch.py)
+STATS = 'stats'
+
+# Phase lengths of the phase models and of the forecast of the open cycle
+#Perhaps calculate the average number of menstrual days from the input data
+MENSTRUAL_DAYS = 4
+LUTEAL_DAYS = 14
+OVULATORY_DAYS = 3
 
 # class DataSchema:
 #     AMOUNT = "amount"
@@ -35,6 +62,13 @@ def parse_date(date_str: str) -> datetime:
         except: 
             return None
 
+def parse_dates(column: pd.Series) -> pd.Series:
+    """parse_date over a column, which uploads decoded from the store already hold as datetimes"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    return column.apply(parse_date)
+
+@timed_stage('parse_contents')
 def parse_contents(contents:str , filename: str) -> pd.DataFrame:
     """Parse uploaded CSV contents"""
     content_type, content_string = contents.split(',')
@@ -138,17 +172,106 @@ def calculate_cycle_phases_custom(df: pd.DataFrame, date_col: str, menstruating_
     
     return df_copy
 
+@timed_stage('process_data')
 def process_data(physiological_df: pd.DataFrame, journal_df: pd.DataFrame, 
-                    sleep_df: pd.DataFrame =None, workouts_df: pd.DataFrame =None) -> pd.DataFrame:
-    """Process and join the data"""
+                    sleep_df: pd.DataFrame =None, workouts_df: pd.DataFrame =None, 
+                    phase_model: str = FIXED_MODEL, 
+                    progress: Callable[[str], None] = None) -> pd.DataFrame:
+    """Process and join the data, labelling the phases with the chosen phase model.
+    progress is called with the name of each stage as it starts"""
     #At least physiological_df and journal_df needs to be uploaded
     if physiological_df is None or journal_df is None:
         return None
-    
+    progress = progress or (lambda stage: None)
+    
+    progress(STAGE_MERGING)
+    #The merge is cached on its inputs so that switching phase model only reruns the last stage.
+    #It is shared between processes: every background job starts a new one
+    merge_key = fingerprint(physiological_df, journal_df)
+    merged_df = cached_stage('merge', merge_key, 
+                             lambda: merge_data(physiological_df, journal_df), shared=True)
+    
+    progress(STAGE_PHASES)
+    phased_df = cached_stage('phases', fingerprint(merge_key, phase_model),
+                             lambda: apply_phase_model(merged_df, phase_model, 
+                                                       menstrual_days=MENSTRUAL_DAYS, 
+                                                       luteal_days=LUTEAL_DAYS, 
+                                                       ovulatory_days=OVULATORY_DAYS))
+    
+    #Label the open cycle with the phases expected from the cycle history
+    progress(STAGE_FORECAST)
+    forecast = forecast_cycle(phased_df, luteal_days=LUTEAL_DAYS, ovulatory_days=OVULATORY_DAYS)
+    return fill_provisional_phases(phased_df, forecast, menstrual_days=MENSTRUAL_DAYS, 
+                                   ovulatory_days=OVULATORY_DAYS, luteal_days=LUTEAL_DAYS)
+
+@timed_stage('build_dataset')
+def build_dataset(physiological_df: pd.DataFrame, journal_df: pd.DataFrame, 
+                  sleep_df: pd.DataFrame =None, workouts_df: pd.DataFrame =None, 
+                  phase_model: str = FIXED_MODEL, previous: dict = None,
+                  progress: Callable[[str], None] = None) -> dict:
+    """Process the data and build its rollups, reusing the unchanged groups of a previous dataset"""
+    processed_df = process_data(physiological_df, journal_df, sleep_df, workouts_df, 
+                                phase_model=phase_model, progress=progress)
+    if processed_df is None:
+        return None
+    if progress is not None:
+        progress(STAGE_ROLLUPS)
+    return {DAILY: processed_df, **build_rollups(processed_df, previous=previous)}
+
+@timed_stage('update_dataset')
+def update_dataset(previous: dict, physiological_df: pd.DataFrame, journal_df: pd.DataFrame,
+                   sleep_df: pd.DataFrame =None, workouts_df: pd.DataFrame =None,
+                   phase_model: str = FIXED_MODEL, changed_since: pd.Timestamp = None) -> dict:
+    """
+    The dataset of an export whose days changed or were added from `changed_since` on,
+    updated from its previous dataset with the same phase model: only the days from
+    the start of the cycle holding `changed_since` are processed again, and appended
+    to the previous days before it. The earlier days of the inputs must be unchanged.
+    Falls back to build_dataset when no cycle of the previous dataset starts before
+    `changed_since` or when the new days add a journal question.
+    """
+    if changed_since is None:
+        return previous
+    rebuild = lambda: build_dataset(physiological_df, journal_df, sleep_df, workouts_df,
+                                    phase_model=phase_model, previous=previous)
+    daily = previous[DAILY]
+    dates = daily[ids.CYCLE_START_DATE]
+    starts = dates[(daily[ids.CYCLE_START] == True) & (dates <= changed_since)]
+    if starts.empty or dates.isna().any():
+        return rebuild()
+    since = starts.iloc[-1]
+
+    # The days of the cycle holding changed_since and after, numbered after the previous cycles
+    head = daily[dates < since]
+    merged_df = merge_data(physiological_df[parse_dates(physiological_df[ids.CYCLE_START_TIME]) >= since],
+                           journal_df[parse_dates(journal_df[ids.CYCLE_START_TIME]) >= since])
+    merged_df[ids.CYCLE_ID] += int(head[ids.CYCLE_START].sum())
+    phased_df = apply_phase_model(merged_df, phase_model, menstrual_days=MENSTRUAL_DAYS,
+                                  luteal_days=LUTEAL_DAYS, ovulatory_days=OVULATORY_DAYS)
+
+    # The forecast reads the lengths of all the cycles
+    history = [ids.CYCLE_START, ids.CYCLE_DATE, ids.CYCLE_LENGTH, ids.CYCLE_DAY_NUMBER]
+    forecast = forecast_cycle(pd.concat([head[history], phased_df[history]], ignore_index=True),
+                              luteal_days=LUTEAL_DAYS, ovulatory_days=OVULATORY_DAYS)
+    tail = fill_provisional_phases(phased_df, forecast, menstrual_days=MENSTRUAL_DAYS,
+                                   ovulatory_days=OVULATORY_DAYS, luteal_days=LUTEAL_DAYS)
+
+    processed_df = pd.concat([head, tail], ignore_index=True)
+    if list(processed_df.columns) != list(daily.columns):
+        return rebuild()
+    return {DAILY: processed_df, **build_rollups(processed_df, previous=previous)}
+
+@timed_stage('merge_data')
+def merge_data(physiological_df: pd.DataFrame, journal_df: pd.DataFrame) -> pd.DataFrame:
+    """Join the physiological and journal data and segment it into cycles"""
+    #Work on copies so the cached inputs (and their fingerprint) stay unchanged
+    physiological_df = physiological_df.copy()
+    journal_df = journal_df.copy()
+
     # Parse dates
-    physiological_df[ids.CYCLE_START_DATE] = physiological_df[ids.CYCLE_START_TIME].apply(parse_date)
-    physiological_df[ids.CYCLE_END_DATE] = physiological_df[ids.CYCLE_END_TIME].apply(parse_date)
-    journal_df[ids.CYCLE_START_DATE] = journal_df[ids.CYCLE_START_TIME].apply(parse_date)
+    physiological_df[ids.CYCLE_START_DATE] = parse_dates(physiological_df[ids.CYCLE_START_TIME])
+    physiological_df[ids.CYCLE_END_DATE] = parse_dates(physiological_df[ids.CYCLE_END_TIME])
+    journal_df[ids.CYCLE_START_DATE] = parse_dates(journal_df[ids.CYCLE_START_TIME])
 
     #Create a column to check day length and add a column to define the cycle_date (the day to which the data corresponds)
     physiological_df[ids.CYCLE_DATE] = physiological_df[ids.CYCLE_START_DATE] + timedelta(hours=12)
@@ -157,8 +280,8 @@ def process_data(physiological_df: pd.DataFrame, journal_df: pd.DataFrame,
     #Pivot to extract a column with the menstrual data
     journal_pivot = journal_df.pivot_table(
         index=ids.CYCLE_START_DATE,
-        columns='Question text',
-        values='Answered yes', #?
+        columns=ids.QUESTION_TEXT,
+        values=ids.ANSWERED_YES, #?
         aggfunc='first'
     ).reset_index()
     
@@ -171,17 +294,12 @@ def process_data(physiological_df: pd.DataFrame, journal_df: pd.DataFrame,
     #Reset the index after sorting the rows by cycle_date
     # Sort by date
     merged_df = merged_df.sort_values(ids.CYCLE_DATE).reset_index(drop=True)
-    
-    #Perhaps calculate the average number of menstrual days from the input data
-    menstrual_days = 4
-    luteal_days = 14
-    ovulatory_days = 3
 
-    # Create cycle phase column
-    merged_df = calculate_cycle_phases_custom(merged_df, ids.CYCLE_DATE, ids.MENSTRUATING, 
-                                                menstrual_days=menstrual_days, 
-                                                luteal_days=luteal_days, 
-                                                ovulatory_days=ovulatory_days)
+    # Find the cycles (the phases are set afterwards by the phase model)
+    merged_df = calculate_cycle_phases_custom(merged_df, ids.CYCLE_DATE, ids.MENSTRUATING)
+    #Number the cycles (0 for the days before the first recorded period)
+    merged_df[ids.CYCLE_ID] = merged_df[ids.CYCLE_START].cumsum()
+
     # Clean numeric columns
     numeric_cols = [ ids.RECOVERY_SCORE, ids.RESTING_HR, ids.HRV, ids.SLEEP_PERFORMANCE, ids.DAY_STRAIN, 
                     ids.SLEEP_EFFICIENCY, ids.REM_DURATION, ids.DEEP_SLEEP_DURATION, 
@@ -194,34 +312,37 @@ def process_data(physiological_df: pd.DataFrame, journal_df: pd.DataFrame,
     
     return merged_df
 
-def load_data(processed_data: str) -> pd.DataFrame:
-    '''Read the JSON file containing the data'''
-    return pd.read_json(processed_data, orient='split')
+@timed_stage('load_data')
+def load_data(stored_data: dict) -> pd.DataFrame:
+    '''Read an uploaded file kept in the browser (see src.data.transport)'''
+    return decode_frame(stored_data)
 
+@timed_stage('filter_data')
 def filter_data(df: pd.DataFrame, selected_years, selected_months):
     """Filter dataframe by selected years and months"""
     if df.empty:
         return df
     
     # Ensure dates are datetime objects (they should already be from process_data)
-    # But handle the case where they might be strings when loaded from JSON
-    if not pd.api.types.is_datetime64_any_dtype(df[ids.CYCLE_START_DATE]):
-        df[ids.CYCLE_START_DATE] = df[ids.CYCLE_START_DATE].apply(parse_date)
-    
-    # Remove rows where date parsing failed
-    df = df[df[ids.CYCLE_START_DATE].notna()].copy()
-    
-    # Filter by years
+    # But handle the case where they might be strings when loaded from JSON.
+    # The input is never written to: it may be a cached frame shared with other callbacks
+    dates = df[ids.CYCLE_START_DATE]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = dates.apply(parse_date)
+        df = df.assign(**{ids.CYCLE_START_DATE: dates})
+    
+    # Remove rows where date parsing failed and filter by years and months in one pass
+    # (a boolean selection is a new frame that only copies its data when written to)
+    keep = dates.notna()
     if selected_years:
-        df = df[df[ids.CYCLE_START_DATE].dt.year.isin(selected_years)]
-    
-    # Filter by months
+        keep &= dates.dt.year.isin(selected_years)
     if selected_months:
-        df = df[df[ids.CYCLE_START_DATE].dt.month.isin(selected_months)]
+        keep &= dates.dt.month.isin(selected_months)
     
-    return df
+    return df[keep]
 
-def get_stats(df: pd.DataFrame) -> list:
+@timed_stage('get_stats')
+def get_stats(df: pd.DataFrame, progress: Callable[[str], None] = None) -> list:
     """Get the statistics to render in the statistical analysis tab
     TO-DO: Add a combobox to select variable to analyse
     Visualise only the results for that varible?
@@ -230,15 +351,15 @@ def get_stats(df: pd.DataFrame) -> list:
     Add graph of strain vs recovery in that tab - similar to the one in the whoop
     add underheath the heatmap of the cycle phase
 
+    progress is called with each metric before it is analysed
     """
     # Statistical tests and detailed analysis
     
-    metrics = [ids.RECOVERY_SCORE, ids.RESTING_HR, ids.HRV,
-               ids.DAY_STRAIN, ids.SLEEP_EFFICIENCY]
-    
     stats_results = []
     
-    for metric in metrics:
+    for metric in STATS_METRICS:
+        if progress is not None:
+            progress(metric)
         if metric in df.columns:
             follicular_data = df[df[ids.PHASE] == ids.FOLLICULAR][metric].dropna()
             ovulatory_data = df[df[ids.PHASE] == ids.OVULATORY][metric].dropna()
@@ -294,19 +415,23 @@ def analyze_statistics(follicular_data: pd.Series,
         'Menstrual': menstrual_data
     }
     
-    # Perform analysis
-    descriptive_stats = calculate_descriptive_stats(data_groups)
-    overall_test = perform_overall_test(data_groups)
-    
-    # Only perform pairwise tests if overall test is significant
-    pairwise_results = {}
-    corrected_pairwise = {}
-    
-    if overall_test.get('significant', False):
-        # Determine if parametric tests should be used
-        parametric = overall_test['test_used'] == 'One-way ANOVA'
-        pairwise_results = perform_pairwise_tests(data_groups, parametric)
-        corrected_pairwise = bonferroni_correction(pairwise_results)
+    # Small or constant samples make the tests warn; only silence them here
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+
+        # Perform analysis
+        descriptive_stats = calculate_descriptive_stats(data_groups)
+        overall_test = perform_overall_test(data_groups)
+        
+        # Only perform pairwise tests if overall test is significant
+        pairwise_results = {}
+        corrected_pairwise = {}
+        
+        if overall_test.get('significant', False):
+            # Determine if parametric tests should be used
+            parametric = overall_test['test_used'] == 'One-way ANOVA'
+            pairwise_results = perform_pairwise_tests(data_groups, parametric)
+            corrected_pairwise = bonferroni_correction(pairwise_results)
     
     return {
         'metric': metric_name,
@@ -354,6 +479,8 @@ def perform_overall_test(data_groups: dict[pd.Series]) -> dict[str]:
     Perform overall test to check if there are any differences between groups
     Uses ANOVA if assumptions are met, otherwise Kruskal-Wallis
     """
+    from scipy.stats import f_oneway, kruskal
+    
     # Filter out empty groups
     valid_groups = {phase: data for phase, data in data_groups.items() if len(data) > 0}
     
@@ -396,6 +523,8 @@ def check_normality(data_groups: dict[pd.Series]) -> dict[str, dict[str]]:
     Check normality of each phase using Shapiro-Wilk test
     Returns results for each phase
     """
+    from scipy import stats
+    
     normality_results = {}
     
     for phase, data in data_groups.items():
@@ -421,6 +550,8 @@ def check_equal_variances(data_groups: dict[str, pd.Series]) -> dict[str]:
     """
     Check for equal variances using Levene's test
     """
+    from scipy import stats
+    
     data_lists = [data.values for data in data_groups.values() if len(data) > 0]
     
     if len(data_lists) >= 2:
@@ -438,6 +569,8 @@ def perform_pairwise_tests(data_groups: dict[str, pd.Series],
     """
     Perform pairwise comparisons between all phase combinations
     """
+    from scipy.stats import mannwhitneyu, ttest_ind
+    
     # Filter out empty groups
     valid_groups = {phase: data for phase, data in data_groups.items() if len(data) > 0}
     
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.instrumentation import timed_stage
+
+# Available phase models (value used by the phase model dropdown)
+FIXED_MODEL = 'fixed'
+SKIN_TEMP_MODEL = 'skin_temp'
+JOURNAL_MODEL = 'journal'
+
+PHASE_MODEL_LABELS = {
+    FIXED_MODEL: 'Fixed phase lengths',
+    SKIN_TEMP_MODEL: 'Skin temperature shift',
+    JOURNAL_MODEL: 'Ovulation journal entries',
+}
+
+# Detected luteal phases outside this range are treated as noise and the
+# cycle falls back to the fixed phase lengths
+MIN_LUTEAL_DAYS = 7
+MAX_LUTEAL_DAYS = 18
+
+def fixed_phase_model(df: pd.DataFrame, menstrual_days: int = 4, luteal_days: int = 14,
+                      ovulatory_days: int = 3) -> pd.Series:
+    """Assume a luteal phase of fixed length ending every cycle"""
+    ovulation_day = df[ids.CYCLE_LENGTH] - luteal_days
+    return label_phases(df, ovulation_day, menstrual_days, ovulatory_days)
+
+def skin_temp_phase_model(df: pd.DataFrame, menstrual_days: int = 4, luteal_days: int = 14,
+                          ovulatory_days: int = 3, min_rise: float = 0.2,
+                          use_resting_hr: bool = True) -> pd.Series:
+    """
+    Detect the luteal shift of every cycle from the skin temperature.
+
+    Uses the three-over-six rule: the shift happens on the first day whose
+    temperature, and that of the two following days, is above the maximum of
+    the six previous days of the same cycle (the coverline), with the third
+    day at least `min_rise` degrees above it. When `use_resting_hr` is set,
+    the resting heart rate of those three days must also be above the mean of
+    the previous six. Ovulation is taken as the day before the shift.
+    Cycles without a detectable shift fall back to the fixed model.
+    """
+    if ids.SKIN_TEMP not in df.columns:
+        return fixed_phase_model(df, menstrual_days, luteal_days, ovulatory_days)
+
+    cycle_id = df[ids.CYCLE_START].cumsum()
+    day = df[ids.CYCLE_DAY_NUMBER]
+    temp = pd.to_numeric(df[ids.SKIN_TEMP], errors='coerce')
+
+    # All cycles are processed at once: windows are computed over the whole
+    # series and discarded where they cross a cycle boundary
+    same_cycle_next = (cycle_id.shift(-2) == cycle_id)
+    coverline = temp.shift(1).rolling(6, min_periods=6).max()
+    shifted = ((day > max(menstrual_days, 6))
+               & same_cycle_next
+               & (temp > coverline)
+               & (temp.shift(-1) > coverline)
+               & (temp.shift(-2) >= coverline + min_rise))
+
+    if use_resting_hr and ids.RESTING_HR in df.columns:
+        rhr = pd.to_numeric(df[ids.RESTING_HR], errors='coerce')
+        rhr_before = rhr.shift(1).rolling(6, min_periods=3).mean()
+        rhr_after = rhr[::-1].rolling(3, min_periods=2).mean()[::-1]
+        shifted &= rhr_after > rhr_before
+
+    shift_day = day.where(shifted).groupby(cycle_id).transform('min')
+    ovulation_day = _plausible_ovulation_day(df, shift_day - 1, luteal_days)
+    return label_phases(df, ovulation_day, menstrual_days, ovulatory_days)
+
+def journal_phase_model(df: pd.DataFrame, menstrual_days: int = 4, luteal_days: int = 14,
+                        ovulatory_days: int = 3) -> pd.Series:
+    """
+    Use the 'Ovulating' journal answer: ovulation is the last day of the cycle
+    answered yes. Cycles without an answer fall back to the fixed model.
+    """
+    if ids.OVULATING not in df.columns:
+        return fixed_phase_model(df, menstrual_days, luteal_days, ovulatory_days)
+
+    cycle_id = df[ids.CYCLE_START].cumsum()
+    ovulating = df[ids.OVULATING].fillna(False).astype(bool)
+    last_ovulating_day = df[ids.CYCLE_DAY_NUMBER].where(ovulating).groupby(cycle_id).transform('max')
+    ovulation_day = _plausible_ovulation_day(df, last_ovulating_day, luteal_days)
+    return label_phases(df, ovulation_day, menstrual_days, ovulatory_days)
+
+PHASE_MODELS = {
+    FIXED_MODEL: fixed_phase_model,
+    SKIN_TEMP_MODEL: skin_temp_phase_model,
+    JOURNAL_MODEL: journal_phase_model,
+}
+
+@timed_stage('apply_phase_model')
+def apply_phase_model(df: pd.DataFrame, model: str = FIXED_MODEL, **kwargs) -> pd.DataFrame:
+    """Return a copy of the segmented frame with the phase column set by the chosen model"""
+    if model not in PHASE_MODELS:
+        raise ValueError(f"Unknown phase model '{model}'. Choose from {list(PHASE_MODELS)}")
+    df_copy = df.copy()
+    df_copy[ids.PHASE] = PHASE_MODELS[model](df_copy, **kwargs)
+    return df_copy
+
+def _plausible_ovulation_day(df: pd.DataFrame, ovulation_day: pd.Series,
+                             luteal_days: int) -> pd.Series:
+    """Replace missing or implausible ovulation days by the fixed-model estimate"""
+    luteal_length = df[ids.CYCLE_LENGTH] - ovulation_day
+    plausible = luteal_length.between(MIN_LUTEAL_DAYS, MAX_LUTEAL_DAYS)
+    return ovulation_day.where(plausible, df[ids.CYCLE_LENGTH] - luteal_days)
+
+def label_phases(df: pd.DataFrame, ovulation_day: pd.Series, menstrual_days: int,
+                 ovulatory_days: int) -> pd.Series:
+    """
+    Label each day from the ovulation day of its cycle: the ovulatory phase is
+    the `ovulatory_days` days ending on ovulation, the luteal phase follows it.
+    Days outside a complete cycle are Unknown.
+    """
+    day = df[ids.CYCLE_DAY_NUMBER].to_numpy(dtype=float)
+    cycle_length = df[ids.CYCLE_LENGTH].to_numpy(dtype=float)
+    ovulation = ovulation_day.to_numpy(dtype=float)
+    if ids.MENSTRUATING in df.columns:
+        menstruating = (df[ids.MENSTRUATING] == 1).to_numpy()
+    else:
+        menstruating = np.zeros(len(df), dtype=bool)
+
+    ovulatory_start = ovulation - ovulatory_days + 1
+    unknown = (day == 0) | np.isnan(cycle_length)
+
+    phases = np.select(
+        [unknown,
+         menstruating | (day <= menstrual_days),
+         day < ovulatory_start,
+         day <= ovulation,
+         day > ovulation],
+        [ids.UNKNOWN, ids.MENSTRUAL, ids.FOLLICULAR, ids.OVULATORY, ids.LUTEAL],
+        default=ids.UNKNOWN,
+    )
+    return pd.Series(phases, index=df.index, name=ids.PHASE)
@@ -0,0 +1,140 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.data.cache import LRUCache, fingerprint
+from src.instrumentation import timed_stage
+
+# Ad-hoc slicing of the daily rows beyond the year and month filters. A query is
+# a list of predicates combined with AND or OR, e.g.
+#   {'combine': 'and', 'predicates': [{'kind': 'phase', 'values': ['Luteal']},
+#                                     {'kind': 'journal', 'question': ids.ALCOHOL, 'answer': True},
+#                                     {'kind': 'range', 'column': ids.HRV, 'low': 50, 'high': None}]}
+# Every predicate is evaluated once per dataset into a boolean array over the
+# daily rows and cached, so adding or removing a condition only combines the
+# cached arrays instead of scanning the frame again.
+# The query may also hold a window of dates, 'dates': [first, last] in days
+# since the epoch (the values of the date range slider). The daily frame is
+# sorted by cycle date, so the window is found by binary search and taken as
+# a slice of the frame.
+PHASE = 'phase'
+JOURNAL_ANSWER = 'journal'
+METRIC_RANGE = 'range'
+CYCLE_LENGTH_BAND = 'cycle_length'
+YEARS = 'years'
+MONTHS = 'months'
+
+AND = 'and'
+OR = 'or'
+DATES = 'dates'
+
+# Cached predicate arrays, keyed by (dataset token, predicate). One byte per day
+MAX_BITMAPS = 1024
+
+_bitmaps = LRUCache('query-bitmaps', MAX_BITMAPS)
+
+# Filtered views of the daily frames, shared by the callbacks that a change of
+# the filters triggers together
+MAX_VIEWS = 16
+
+_views = LRUCache('filtered-views', MAX_VIEWS)
+
+def predicate_key(predicate: dict) -> str:
+    """Canonical form of a predicate, independent of its key order"""
+    return json.dumps(predicate, sort_keys=True)
+
+def _between(values: pd.Series, low, high) -> pd.Series:
+    values = pd.to_numeric(values, errors='coerce')
+    mask = values.notna()
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
+
+def evaluate(df: pd.DataFrame, predicate: dict) -> np.ndarray:
+    """The rows of the daily frame matching a predicate, as a boolean array"""
+    kind = predicate['kind']
+    if kind == PHASE:
+        mask = df[ids.PHASE].isin(predicate['values'])
+    elif kind == JOURNAL_ANSWER:
+        question = predicate['question']
+        if question not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        mask = df[question].eq(predicate['answer'])
+    elif kind == METRIC_RANGE:
+        if predicate['column'] not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        mask = _between(df[predicate['column']], predicate.get('low'), predicate.get('high'))
+    elif kind == CYCLE_LENGTH_BAND:
+        mask = _between(df[ids.CYCLE_LENGTH], predicate.get('low'), predicate.get('high'))
+    elif kind == YEARS:
+        mask = df[ids.CYCLE_START_DATE].dt.year.isin(predicate['values'])
+    elif kind == MONTHS:
+        mask = df[ids.CYCLE_START_DATE].dt.month.isin(predicate['values'])
+    else:
+        raise ValueError(f"Unknown predicate kind '{kind}'")
+    return mask.to_numpy(dtype=bool, na_value=False)
+
+def predicate_bitmap(token: str, df: pd.DataFrame, predicate: dict) -> np.ndarray:
+    """The cached array of a predicate over the daily frame of a dataset"""
+    def compute():
+        bitmap = evaluate(df, predicate)
+        # Shared between callbacks: never written to
+        bitmap.flags.writeable = False
+        return bitmap
+
+    return _bitmaps.get_or_compute((token, predicate_key(predicate)), compute)
+
+def journal_questions(df: pd.DataFrame) -> list[str]:
+    """The journal questions of a daily frame: the columns holding yes/no answers"""
+    return [column for column in df.columns
+            if df[column].dtype == object and df[column].dropna().map(type).eq(bool).all()
+            and df[column].notna().any()]
+
+def has_conditions(query: dict) -> bool:
+    """Whether the query selects days within months, which the month rollup cannot answer"""
+    return bool(query and (query.get('predicates') or query.get(DATES)))
+
+def date_window(df: pd.DataFrame, first_day: int, last_day: int) -> slice:
+    """Positions of the rows of a frame sorted by cycle date between two days (epoch days, inclusive)"""
+    dates = df[ids.CYCLE_DATE].to_numpy()
+    start = dates.searchsorted(np.datetime64(int(first_day), 'D'), side='left')
+    stop = dates.searchsorted(np.datetime64(int(last_day) + 1, 'D'), side='left')
+    return slice(int(start), int(stop))
+
+def _filtered_view(token: str, df: pd.DataFrame, selected_years, selected_months,
+                   query: dict) -> pd.DataFrame:
+    rows = slice(0, len(df))
+    if query and query.get(DATES):
+        rows = date_window(df, *query[DATES])
+    # A slice is a view of the cached frame, nothing is copied until a mask is applied
+    view = df.iloc[rows]
+
+    # Same rows as filter_data: a parsed date, in the selected years and months
+    mask = df[ids.CYCLE_START_DATE].notna().to_numpy()[rows]
+    if selected_years:
+        mask = mask & predicate_bitmap(token, df, {'kind': YEARS, 'values': sorted(selected_years)})[rows]
+    if selected_months:
+        mask = mask & predicate_bitmap(token, df, {'kind': MONTHS, 'values': sorted(selected_months)})[rows]
+
+    if query and query.get('predicates'):
+        bitmaps = [predicate_bitmap(token, df, predicate)[rows] for predicate in query['predicates']]
+        combine = np.logical_or if query.get('combine') == OR else np.logical_and
+        mask = mask & combine.reduce(bitmaps)
+    return view if mask.all() else view[mask]
+
+@timed_stage('query_data')
+def query_data(token: str, df: pd.DataFrame, selected_years, selected_months,
+               query: dict = None) -> pd.DataFrame:
+    """Filter the daily frame of a dataset like filter_data, then by the query.
+    The frame must be the whole daily frame stored under the token. The result
+    is cached and shared: it must not be written to"""
+    if df.empty:
+        return df
+
+    return _views.get_or_compute(fingerprint(token, selected_years, selected_months, query),
+                                 lambda: _filtered_view(token, df, selected_years, selected_months, query))
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.instrumentation import timed_stage
+
+# Compact aggregate tables built next to the daily frame by process_data.
+# Every table has one row per group (cycle, ISO week or month) with the number
+# of days per phase and the mean/min/max/count of each metric per phase, so
+# charts can read them instead of re-aggregating the daily rows.
+ROLLUP_METRICS = [ids.RECOVERY_SCORE, ids.RESTING_HR, ids.HRV, ids.SLEEP_PERFORMANCE, ids.DAY_STRAIN,
+                  ids.SLEEP_EFFICIENCY, ids.REM_DURATION, ids.DEEP_SLEEP_DURATION,
+                  ids.LIGHT_SLEEP_DURATION, ids.SKIN_TEMP, ids.BLOOD_O2, ids.ENERGY_BURNED,
+                  ids.RESP_RATE]
+PHASES = [ids.MENSTRUAL, ids.FOLLICULAR, ids.OVULATORY, ids.LUTEAL]
+STATS = ['mean', 'min', 'max', 'count']
+
+# Dataset keys
+DAILY = 'daily'
+CYCLES = 'cycles'
+WEEKS = 'weeks'
+MONTHS = 'months'
+
+# Rollup columns
+DAYS = 'days'
+CYCLE_STARTS = 'cycle_starts'
+CYCLE_LENGTH_SUM = 'cycle_length_sum'
+CYCLE_LENGTH_COUNT = 'cycle_length_count'
+SIGNATURE = 'signature'
+ISO_YEAR = 'iso_year'
+ISO_WEEK = 'iso_week'
+YEAR = 'year'
+MONTH = 'month'
+
+def rollup_column(metric: str, phase: str, stat: str) -> str:
+    return f"{metric}|{phase}|{stat}"
+
+def phase_days_column(phase: str) -> str:
+    return f"{phase}|{DAYS}"
+
+@timed_stage('build_rollups')
+def build_rollups(df: pd.DataFrame, previous: dict = None) -> dict:
+    """
+    Build the per cycle, per ISO week and per month rollups of a processed frame.
+
+    When the rollups of a previous version of the dataset are given, only the
+    groups whose rows changed are recomputed; the others are reused as is.
+    """
+    df = _with_period_keys(df)
+    # One hash per row, summed per group, tells which groups changed
+    row_hash = pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy(), index=df.index)
+
+    previous = previous or {}
+    cycles = _incremental(df, row_hash, [ids.CYCLE_ID], _cycle_rollup, previous.get(CYCLES))
+    weeks = _incremental(df, row_hash, [ISO_YEAR, ISO_WEEK], _period_rollup, previous.get(WEEKS))
+    months = _incremental(df, row_hash, [YEAR, MONTH], _period_rollup, previous.get(MONTHS))
+
+    # Rows before the first recorded period do not belong to a cycle
+    cycles = cycles[cycles.index > 0]
+    return {CYCLES: cycles, WEEKS: weeks, MONTHS: months}
+
+def filter_rollup(rollup: pd.DataFrame, selected_years, selected_months) -> pd.DataFrame:
+    """Filter the month rollup like filter_data filters the daily rows"""
+    mask = np.ones(len(rollup), dtype=bool)
+    if selected_years:
+        mask &= rollup.index.get_level_values(YEAR).isin(selected_years)
+    if selected_months:
+        mask &= rollup.index.get_level_values(MONTH).isin(selected_months)
+    return rollup[mask]
+
+def rollup_years(rollup: pd.DataFrame) -> list[int]:
+    """Years covered by the month rollup, the options of the year filter"""
+    return sorted(int(year) for year in rollup.index.get_level_values(YEAR).unique())
+
+def phase_means(rollup: pd.DataFrame, metric: str) -> dict[str, float]:
+    """Combine the per group means of a metric into one mean per phase"""
+    means = {}
+    for phase in PHASES:
+        mean_col, count_col = rollup_column(metric, phase, 'mean'), rollup_column(metric, phase, 'count')
+        if mean_col not in rollup.columns:
+            means[phase] = np.nan
+            continue
+        count = rollup[count_col].sum()
+        means[phase] = (rollup[mean_col] * rollup[count_col]).sum() / count if count > 0 else np.nan
+    return means
+
+def summarise_months(rollup: pd.DataFrame) -> dict[str, float]:
+    """Totals shown in the overview summary cards"""
+    n_lengths = rollup[CYCLE_LENGTH_COUNT].sum()
+    return {
+        'total_days': int(rollup[DAYS].sum()),
+        'no_cycles': int(rollup[CYCLE_STARTS].sum()),
+        'menstrual_days': int(rollup[phase_days_column(ids.MENSTRUAL)].sum()),
+        'avg_cycle_len': rollup[CYCLE_LENGTH_SUM].sum() / n_lengths if n_lengths > 0 else np.nan,
+    }
+
+def _with_period_keys(df: pd.DataFrame) -> pd.DataFrame:
+    # Copy-on-write: the new columns are not written through to the input
+    df = df[df[ids.CYCLE_START_DATE].notna()]
+    dates = pd.to_datetime(df[ids.CYCLE_START_DATE])
+    iso = dates.dt.isocalendar()
+    df[ISO_YEAR] = iso['year'].astype(int)
+    df[ISO_WEEK] = iso['week'].astype(int)
+    df[YEAR] = dates.dt.year
+    df[MONTH] = dates.dt.month
+    if ids.CYCLE_ID not in df.columns:
+        df[ids.CYCLE_ID] = df[ids.CYCLE_START].cumsum()
+    return df
+
+def _incremental(df: pd.DataFrame, row_hash: pd.Series, keys: list[str], build,
+                 previous: pd.DataFrame = None) -> pd.DataFrame:
+    """Rebuild only the groups of a rollup whose row signature changed"""
+    signatures = row_hash.groupby([df[key] for key in keys]).sum()
+    if previous is None:
+        changed = signatures.index
+    else:
+        old = previous[SIGNATURE].reindex(signatures.index)
+        changed = signatures.index[signatures.ne(old)]
+        if len(changed) == 0:
+            return previous[previous.index.isin(signatures.index)]
+
+    row_keys = df.set_index(keys).index
+    rollup = build(df[row_keys.isin(changed)], keys)
+    rollup[SIGNATURE] = signatures.reindex(rollup.index)
+
+    if previous is not None:
+        unchanged = previous.index.isin(signatures.index) & ~previous.index.isin(changed)
+        rollup = pd.concat([previous[unchanged], rollup]).sort_index()
+    return rollup
+
+def _phase_aggregates(df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    metrics = [metric for metric in ROLLUP_METRICS if metric in df.columns]
+    days = (df.groupby(keys + [ids.PHASE]).size()
+              .unstack(ids.PHASE, fill_value=0)
+              .reindex(columns=PHASES + [ids.UNKNOWN], fill_value=0))
+    days.columns = [phase_days_column(phase) for phase in days.columns]
+
+    phase_rows = df[df[ids.PHASE].isin(PHASES)]
+    stats = phase_rows.groupby(keys + [ids.PHASE])[metrics].agg(STATS).unstack(ids.PHASE)
+    stats.columns = [rollup_column(metric, phase, stat) for metric, stat, phase in stats.columns]
+    # Keep the same columns whatever phases are present in these rows
+    stats = stats.reindex(columns=[rollup_column(metric, phase, stat)
+                                   for metric in metrics for stat in STATS for phase in PHASES])
+    return days.join(stats)
+
+def _cycle_rollup(df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    grouped = df.groupby(keys)
+    rollup = pd.DataFrame({
+        ids.CYCLE_DATE: grouped[ids.CYCLE_DATE].first(),
+        ids.CYCLE_LENGTH: grouped[ids.CYCLE_LENGTH].first(),
+        DAYS: grouped.size(),
+    })
+    return rollup.join(_phase_aggregates(df, keys))
+
+def _period_rollup(df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    starts = df[df[ids.CYCLE_DAY_NUMBER] == 1]
+    grouped_starts = starts.groupby(keys)[ids.CYCLE_LENGTH]
+    rollup = pd.DataFrame({DAYS: df.groupby(keys)[ids.CYCLE_DATE].nunique()})
+    rollup[CYCLE_STARTS] = grouped_starts.size().reindex(rollup.index, fill_value=0)
+    rollup[CYCLE_LENGTH_SUM] = grouped_starts.sum().reindex(rollup.index, fill_value=0)
+    rollup[CYCLE_LENGTH_COUNT] = grouped_starts.count().reindex(rollup.index, fill_value=0)
+    return rollup.join(_phase_aggregates(df, keys))
@@ -0,0 +1,134 @@
+import base64
+import io
+from pathlib import Path
+
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.data.loader import parse_date
+
+# Up-front check of an upload, before it is parsed in full: only the header and
+# the first rows are decoded to tell which export the file is and to check its
+# columns, so a wrong file is rejected (or moved to the right upload box) in
+# milliseconds instead of failing deep in process_data.
+PHYSIOLOGICAL = 'physiological'
+JOURNAL = 'journal'
+SLEEP = 'sleep'
+WORKOUTS = 'workouts'
+
+EXPORT_LABELS = {
+    PHYSIOLOGICAL: 'Physiological Cycles',
+    JOURNAL: 'Journal Entries',
+    SLEEP: 'Sleep Data',
+    WORKOUTS: 'Workouts',
+}
+
+# Size of the sample read from the start of the file
+SAMPLE_BYTES = 64 * 1024
+SAMPLE_ROWS = 50
+
+# Column types
+DATE = 'date'
+NUMBER = 'number'
+BOOLEAN = 'boolean'
+
+# Columns that only one kind of export has, in the order the kinds are tried
+IDENTIFYING_COLUMNS = {
+    JOURNAL: [ids.QUESTION_TEXT, ids.ANSWERED_YES],
+    WORKOUTS: [ids.WORKOUT_START_TIME, ids.ACTIVITY_STRAIN],
+    PHYSIOLOGICAL: [ids.RECOVERY_SCORE, ids.HRV],
+    SLEEP: [ids.NAP],
+}
+
+# Columns the processing reads from every kind of export
+REQUIRED_COLUMNS = {
+    PHYSIOLOGICAL: [ids.CYCLE_START_TIME, ids.CYCLE_END_TIME, ids.RECOVERY_SCORE, ids.RESTING_HR,
+                    ids.HRV, ids.DAY_STRAIN],
+    JOURNAL: [ids.CYCLE_START_TIME, ids.QUESTION_TEXT, ids.ANSWERED_YES],
+    SLEEP: [ids.CYCLE_START_TIME, ids.SLEEP_ONSET, ids.WAKE_ONSET],
+    WORKOUTS: [ids.CYCLE_START_TIME, ids.WORKOUT_START_TIME, ids.ACTIVITY_STRAIN],
+}
+
+# Expected type of the known columns, checked on the sample when present
+COLUMN_TYPES = {
+    ids.CYCLE_START_TIME: DATE, ids.CYCLE_END_TIME: DATE, ids.SLEEP_ONSET: DATE,
+    ids.WAKE_ONSET: DATE, ids.WORKOUT_START_TIME: DATE,
+    ids.ANSWERED_YES: BOOLEAN, ids.NAP: BOOLEAN,
+    **{column: NUMBER for column in [
+        ids.RECOVERY_SCORE, ids.RESTING_HR, ids.HRV, ids.SKIN_TEMP, ids.BLOOD_O2, ids.DAY_STRAIN,
+        ids.ENERGY_BURNED, ids.MAX_HR, ids.AVE_HR, ids.SLEEP_PERFORMANCE, ids.RESP_RATE,
+        ids.ASLEEP_DURATION, ids.IN_BED_DURATION, ids.LIGHT_SLEEP_DURATION, ids.DEEP_SLEEP_DURATION,
+        ids.REM_DURATION, ids.AWAKE_DURATION, ids.SLEEP_NEED, ids.SLEEP_DEBT, ids.SLEEP_EFFICIENCY,
+        ids.SLEEP_CONSISTENCY, ids.ACTIVITY_STRAIN]},
+}
+
+class UploadError(ValueError):
+    """The upload is not a usable export, with a message for the upload status"""
+
+def _read_sample(raw: bytes, truncated: bool) -> pd.DataFrame:
+    """The header and first rows of the start of a file, as text"""
+    if truncated:
+        # Drop the row cut at the end of the sample
+        raw = raw[:raw.rfind(b'\n') + 1]
+    try:
+        text = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        raise UploadError("not a CSV file")
+    try:
+        return pd.read_csv(io.StringIO(text), nrows=SAMPLE_ROWS, dtype=str, keep_default_na=False)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError):
+        raise UploadError("not a CSV file")
+
+def _upload_sample(contents: str) -> pd.DataFrame:
+    """Sample of an upload encoded by dcc.Upload"""
+    _, _, data = contents.partition(',')
+    # Whole base64 quanta decode on their own, without the rest of the file
+    prefix = data[:SAMPLE_BYTES // 3 * 4]
+    try:
+        raw = base64.b64decode(prefix)
+    except ValueError:
+        raise UploadError("the file could not be decoded")
+    return _read_sample(raw, len(prefix) < len(data))
+
+def _file_sample(path: Path) -> pd.DataFrame:
+    with open(path, 'rb') as file:
+        raw = file.read(SAMPLE_BYTES + 1)
+    return _read_sample(raw[:SAMPLE_BYTES], len(raw) > SAMPLE_BYTES)
+
+def _type_matches(values: pd.Series, column_type: str) -> bool:
+    values = values[values.str.strip() != '']
+    if column_type == DATE:
+        return all(parse_date(value) is not None for value in values)
+    if column_type == NUMBER:
+        return pd.to_numeric(values, errors='coerce').notna().all()
+    if column_type == BOOLEAN:
+        return values.str.lower().isin(['true', 'false']).all()
+    return True
+
+def _identify(sample: pd.DataFrame) -> str:
+    columns = set(sample.columns)
+
+    kind = next((kind for kind, identifying in IDENTIFYING_COLUMNS.items()
+                 if columns.issuperset(identifying)), None)
+    if kind is None:
+        raise UploadError("not a Whoop export (unknown columns)")
+
+    missing = [column for column in REQUIRED_COLUMNS[kind] if column not in columns]
+    if missing:
+        raise UploadError(f"{EXPORT_LABELS[kind]} export without {', '.join(missing)}")
+
+    wrong = [column for column, column_type in COLUMN_TYPES.items()
+             if column in columns and not _type_matches(sample[column], column_type)]
+    if wrong:
+        raise UploadError(f"unexpected values in {', '.join(wrong)}")
+    return kind
+
+def sniff_upload(contents: str) -> str:
+    """Identify the kind of export of an upload from its first rows and check its
+    columns. Raises UploadError when it is not a usable export"""
+    return _identify(_upload_sample(contents))
+
+def sniff_file(path: Path) -> str:
+    """sniff_upload for an export file on disk"""
+    return _identify(_file_sample(path))
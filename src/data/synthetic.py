@@ -0,0 +1,212 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+
+# Deterministic generator of Whoop-like exports (physiological cycles, journal
+# entries, sleeps and workouts) used for benchmarks and local testing.
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIMEZONE = 'UTC+01:00'
+EXPORT_FILES = {
+    'physiological': 'physiological_cycles.csv',
+    'journal': 'journal_entries.csv',
+    'sleep': 'sleeps.csv',
+    'workouts': 'workouts.csv',
+}
+
+JOURNAL_QUESTIONS = [
+    ids.AVOID_PROCESSED_FOODS, ids.COMMUTE_TO_WORK, ids.CONNECTED_WITH_FAMILY, ids.CONSUME_DAIRY,
+    ids.CONSUMED_PROTEIN, ids.EAT_MEALS_DAYLIGHT, ids.EAT_CLOSE_TO_BEDTIME, ids.SEXUAL_ACTIVITY,
+    ids.EXPERIENCE_STRESS, ids.EXPERIENCE_BLOATING, ids.EXPERIENCE_JET_LAG, ids.DECREASED_LIBIDO,
+    ids.COVID_SYMPTOMS, ids.FEVER, ids.MENSTRUAL_CRAMPS, ids.FEEL_ENERGIZED, ids.FEELING_SICK,
+    ids.FELT_RECOVERED, ids.HOT_FLASH_SLEEPING, ids.THERAPY_SESSION, ids.INJURY_OR_WOUND, ids.ALCOHOL,
+    ids.CAFFEINE, ids.HYDRATED, ids.JOURNAL, ids.MEDITATE, ids.MENSTRUATING, ids.OVULATING,
+    ids.READ_IN_BED, ids.COVID_VAX_BOOSTER, ids.COVID_VAX_DOSE1, ids.COVID_VAX_DOSE2,
+    ids.SUNLIGHT_UPON_WAKING, ids.SHARE_BED, ids.SAME_BED, ids.SNACK_BETWEEN_MEALS,
+    ids.SPEND_TIME_OUTDOORS, ids.SPEND_TIME_STRETCHING, ids.TAKE_MAGNESIUM, ids.TAKE_MULTIVITAMIN,
+    ids.ICE_BATH, ids.TAKE_TURMERIC, ids.TAKE_VITAMIN_B12, ids.TAKE_VITAMIN_D, ids.COLD_SHOWER,
+    ids.VACATION_DAY, ids.TRAVELED_PLANE, ids.USE_SAUNA, ids.USE_STEAM_ROOM, ids.BREATHWORK,
+    ids.SCREEN_IN_BED, ids.WATCH_SUNSET, ids.WEAR_SLEEP_MASK, ids.WORK_FROM_HOME, ids.WORK_LATE,
+]
+ACTIVITIES = ['Running', 'Cycling', 'Functional Fitness', 'Yoga', 'Swimming', 'Walking']
+
+def generate_export(years: float = 1, seed: int = 0, start: str = '2020-01-01',
+                    cycle_length_mean: float = 29, cycle_length_std: float = 2.5,
+                    missing_day_rate: float = 0.02) -> dict[str, pd.DataFrame]:
+    """
+    Generate one user's export as raw DataFrames (same columns as the Whoop CSVs).
+
+    Cycle lengths are drawn around `cycle_length_mean` with `cycle_length_std`
+    days of variability; the luteal phase raises resting heart rate, skin
+    temperature and respiratory rate and lowers HRV. A `missing_day_rate`
+    fraction of the days is dropped from every file, as when the strap is not worn.
+    """
+    rng = np.random.default_rng(seed)
+    n_days = int(round(365.25 * years))
+
+    # Cycle structure
+    lengths = np.clip(rng.normal(cycle_length_mean, cycle_length_std, n_days // 20 + 2).round(), 21, 40)
+    # The export starts partway through the first cycle, which keeps its drawn length
+    cycle_starts = (np.concatenate([[0], np.cumsum(lengths)])[:-1] - rng.integers(0, lengths[0])).astype(int)
+    cycle_of_day = np.searchsorted(cycle_starts, np.arange(n_days), side='right') - 1
+    cycle_day = np.arange(n_days) - cycle_starts[cycle_of_day] + 1
+    cycle_length = lengths[cycle_of_day]
+    menses_length = rng.integers(4, 7, len(lengths))[cycle_of_day]
+    ovulation_day = cycle_length - np.clip(rng.normal(13, 1.2, len(lengths)).round(), 10, 16)[cycle_of_day]
+    menstruating = cycle_day <= menses_length
+    ovulating = (cycle_day >= ovulation_day - 1) & (cycle_day <= ovulation_day)
+    luteal = (cycle_day > ovulation_day).astype(float)
+
+    # Days, each cycle starting with the sleep of the previous night
+    days = pd.Timestamp(start) + pd.to_timedelta(np.arange(n_days), unit='D')
+    cycle_start = days - pd.Timedelta(hours=1) + pd.to_timedelta(rng.normal(0, 45, n_days).round(), unit='min')
+    cycle_end = cycle_start + pd.Timedelta(days=1)
+    kept = rng.random(n_days) >= missing_day_rate
+
+    # Sleep
+    in_bed = rng.normal(480, 45, n_days).clip(240, 660).round()
+    awake = (in_bed * rng.uniform(0.04, 0.15, n_days)).round()
+    asleep = in_bed - awake
+    deep = (asleep * rng.uniform(0.15, 0.25, n_days)).round()
+    rem = (asleep * rng.uniform(0.18, 0.28, n_days)).round()
+    light = asleep - deep - rem
+    sleep_need = rng.normal(470, 20, n_days).round()
+    sleep_performance = np.clip(asleep / sleep_need * 100, 30, 100).round()
+    sleep_efficiency = (asleep / in_bed * 100).round()
+    sleep_onset = cycle_start
+    wake_onset = sleep_onset + pd.to_timedelta(in_bed, unit='min')
+
+    # Physiology
+    hrv = (rng.normal(65, 10, n_days) * (1 - 0.08 * luteal)).clip(15).round()
+    resting_hr = (rng.normal(56, 2.5, n_days) + 2.5 * luteal).round()
+    recovery = np.clip(30 + (hrv - 40) * 1.2 - (resting_hr - 56) * 2 + rng.normal(0, 8, n_days), 1, 99).round()
+    strain = rng.gamma(4, 2.8, n_days).clip(0, 21).round(1)
+
+    physiological = pd.DataFrame({
+        ids.CYCLE_START_TIME: cycle_start.strftime(DATE_FORMAT),
+        ids.CYCLE_END_TIME: cycle_end.strftime(DATE_FORMAT),
+        ids.CYCLE_TIMEZONE: TIMEZONE,
+        ids.RECOVERY_SCORE: recovery,
+        ids.RESTING_HR: resting_hr,
+        ids.HRV: hrv,
+        ids.SKIN_TEMP: (33.6 + 0.3 * luteal + rng.normal(0, 0.12, n_days)).round(2),
+        ids.BLOOD_O2: rng.normal(96.5, 0.8, n_days).clip(90, 100).round(2),
+        ids.DAY_STRAIN: strain,
+        ids.ENERGY_BURNED: (1700 + strain * 70 + rng.normal(0, 150, n_days)).round(),
+        ids.MAX_HR: (120 + strain * 3.5 + rng.normal(0, 8, n_days)).round(),
+        ids.AVE_HR: (resting_hr + 12 + strain * 0.6).round(),
+        ids.SLEEP_ONSET: sleep_onset.strftime(DATE_FORMAT),
+        ids.WAKE_ONSET: wake_onset.strftime(DATE_FORMAT),
+        ids.SLEEP_PERFORMANCE: sleep_performance,
+        ids.RESP_RATE: (15 + 0.3 * luteal + rng.normal(0, 0.4, n_days)).round(1),
+        ids.ASLEEP_DURATION: asleep,
+        ids.IN_BED_DURATION: in_bed,
+        ids.LIGHT_SLEEP_DURATION: light,
+        ids.DEEP_SLEEP_DURATION: deep,
+        ids.REM_DURATION: rem,
+        ids.AWAKE_DURATION: awake,
+        ids.SLEEP_NEED: sleep_need,
+        ids.SLEEP_DEBT: np.clip(sleep_need - asleep, 0, None),
+        ids.SLEEP_EFFICIENCY: sleep_efficiency,
+        ids.SLEEP_CONSISTENCY: rng.integers(50, 100, n_days),
+    })[kept].reset_index(drop=True)
+
+    sleep_columns = [ids.CYCLE_START_TIME, ids.CYCLE_END_TIME, ids.CYCLE_TIMEZONE, ids.SLEEP_ONSET,
+                     ids.WAKE_ONSET, ids.SLEEP_PERFORMANCE, ids.RESP_RATE, ids.ASLEEP_DURATION,
+                     ids.IN_BED_DURATION, ids.LIGHT_SLEEP_DURATION, ids.DEEP_SLEEP_DURATION,
+                     ids.REM_DURATION, ids.AWAKE_DURATION, ids.SLEEP_NEED, ids.SLEEP_DEBT,
+                     ids.SLEEP_EFFICIENCY, ids.SLEEP_CONSISTENCY]
+    sleeps = physiological[sleep_columns].assign(Nap=False)
+
+    return {
+        'physiological': physiological,
+        'journal': _journal(rng, cycle_start[kept], cycle_end[kept], menstruating[kept], ovulating[kept]),
+        'sleep': sleeps,
+        'workouts': _workouts(rng, cycle_start[kept], cycle_end[kept], strain[kept]),
+    }
+
+def _journal(rng: np.random.Generator, cycle_start: pd.DatetimeIndex, cycle_end: pd.DatetimeIndex,
+             menstruating: np.ndarray, ovulating: np.ndarray) -> pd.DataFrame:
+    """One row per day and answered question"""
+    n_days, n_questions = len(cycle_start), len(JOURNAL_QUESTIONS)
+    # Each question is answered on a fraction of the days with its own 'yes' rate
+    answer_rate = rng.uniform(0.2, 0.9, n_questions)
+    yes_rate = rng.uniform(0.05, 0.8, n_questions)
+    answered = rng.random((n_days, n_questions)) < answer_rate
+    answers = rng.random((n_days, n_questions)) < yes_rate
+
+    cycle_questions = {ids.MENSTRUATING: menstruating, ids.OVULATING: ovulating}
+    for question, values in cycle_questions.items():
+        col = JOURNAL_QUESTIONS.index(question)
+        answered[:, col] = True
+        answers[:, col] = values
+
+    day_idx, question_idx = np.nonzero(answered)
+    return pd.DataFrame({
+        ids.CYCLE_START_TIME: cycle_start.strftime(DATE_FORMAT)[day_idx],
+        ids.CYCLE_END_TIME: cycle_end.strftime(DATE_FORMAT)[day_idx],
+        ids.CYCLE_TIMEZONE: TIMEZONE,
+        'Question text': np.array(JOURNAL_QUESTIONS)[question_idx],
+        'Answered yes': answers[day_idx, question_idx],
+        'Notes': '',
+    })
+
+def _workouts(rng: np.random.Generator, cycle_start: pd.DatetimeIndex, cycle_end: pd.DatetimeIndex,
+              strain: np.ndarray) -> pd.DataFrame:
+    """Workouts on roughly two days out of three"""
+    workout_days = np.nonzero(rng.random(len(cycle_start)) < 0.65)[0]
+    n = len(workout_days)
+    start = cycle_start[workout_days] + pd.to_timedelta(rng.uniform(9, 20, n) * 60, unit='min')
+    duration = rng.uniform(20, 100, n).round()
+    zones = rng.dirichlet(np.ones(5), n) * 100
+    workouts = pd.DataFrame({
+        ids.CYCLE_START_TIME: cycle_start[workout_days].strftime(DATE_FORMAT),
+        ids.CYCLE_END_TIME: cycle_end[workout_days].strftime(DATE_FORMAT),
+        ids.CYCLE_TIMEZONE: TIMEZONE,
+        'Workout start time': start.strftime(DATE_FORMAT),
+        'Workout end time': (start + pd.to_timedelta(duration, unit='min')).strftime(DATE_FORMAT),
+        'Duration (min)': duration,
+        'Activity name': rng.choice(ACTIVITIES, n),
+        'Activity Strain': (strain[workout_days] * rng.uniform(0.5, 0.9, n)).round(1),
+        ids.ENERGY_BURNED: (duration * rng.uniform(6, 12, n)).round(),
+        ids.MAX_HR: rng.integers(140, 195, n),
+        ids.AVE_HR: rng.integers(110, 160, n),
+    })
+    for zone in range(5):
+        workouts[f'HR Zone {zone + 1} %'] = zones[:, zone].round()
+    workouts['GPS enabled'] = rng.random(n) < 0.5
+    return workouts
+
+def write_export(directory: str, **kwargs) -> dict[str, Path]:
+    """Generate an export and write it as CSV files named like the Whoop ones"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for kind, df in generate_export(**kwargs).items():
+        paths[kind] = directory / EXPORT_FILES[kind]
+        df.to_csv(paths[kind], index=False)
+    return paths
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic Whoop exports")
+    parser.add_argument('output', help="Directory where the exports are written")
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--users', type=int, default=1,
+                        help="Number of users; each one is written to <output>/user_<n>")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cycle-length-std', type=float, default=2.5)
+    parser.add_argument('--missing-day-rate', type=float, default=0.02)
+    args = parser.parse_args()
+
+    for user in range(args.users):
+        directory = Path(args.output) / f'user_{user}' if args.users > 1 else Path(args.output)
+        write_export(directory, years=args.years, seed=args.seed + user,
+                     cycle_length_std=args.cycle_length_std, missing_day_rate=args.missing_day_rate)
+        print(f"Wrote {directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import base64
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Format of the uploaded frames kept in the browser (dcc.Store): a zstd
+# compressed Arrow IPC stream, base64 encoded to fit in the store's JSON.
+# Date columns travel as epoch milliseconds (int64) and are listed in 'dates'.
+STORE_FORMAT = 'arrow-ipc'
+COMPRESSION = 'zstd'
+
+# Export date format (the one parse_date tries first)
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def export_dates(column: pd.Series) -> pd.Series:
+    """The column as datetimes when every non-empty value is an export date, else None"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    if not (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)):
+        return None
+    present = column[column.notna() & (column != '')]
+    if present.empty:
+        return None
+    # Cheap check on the first value before parsing the whole column
+    try:
+        datetime.strptime(str(present.iloc[0]), DATE_FORMAT)
+    except ValueError:
+        return None
+    parsed = pd.to_datetime(column.where(column != ''), format=DATE_FORMAT, errors='coerce')
+    # Only lossless conversions: any value that is not an export date keeps the column as text
+    if parsed[present.index].isna().any():
+        return None
+    return parsed
+
+def encode_frame(df: pd.DataFrame) -> dict:
+    """Encode a DataFrame for a dcc.Store"""
+    columns, dates = {}, []
+    for name in df.columns:
+        parsed = export_dates(df[name])
+        if parsed is None:
+            columns[name] = df[name]
+        else:
+            ms = pd.array(parsed.to_numpy(dtype='datetime64[ms]').astype(np.int64), dtype='Int64')
+            ms[parsed.isna().to_numpy()] = pd.NA
+            columns[name] = pd.Series(ms, index=df.index)
+            dates.append(name)
+    table = pa.Table.from_pandas(pd.DataFrame(columns, index=df.index), preserve_index=False)
+
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return {'format': STORE_FORMAT, 'dates': dates,
+            'data': base64.b64encode(sink.getvalue().to_pybytes()).decode()}
+
+def decode_frame(payload: dict) -> pd.DataFrame:
+    """Decode a DataFrame encoded by encode_frame, with its date columns as datetimes"""
+    if payload.get('format') != STORE_FORMAT:
+        raise ValueError(f"Unknown store format: {payload.get('format')}")
+    with pa.ipc.open_stream(base64.b64decode(payload['data'])) as reader:
+        df = reader.read_all().to_pandas()
+    for name in payload['dates']:
+        df[name] = pd.to_datetime(df[name], unit='ms')
+    return df
@@ -0,0 +1,243 @@
+import argparse
+import io
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Local Imports
+from src.components import ids
+from src.data.cache import (DEFAULT_DATASET_DIR, configure_shared_store, fingerprint, get_dataset,
+                            shared_store, store_dataset)
+from src.data.loader import build_dataset, update_dataset
+from src.data.phase_models import FIXED_MODEL, PHASE_MODELS
+from src.data.schema import UploadError, sniff_file, PHYSIOLOGICAL, JOURNAL, SLEEP, WORKOUTS
+from src.data.synthetic import EXPORT_FILES
+from src.data.transport import export_dates
+
+# Optional ingestion of an export kept up to date in a local folder (e.g. data/):
+# when $WHOOP_WATCH_DIR is set the dashboard polls the folder for new or changed
+# export files, appends their new rows to what it has already ingested and
+# updates the datasets of the phase models that sessions asked for: only the
+# days from the cycle of the first new or changed row on are processed again
+# (see loader.update_dataset). Sessions without uploads of their own then switch
+# to the new dataset on their next poll, see the watch callback in main.py.
+# With several server processes, run one watcher next to them instead:
+#   python -m src.data.watcher data/ --store cache/datasets
+WATCH_DIR_ENV = 'WHOOP_WATCH_DIR'
+POLL_INTERVAL_S = 10
+
+# Columns identifying a row of every export, to tell the new rows from the ingested ones
+ROW_KEYS = {
+    PHYSIOLOGICAL: [ids.CYCLE_START_TIME],
+    JOURNAL: [ids.CYCLE_START_TIME, ids.QUESTION_TEXT],
+    SLEEP: [ids.CYCLE_START_TIME, ids.SLEEP_ONSET],
+    WORKOUTS: [ids.WORKOUT_START_TIME],
+}
+# A re-export fills in the rows of the open day (recovery, strain, end time):
+# the rows are compared on their content as well, and a changed row replaces
+# the ingested one with the same key. The content is hashed as the text of the
+# file, which does not change when a filled in value changes the column types
+ROW_HASH = 'row_hash'
+# Exports the processing reads: new rows of the others do not change the days
+PROCESSED_KINDS = [PHYSIOLOGICAL, JOURNAL]
+
+logger = logging.getLogger('whoop.watcher')
+
+_watcher = None
+
+def _published_key(directory: Path, phase_model: str) -> str:
+    return fingerprint('watched', str(directory.resolve()), phase_model)
+
+def _requested_key(directory: Path, phase_model: str) -> str:
+    return fingerprint('watched-request', str(directory.resolve()), phase_model)
+
+def _with_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """The export date columns as datetimes, so that only the new rows are ever parsed"""
+    return df.assign(**{name: parsed for name in df.columns
+                        if (parsed := export_dates(df[name])) is not None})
+
+def _row_keys(text: pd.DataFrame, kind: str) -> pd.MultiIndex:
+    """The key and a hash of the content of every row of an export file read as text"""
+    return pd.MultiIndex.from_frame(text[ROW_KEYS[kind]].assign(
+        **{ROW_HASH: pd.util.hash_pandas_object(text, index=False)}))
+
+def _parsed(text: pd.DataFrame) -> pd.DataFrame:
+    """Rows read as text, typed as parse_contents reads an uploaded file"""
+    return pd.read_csv(io.StringIO(text.to_csv(index=False)))
+
+class ExportWatcher:
+    """Polls a folder with the files of one export and keeps its datasets up to date"""
+
+    def __init__(self, directory: str, poll_interval_s: float = POLL_INTERVAL_S):
+        self.directory = Path(directory)
+        self.poll_interval_s = poll_interval_s
+        self._signatures = {}
+        self._frames = {}
+        # Keys and hashes of the ingested rows, aligned with the frames
+        self._rows = {}
+        self._tokens = {}
+        # Start date of the first new or changed day of the processed exports
+        # since the last build of each phase model
+        self._changed_since = {}
+        # Phase models asked for by the sessions of this process
+        self._requested = {FIXED_MODEL}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def _ingest(self, kind: str, path: Path) -> int:
+        """Append the new and changed rows of the file, returns their number.
+        Only these rows are parsed"""
+        try:
+            found = sniff_file(path)
+        except UploadError as error:
+            logger.warning("Skipping %s: %s", path, error)
+            return 0
+        if found != kind:
+            logger.warning("Skipping %s: a %s export", path, found)
+            return 0
+
+        text = pd.read_csv(path, dtype=str)
+        rows = _row_keys(text, kind)
+        previous, previous_rows = self._frames.get(kind), self._rows.get(kind)
+        if previous is not None:
+            changed = ~rows.isin(previous_rows)
+            text, rows = text[changed], rows[changed]
+        if text.empty:
+            return 0
+        df = _with_dates(_parsed(text))
+        if kind in PROCESSED_KINDS:
+            first_day = df[ids.CYCLE_START_TIME].min()
+            for phase_model in PHASE_MODELS:
+                since = self._changed_since.get(phase_model)
+                self._changed_since[phase_model] = first_day if since is None else min(since, first_day)
+        if previous is None:
+            self._frames[kind], self._rows[kind] = df.reset_index(drop=True), rows
+        else:
+            # The changed rows replace the ingested rows with the same key
+            replaced = previous_rows.droplevel(ROW_HASH).isin(rows.droplevel(ROW_HASH))
+            self._frames[kind] = pd.concat([previous[~replaced], df], ignore_index=True)
+            self._rows[kind] = previous_rows[~replaced].append(rows)
+        return len(df)
+
+    def _requested_models(self) -> list[str]:
+        """The phase models asked for here or, through the shared store, by other processes"""
+        store = shared_store()
+        return [phase_model for phase_model in PHASE_MODELS if phase_model in self._requested
+                or (store is not None and _requested_key(self.directory, phase_model) in store)]
+
+    def _build(self, phase_model: str, frames: list[pd.DataFrame]) -> bool:
+        """Update the dataset of a phase model to the ingested rows, returns whether it was built"""
+        token = fingerprint('watched', *frames, phase_model)
+        # Unchanged data after a restart is found in the shared store
+        if get_dataset(token) is None:
+            previous = get_dataset(self._tokens.get(phase_model))
+            if previous is None:
+                dataset = build_dataset(*frames, phase_model=phase_model)
+            else:
+                dataset = update_dataset(previous, *frames, phase_model=phase_model,
+                                         changed_since=self._changed_since.get(phase_model))
+            if dataset is None:
+                return False
+            store_dataset(token, dataset)
+        self._tokens[phase_model] = token
+        self._changed_since.pop(phase_model, None)
+        store = shared_store()
+        if store is not None:
+            store.set(_published_key(self.directory, phase_model), token)
+        return True
+
+    def poll(self) -> bool:
+        """Ingest the new or changed export files and build the requested phase models
+        that are out of date, returns whether a dataset changed"""
+        with self._lock:
+            new_rows = 0
+            for kind, filename in EXPORT_FILES.items():
+                path = self.directory / filename
+                if not path.is_file():
+                    continue
+                stat = path.stat()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if self._signatures.get(kind) == signature:
+                    continue
+                self._signatures[kind] = signature
+                new_rows += self._ingest(kind, path)
+            frames = [self._frames.get(kind) for kind in (PHYSIOLOGICAL, JOURNAL, SLEEP, WORKOUTS)]
+            built = []
+            for phase_model in self._requested_models():
+                # Out of date: new rows since its last build, or never built
+                if (new_rows or phase_model in self._changed_since or phase_model not in self._tokens):
+                    start = time.perf_counter()
+                    if self._build(phase_model, frames):
+                        built.append(phase_model)
+                        logger.info("Built the %s dataset of %s in %.2f s", phase_model, self.directory,
+                                    time.perf_counter() - start)
+            if new_rows:
+                logger.info("Ingested %d new or changed rows from %s", new_rows, self.directory)
+            return len(built) > 0
+
+    def token(self, phase_model: str) -> str:
+        """Token of the latest dataset of the folder for a phase model, None before its first build.
+        A phase model asked for the first time is built on the next poll, which starts right away"""
+        if phase_model not in self._requested:
+            self._requested.add(phase_model)
+            self._wake.set()
+        return self._tokens.get(phase_model)
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Ingestion of %s failed", self.directory)
+            self._wake.wait(self.poll_interval_s)
+            self._wake.clear()
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name='export-watcher', daemon=True)
+        thread.start()
+        return thread
+
+def watch_directory() -> str:
+    """The watched folder from $WHOOP_WATCH_DIR, or None when watching is off"""
+    return os.environ.get(WATCH_DIR_ENV) or None
+
+def start_watcher(directory: str) -> ExportWatcher:
+    """Start watching a folder in a background thread of this process"""
+    global _watcher
+    _watcher = ExportWatcher(directory)
+    _watcher.start()
+    return _watcher
+
+def watched_token(directory: str, phase_model: str) -> str:
+    """Token of the latest dataset of the watched folder, from this process's watcher
+    or else the one a watcher process published in the shared store, where the
+    phase model is marked as requested so that the watcher process builds it"""
+    if _watcher is not None and _watcher.directory == Path(directory):
+        return _watcher.token(phase_model)
+    store = shared_store()
+    if store is None:
+        return None
+    requested = _requested_key(Path(directory), phase_model)
+    if requested not in store:
+        store.set(requested, True)
+    return store.get(_published_key(Path(directory), phase_model))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest the exports dropped in a folder into the dataset store")
+    parser.add_argument('directory', help="Folder with the files of a Whoop export")
+    parser.add_argument('--store', default=DEFAULT_DATASET_DIR,
+                        help="Dataset store of the dashboard ($WHOOP_DATASET_DIR takes precedence)")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL_S, help="Seconds between polls")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    configure_shared_store(args.store)
+    print(f"Watching {args.directory} every {args.interval:g} s")
+    ExportWatcher(args.directory, args.interval).run()
+
+if __name__ == "__main__":
+    main()
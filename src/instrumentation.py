@@ -0,0 +1,234 @@
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+import flask
+
+from src.profiling import profile_if_slow
+
+# Latency and payload metrics for the Dash callbacks and the pipeline stages,
+# exposed in the Prometheus text format on /metrics
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(10)) # 1 KiB to 256 MiB
+
+METRICS_PATH = '/metrics'
+logger = logging.getLogger('whoop.requests')
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, one series per label set"""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            counts, total = self._series.get(label_value, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label_value] = (counts, total + value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+
+    def delta(self, before: dict) -> dict:
+        """The samples observed since the snapshot `before`"""
+        delta = {}
+        for key, (counts, total) in self.snapshot().items():
+            old_counts, old_total = before.get(key, ([0] * len(counts), 0.0))
+            if counts != old_counts:
+                delta[key] = ([new - old for new, old in zip(counts, old_counts)], total - old_total)
+        return delta
+
+    def merge(self, samples: dict) -> None:
+        """Add the samples of another process (see delta)"""
+        with self._lock:
+            for key, (counts, total) in samples.items():
+                old_counts, old_total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+                self._series[key] = ([old + new for old, new in zip(old_counts, counts)], old_total + total)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            labels = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+class Counter:
+    """Monotonic counter keyed by two labels"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, str]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, first: str, second: str, amount: int = 1) -> None:
+        with self._lock:
+            self._values[(first, second)] = self._values.get((first, second), 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def delta(self, before: dict) -> dict:
+        """The increments since the snapshot `before`"""
+        return {key: value - before.get(key, 0) for key, value in self.snapshot().items()
+                if value != before.get(key, 0)}
+
+    def merge(self, samples: dict) -> None:
+        """Add the increments of another process (see delta)"""
+        for (first, second), amount in samples.items():
+            self.inc(first, second, amount)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for (first, second), value in sorted(values.items()):
+            lines.append(f'{self.name}{{{self.labels[0]}="{first}",{self.labels[1]}="{second}"}} {value}')
+        return lines
+
+CALLBACK_WALL = Histogram('whoop_callback_wall_seconds', 'Wall time of Dash callbacks', 'callback', TIME_BUCKETS)
+CALLBACK_CPU = Histogram('whoop_callback_cpu_seconds', 'CPU time of Dash callbacks', 'callback', TIME_BUCKETS)
+CALLBACK_INPUT_BYTES = Histogram('whoop_callback_input_bytes', 'Request payload of Dash callbacks',
+                                 'callback', BYTE_BUCKETS)
+CALLBACK_OUTPUT_BYTES = Histogram('whoop_callback_output_bytes', 'Response payload of Dash callbacks',
+                                  'callback', BYTE_BUCKETS)
+STAGE_WALL = Histogram('whoop_stage_wall_seconds', 'Wall time of pipeline and figure stages', 'stage', TIME_BUCKETS)
+STAGE_CPU = Histogram('whoop_stage_cpu_seconds', 'CPU time of pipeline and figure stages', 'stage', TIME_BUCKETS)
+CACHE_REQUESTS = Counter('whoop_cache_requests_total', 'Lookups in the server-side caches', ('cache', 'result'))
+
+METRICS = [CALLBACK_WALL, CALLBACK_CPU, CALLBACK_INPUT_BYTES, CALLBACK_OUTPUT_BYTES,
+           STAGE_WALL, STAGE_CPU, CACHE_REQUESTS]
+
+# Background callbacks run in job processes of their own that are never
+# scraped: the samples of a job are pushed to a shared store under this prefix
+# and merged into the web worker that serves /metrics next
+PUSHED_METRICS_PREFIX = 'metrics'
+
+# Cache lookups made while handling the current callback
+_cache_accesses = contextvars.ContextVar('cache_accesses', default=None)
+
+def record_cache_access(cache: str, hit: bool) -> None:
+    """Count a lookup in one of the server-side caches"""
+    result = 'hit' if hit else 'miss'
+    CACHE_REQUESTS.inc(cache, result)
+    accesses = _cache_accesses.get()
+    if accesses is not None:
+        accesses[result] += 1
+
+def instrument_callback(func):
+    """Record wall time, CPU time and cache lookups of a Dash callback.
+    The payload sizes are added when the response is sent (see register_metrics).
+    Slow calls are also profiled when profiling is turned on (see src/profiling.py)"""
+    name = func.__name__
+    profiled = profile_if_slow(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        accesses = {'hit': 0, 'miss': 0}
+        token = _cache_accesses.set(accesses)
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            return profiled(*args, **kwargs)
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+            _cache_accesses.reset(token)
+            CALLBACK_WALL.observe(name, wall)
+            CALLBACK_CPU.observe(name, cpu)
+            if flask.has_request_context():
+                flask.g.callback_metrics = {'callback': name, 'wall_s': round(wall, 6),
+                                            'cpu_s': round(cpu, 6), 'cache_hits': accesses['hit'],
+                                            'cache_misses': accesses['miss']}
+    return wrapper
+
+def instrument_background(get_store):
+    """instrument_callback for a background callback: the samples recorded by the
+    job are pushed to the store returned by get_store (see pull_metrics)"""
+    def decorator(func):
+        instrumented = instrument_callback(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            before = [metric.snapshot() for metric in METRICS]
+            try:
+                return instrumented(*args, **kwargs)
+            finally:
+                store = get_store()
+                if store is not None:
+                    store.push([metric.delta(snapshot) for metric, snapshot in zip(METRICS, before)],
+                               prefix=PUSHED_METRICS_PREFIX)
+        return wrapper
+    return decorator
+
+def pull_metrics(store) -> None:
+    """Merge the samples pushed by the background jobs into this process"""
+    while True:
+        _, samples = store.pull(prefix=PUSHED_METRICS_PREFIX)
+        if samples is None:
+            return
+        for metric, delta in zip(METRICS, samples):
+            metric.merge(delta)
+
+def timed_stage(name: str):
+    """Record wall and CPU time of a pipeline or figure building stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STAGE_WALL.observe(name, time.perf_counter() - wall_start)
+                STAGE_CPU.observe(name, time.thread_time() - cpu_start)
+        return wrapper
+    return decorator
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def register_metrics(server: flask.Flask, get_store=None) -> None:
+    """Serve /metrics and log one structured line per callback request.
+    The metrics include the background jobs' samples pushed to the store returned by get_store"""
+
+    @server.route(METRICS_PATH)
+    def metrics():
+        store = get_store() if get_store is not None else None
+        if store is not None:
+            pull_metrics(store)
+        return flask.Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    @server.after_request
+    def log_callback_request(response):
+        callback_metrics = flask.g.pop('callback_metrics', None)
+        if callback_metrics is None:
+            return response
+        input_bytes = flask.request.content_length or 0
+        output_bytes = response.calculate_content_length() or 0
+        CALLBACK_INPUT_BYTES.observe(callback_metrics['callback'], input_bytes)
+        CALLBACK_OUTPUT_BYTES.observe(callback_metrics['callback'], output_bytes)
+        logger.info(json.dumps({**callback_metrics, 'status': response.status_code,
+                                'input_bytes': input_bytes, 'output_bytes': output_bytes}))
+        return response
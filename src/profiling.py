@@ -0,0 +1,102 @@
+import cProfile
+import functools
+import hashlib
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# Opt-in profiling of slow callbacks, configured from the environment:
+#   WHOOP_PROFILE=1                  turn profiling on
+#   WHOOP_PROFILE_THRESHOLD_MS=500   only keep the traces of slower calls
+#   WHOOP_PROFILE_DIR=profiles       where the traces are written
+#   WHOOP_PROFILE_KEEP=50            number of slow calls kept (oldest removed first)
+# When WHOOP_PROFILE is not set the callbacks are not wrapped at all.
+ENABLED_ENV = 'WHOOP_PROFILE'
+THRESHOLD_ENV = 'WHOOP_PROFILE_THRESHOLD_MS'
+DIR_ENV = 'WHOOP_PROFILE_DIR'
+KEEP_ENV = 'WHOOP_PROFILE_KEEP'
+
+DEFAULT_THRESHOLD_MS = 500
+DEFAULT_DIR = 'profiles'
+DEFAULT_KEEP = 50
+TOP_ENTRIES = 30
+TRACEMALLOC_FRAMES = 10
+
+# Only one cProfile profiler can be active in the process: concurrent calls
+# run unprofiled while another one is being profiled
+_profiler_lock = threading.Lock()
+
+def profiling_enabled() -> bool:
+    return os.environ.get(ENABLED_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+def profile_if_slow(func):
+    """Profile every call and write the cProfile and tracemalloc traces of the slow ones"""
+    if not profiling_enabled():
+        return func
+
+    threshold = float(os.environ.get(THRESHOLD_ENV, DEFAULT_THRESHOLD_MS)) / 1000
+    directory = Path(os.environ.get(DIR_ENV, DEFAULT_DIR))
+    keep = int(os.environ.get(KEEP_ENV, DEFAULT_KEEP))
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profiler_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            profiler = cProfile.Profile()
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                if elapsed >= threshold:
+                    write_traces(directory, func.__name__, input_fingerprint(args, kwargs),
+                                 elapsed, profiler, tracemalloc.take_snapshot(), keep)
+        finally:
+            _profiler_lock.release()
+    return wrapper
+
+def input_fingerprint(args: tuple, kwargs: dict) -> str:
+    """Short hash of the callback inputs, so repeated slow calls can be grouped"""
+    payload = json.dumps([args, kwargs], default=str, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=6).hexdigest()
+
+def write_traces(directory: Path, name: str, fingerprint: str, elapsed: float,
+                 profiler: cProfile.Profile, snapshot: tracemalloc.Snapshot, keep: int) -> Path:
+    """Write <time>_<callback>_<fingerprint>.prof/.tracemalloc/.txt and rotate the directory"""
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = directory / f"{datetime.now():%Y%m%dT%H%M%S%f}_{name}_{fingerprint}"
+
+    profiler.dump_stats(f"{stem}.prof")
+    snapshot.dump(f"{stem}.tracemalloc")
+
+    summary = io.StringIO()
+    current, peak = tracemalloc.get_traced_memory()
+    summary.write(f"callback: {name}\ninput fingerprint: {fingerprint}\n"
+                  f"wall time: {elapsed * 1000:.1f} ms\npeak traced memory: {peak / 2**20:.1f} MiB\n\n")
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(TOP_ENTRIES)
+    summary.write("\nTop allocations:\n")
+    for stat in snapshot.statistics('lineno')[:TOP_ENTRIES]:
+        summary.write(f"{stat}\n")
+    Path(f"{stem}.txt").write_text(summary.getvalue())
+
+    rotate(directory, keep)
+    return stem
+
+def rotate(directory: Path, keep: int) -> None:
+    """Remove the traces of all but the `keep` most recent slow calls"""
+    stems = sorted({path.with_suffix('') for path in directory.glob('*.prof')}, reverse=True)
+    for stem in stems[keep:]:
+        for suffix in ('.prof', '.tracemalloc', '.txt'):
+            Path(f"{stem}{suffix}").unlink(missing_ok=True)
@@ -0,0 +1,6 @@
+# Entry point of production WSGI servers, e.g.
+#   gunicorn wsgi:server --workers 4 --bind 0.0.0.0:8050
+from main import create_app
+
+app = create_app(production=True)
+server = app.server